@@ -0,0 +1,51 @@
+"""Baseline schema: users, images and image_transformations
+
+Revision ID: 0001
+Revises:
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "images",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("file_path", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_images_id", "images", ["id"])
+
+    op.create_table(
+        "image_transformations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("images.id"), nullable=False),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("params", sa.String(), nullable=False),
+        sa.Column("output_file_path", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_image_transformations_id", "image_transformations", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("image_transformations")
+    op.drop_table("images")
+    op.drop_table("users")
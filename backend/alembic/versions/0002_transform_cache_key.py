@@ -0,0 +1,26 @@
+"""Transform cache key on image_transformations
+
+Revision ID: 0002
+Revises: 0001
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows keep a NULL key: they are never served from the cache
+    # and the next identical request renders once and records a key
+    op.add_column("image_transformations", sa.Column("cache_key", sa.String()))
+    op.create_index("ix_image_transformations_cache_key", "image_transformations", ["cache_key"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_transformations_cache_key", "image_transformations")
+    with op.batch_alter_table("image_transformations") as batch:
+        batch.drop_column("cache_key")
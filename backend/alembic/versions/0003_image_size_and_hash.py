@@ -0,0 +1,28 @@
+"""Size and SHA-256 of uploaded originals
+
+Revision ID: 0003
+Revises: 0002
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Left NULL for existing uploads: nothing requires them, and a NULL hash
+    # simply never matches a new upload for deduplication
+    op.add_column("images", sa.Column("size_bytes", sa.Integer()))
+    op.add_column("images", sa.Column("content_hash", sa.String()))
+    op.create_index("ix_images_content_hash", "images", ["content_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_content_hash", "images")
+    with op.batch_alter_table("images") as batch:
+        batch.drop_column("content_hash")
+        batch.drop_column("size_bytes")
@@ -0,0 +1,33 @@
+"""Renditions generated after upload
+
+Revision ID: 0004
+Revises: 0003
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "image_renditions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("images.id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("output_format", sa.String(), nullable=False),
+        sa.Column("output_file_path", sa.String(), nullable=False),
+        sa.Column("size_bytes", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.UniqueConstraint("image_id", "name"),
+    )
+    op.create_index("ix_image_renditions_id", "image_renditions", ["id"])
+    op.create_index("ix_image_renditions_image_id", "image_renditions", ["image_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("image_renditions")
@@ -0,0 +1,20 @@
+"""Index for the keyset-paginated image listing
+
+Revision ID: 0005
+Revises: 0004
+"""
+from alembic import op
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_images_user_id_created_at", "images", ["user_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_user_id_created_at", "images")
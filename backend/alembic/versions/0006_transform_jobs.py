@@ -0,0 +1,40 @@
+"""Transform job queue
+
+Revision ID: 0006
+Revises: 0005
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "transform_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("image_id", sa.Integer(), sa.ForeignKey("images.id"), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("payload", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String()),
+        sa.Column("worker_id", sa.String()),
+        sa.Column("transformation_id", sa.Integer(), sa.ForeignKey("image_transformations.id")),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("available_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+    op.create_index("ix_transform_jobs_id", "transform_jobs", ["id"])
+    op.create_index("ix_transform_jobs_user_id", "transform_jobs", ["user_id"])
+    op.create_index("ix_transform_jobs_status_available_at", "transform_jobs", ["status", "available_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("transform_jobs")
@@ -0,0 +1,45 @@
+"""Shared stored blobs and perceptual hash bands
+
+Revision ID: 0007
+Revises: 0006
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+BANDS = ("phash_band0", "phash_band1", "phash_band2", "phash_band3")
+
+
+def upgrade() -> None:
+    # Existing images get hashes the next time they are indexed; until then
+    # they only drop out of near-duplicate search
+    op.add_column("images", sa.Column("perceptual_hash", sa.String()))
+    for band in BANDS:
+        op.add_column("images", sa.Column(band, sa.Integer()))
+        op.create_index(f"ix_images_user_id_{band}", "images", ["user_id", band])
+
+    op.create_table(
+        "stored_blobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content_hash", sa.String(), nullable=False, unique=True),
+        sa.Column("file_path", sa.String(), nullable=False),
+        sa.Column("size_bytes", sa.Integer()),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_stored_blobs_id", "stored_blobs", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("stored_blobs")
+    for band in BANDS:
+        op.drop_index(f"ix_images_user_id_{band}", "images")
+    with op.batch_alter_table("images") as batch:
+        for band in BANDS:
+            batch.drop_column(band)
+        batch.drop_column("perceptual_hash")
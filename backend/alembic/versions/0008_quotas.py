@@ -0,0 +1,42 @@
+"""Image dimensions and rate-limit state for per-user quotas
+
+Revision ID: 0008
+Revises: 0007
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Older uploads keep NULL dimensions; quotas then estimate megapixels
+    # from size_bytes
+    op.add_column("images", sa.Column("width", sa.Integer()))
+    op.add_column("images", sa.Column("height", sa.Integer()))
+
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+    )
+    op.create_table(
+        "rate_limit_leases",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_rate_limit_leases_key", "rate_limit_leases", ["key"])
+
+
+def downgrade() -> None:
+    op.drop_table("rate_limit_leases")
+    op.drop_table("rate_limit_buckets")
+    with op.batch_alter_table("images") as batch:
+        batch.drop_column("height")
+        batch.drop_column("width")
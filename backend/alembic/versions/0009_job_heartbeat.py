@@ -0,0 +1,23 @@
+"""Heartbeat for running transform jobs
+
+Revision ID: 0009
+Revises: 0008
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Jobs running during the upgrade fall back to started_at for the lease
+    op.add_column("transform_jobs", sa.Column("heartbeat_at", sa.DateTime()))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("transform_jobs") as batch:
+        batch.drop_column("heartbeat_at")
@@ -0,0 +1,32 @@
+"""Make image_transformations.cache_key unique
+
+Revision ID: 0010
+Revises: 0009
+"""
+from alembic import op
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Concurrent renders could record the same key twice; the oldest row
+    # keeps it and the others stay as plain, uncached transformations
+    op.execute(
+        "UPDATE image_transformations SET cache_key = NULL "
+        "WHERE cache_key IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM image_transformations "
+        "WHERE cache_key IS NOT NULL GROUP BY cache_key)"
+    )
+    op.drop_index("ix_image_transformations_cache_key", "image_transformations")
+    op.create_index(
+        "ix_image_transformations_cache_key", "image_transformations", ["cache_key"], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_transformations_cache_key", "image_transformations")
+    op.create_index("ix_image_transformations_cache_key", "image_transformations", ["cache_key"])
@@ -0,0 +1,30 @@
+"""Backfill images.created_at and make it NOT NULL
+
+Revision ID: 0011
+Revises: 0010
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+# Rows inserted without a timestamp sort as the oldest images
+BACKFILL = datetime(1970, 1, 1)
+
+
+def upgrade() -> None:
+    images = sa.table("images", sa.column("created_at", sa.DateTime()))
+    op.execute(images.update().where(images.c.created_at.is_(None)).values(created_at=BACKFILL))
+    with op.batch_alter_table("images") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("images") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=True)
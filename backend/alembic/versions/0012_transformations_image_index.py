@@ -0,0 +1,21 @@
+"""Index image_transformations.image_id
+
+Revision ID: 0012
+Revises: 0011
+"""
+from alembic import op
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Per-image transformation counts in the listing, and cascading deletes
+    op.create_index("ix_image_transformations_image_id", "image_transformations", ["image_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_image_transformations_image_id", "image_transformations")
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """What request handlers need to know about the caller"""
+    id: int
+    email: str
+
+
+class TokenCache:
+    """Bounded TTL cache of verified bearer tokens.
+
+    Entries expire after ``ttl`` seconds or when the token itself expires,
+    whichever is sooner, so a cached token is never honoured past its ``exp``.
+    Tokens are stored as SHA-256 digests rather than in the clear.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[AuthenticatedUser, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> AuthenticatedUser | None:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, user: AuthenticatedUser, token_expires_at: float | None = None) -> None:
+        if self.max_entries <= 0:
+            return
+
+        expires = time.monotonic() + self.ttl
+        if token_expires_at is not None:
+            # Convert the token's wall-clock exp to the monotonic clock
+            expires = min(expires, time.monotonic() + (token_expires_at - time.time()))
+
+        with self._lock:
+            self._entries[self._key(token)] = (user, expires)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every cached token of a user, e.g. after the account is deleted"""
+        with self._lock:
+            stale = [key for key, (user, _) in self._entries.items() if user.id == user_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+@lru_cache()
+def get_token_cache() -> TokenCache:
+    return TokenCache(
+        max_entries=settings.AUTH_CACHE_SIZE,
+        ttl=settings.AUTH_CACHE_TTL_SECONDS,
+    )
@@ -5,6 +5,14 @@ from functools import lru_cache
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./app.db"
+    # Request handlers use an async driver; derived from DATABASE_URL
+    # (aiosqlite / asyncpg) unless set explicitly
+    ASYNC_DATABASE_URL: str | None = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
 
     # JWT
     SECRET_KEY: str = "supersecretkey"
@@ -13,16 +21,91 @@ class Settings(BaseSettings):
     CORS_ORIGINS: str = "http://localhost:3000"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 60.0
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
 
     # Storage
     STORAGE_BACKEND: str = "local"
     UPLOAD_DIR: str = "uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
 
     # S3
     S3_BUCKET_NAME: str | None = None
     S3_ACCESS_KEY: str | None = None
     S3_SECRET_KEY: str | None = None
     S3_REGION: str | None = None
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    S3_UPLOAD_CONCURRENCY: int = 4
+    S3_ENDPOINT_URL: str | None = None  # e.g. a local moto server
+    S3_MAX_CONCURRENCY: int = 16
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MAX_ATTEMPTS: int = 5
+    S3_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    S3_READ_TIMEOUT_SECONDS: float = 30.0
+
+    # Read-through cache in front of the storage backend (see
+    # app/storage/cached.py). The disk tier is only used for remote backends;
+    # STORAGE_CACHE_DIR holds one temporary directory per process
+    STORAGE_CACHE_ENABLED: bool = True
+    STORAGE_CACHE_DIR: str | None = None
+    STORAGE_CACHE_DISK_BYTES: int = 2 * 1024 * 1024 * 1024
+    STORAGE_CACHE_MAX_OBJECT_BYTES: int = 256 * 1024 * 1024
+    STORAGE_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024
+    STORAGE_CACHE_MEMORY_MAX_OBJECT_BYTES: int = 1024 * 1024
+
+    # Transform workers
+    TRANSFORM_WORKERS: int = 2
+    TRANSFORM_QUEUE_DEPTH: int = 8
+    TRANSFORM_TIMEOUT_SECONDS: float = 30.0
+    TRANSFORM_RETRY_AFTER_SECONDS: int = 5
+    PIPELINE_MAX_OPERATIONS: int = 20
+    BATCH_MAX_IMAGES: int = 500
+    # Sources over MAX_IMAGE_PIXELS are rejected (this replaces Pillow's
+    # decompression-bomb limit); above MAX_DECODE_PIXELS they are processed
+    # in bands of about TRANSFORM_STRIP_BYTES instead of one bitmap
+    MAX_IMAGE_PIXELS: int = 2_000_000_000
+    MAX_DECODE_PIXELS: int = 100_000_000
+    TRANSFORM_STRIP_BYTES: int = 32 * 1024 * 1024
+    TRANSFORM_CACHE_SIZE: int = 1024
+    # Decoded source bitmaps kept by each transform worker process (see
+    # app/services/decode_cache.py); 0 disables the cache
+    DECODE_CACHE_BYTES: int = 256 * 1024 * 1024
+
+    # Renditions generated after every upload, as name:max_side:format
+    RENDITIONS: str = "thumb:256:webp,preview:1024:jpeg"
+    RENDITION_MAX_ATTEMPTS: int = 3
+
+    # Transform job queue (see app/worker.py)
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 10.0
+    JOB_LEASE_SECONDS: int = 300
+    JOB_HEARTBEAT_SECONDS: float = 30.0
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_WAIT_SECONDS: float = 30.0
+    JOB_METRICS_WINDOW: int = 100
+
+    # Per-user quotas (see app/services/quotas.py). Tokens are megapixel x
+    # action-weight units; every limited request costs at least
+    # RATE_LIMIT_MIN_COST, a render costs what its pipeline weighs
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory, sql or redis
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_BURST: float = 200.0
+    RATE_LIMIT_PER_MINUTE: float = 200.0
+    RATE_LIMIT_MIN_COST: float = 1.0
+    # Renders one user may have in the worker pool at once, and jobs queued
+    # or running for app.worker
+    USER_MAX_CONCURRENT_TRANSFORMS: int = 2
+    USER_MAX_PENDING_JOBS: int = 20
+
+    # ZIP export (see app/services/export.py): files streamed from storage
+    # ahead of the one being written, and chunks buffered for each
+    EXPORT_PREFETCH_FILES: int = 4
+    EXPORT_PREFETCH_CHUNKS: int = 4
 
     class Config:
         env_file = ".env"
@@ -1,36 +1,63 @@
-from slowapi import Limiter
 from fastapi import Request
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
 from fastapi.responses import JSONResponse
-from fastapi import UploadFile, File, Depends
-from jose import JWTError, jwt
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-security = HTTPBearer()
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import BackgroundTasks, UploadFile, File, Depends
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 import uuid
-from fastapi.responses import FileResponse
+import json
+import math
+import asyncio
+import traceback
+from typing import List
+from fastapi.responses import Response, StreamingResponse
 from io import BytesIO
-from app.models import ImageTransformation, Image
-from app.services.image_transformer import save_image_with_options
-from app.services.image_transformer import(
-    load_image,
-    save_image,
-    resize_image,
-    crop_image,
-    rotate_image,
-    flip_horizontal,
-    flip_vertical,
-    mirror_image,
-    grayscale_image,
-    sepia_image
+from app.models import ImageTransformation, Image, ImageRendition, TransformJob
+from app.services.decode_cache import run_with_source
+from app.services.export import export_entries, stream_zip
+from app.services.encoders import media_type, negotiate_format
+from app.services.image_transformer import ImageTooLarge, probe_size
+from app.services.quotas import (
+    QuotaExceeded,
+    charge_render,
+    check_pending_jobs,
+    rate_limited_user,
+    transform_slot
+)
+from app.services.executor import ExecutorSaturated, TransformTimeout, WorkerCrashed, get_executor
+from app.services.jobs import TERMINAL_STATUSES, enqueue_job, job_metrics
+from app.services.streaming import stream_from_storage
+from app.services.url_spec import InvalidSpec, parse_url_spec
+from app.services.blobs import acquire_blob, release_blob, rendition_paths_in_use
+from app.services.renditions import generate_renditions, get_rendition_specs, reuse_renditions
+from app.services.similarity import (
+    MAX_DISTANCE,
+    dhash,
+    find_similar,
+    hash_from_hex,
+    index_image,
+    perceptual_hash_values
+)
+from app.services.transform_cache import (
+    CachedTransformation,
+    decode_cache_key,
+    get_transform_cache,
+    transform_cache_key
+)
+from app.services.pipeline import (
+    InvalidOperation,
+    normalize_format,
+    pipeline_params,
+    render,
+    validate_operations,
+    validate_output
 )
 
 
@@ -38,19 +65,22 @@ from app.services.image_transformer import(
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
 
-from app.db import engine, Base, get_db
+from app.db import engine, async_engine, Base, AsyncSessionLocal, get_async_db
+from app.metrics import RATE_LIMIT_REJECTIONS, ServerTimingMiddleware, instrument_engine, route_name
 from app.models import User, Image, ImageTransformation
 from app.schemas import UserCreate, UserLogin
-from app.security import hash_password, verify_password
+from app.security import hash_password_async, needs_rehash, verify_password_async
 from app.jwt import create_access_token
+from app.auth_cache import AuthenticatedUser, get_token_cache
 from app.config import settings
+from app.migrations import migrate
 
 app = FastAPI()
 
-# Configure rate limiter first
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
+# Per-request stage timings and latency histograms
+app.add_middleware(ServerTimingMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 # Configure CORS - MUST be added LAST so it executes FIRST
 allowed_origins = [origin.strip() for origin in settings.CORS_ORIGINS.split(",")]
@@ -66,11 +96,13 @@ app.add_middleware(
 )
 
 
-@app.exception_handler(RateLimitExceeded)
-def rate_limit_handler(request, exc):
+@app.exception_handler(QuotaExceeded)
+def quota_exceeded_handler(request, exc):
+    RATE_LIMIT_REJECTIONS.labels(route=route_name(request.scope), reason=exc.reason).inc()
     return JSONResponse(
         status_code=429,
-        content={"detail": "Rate limit exceeded. Try again later."},
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
     )
 
 
@@ -78,14 +110,20 @@ def rate_limit_handler(request, exc):
 def startup_event():
     """Initialize database on startup"""
     try:
-        print("🔧 Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created successfully")
+        print("🔧 Migrating database schema...")
+        migrate(engine)
+        print("✅ Database schema is up to date")
     except Exception as e:
         print(f"❌ Database initialization error: {e}")
         raise
 
 
+@app.on_event("shutdown")
+def shutdown_event():
+    """Stop transform worker processes"""
+    get_executor().shutdown()
+
+
 @app.get("/")
 def root():
     """Root endpoint"""
@@ -99,15 +137,24 @@ def root():
 @app.get("/health")
 def health_check():
     """Health check endpoint to test CORS"""
+    storage = get_storage()
     return {
         "status": "healthy",
         "cors_origins": settings.CORS_ORIGINS,
+        "auth_cache": get_token_cache().stats(),
+        "storage_cache": storage.stats() if isinstance(storage, CachedStorage) else None,
         "message": "API is running"
     }
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/register", status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         # Validate password length
         if len(user.password) < 6:
@@ -121,16 +168,18 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
                 detail="Password cannot exceed 72 characters"
             )
         
-        # Check if user exists
-        existing_user = db.query(User).filter(User.email == user.email).first()
+        # Check if user exists before paying for bcrypt
+        existing_user = await db.scalar(select(User.id).where(User.email == user.email))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
-        
-        # Hash password
-        hashed_pwd = hash_password(user.password)
+        # End the read transaction so the connection goes back to the pool
+        # while bcrypt runs, as /login does
+        await db.rollback()
+
+        hashed_pwd = await hash_password_async(user.password)
 
         # Create new user
         new_user = User(
@@ -139,8 +188,16 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
 
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent registration took the email after our check;
+            # the unique index on users.email decides
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
 
         return {
             "message": "User registered successfully",
@@ -153,7 +210,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         print(f"❌ Registration error: {str(e)}")
         import traceback
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Registration failed: {str(e)}"
@@ -163,106 +220,146 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 from fastapi.security import OAuth2PasswordRequestForm
 
 @app.post("/login")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = db.query(User).filter(User.email == form_data.username).first()
+    db_user = (await db.execute(
+        select(User.id, User.hashed_password).where(User.email == form_data.username)
+    )).first()
 
     if not db_user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    if not verify_password(form_data.password, db_user.hashed_password):
-        raise HTTPException(status_code=400, detail="Invalid credentials")
-
-    access_token = create_access_token({"sub": str(db_user.id)})
+    user_id, hashed_password = db_user
+    # End the read transaction so the connection goes back to the pool
+    # while bcrypt runs
+    await db.rollback()
 
-    return {"access_token": access_token, "token_type": "bearer"}
-
-
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    token = credentials.credentials
-    
-    # Extract the actual JWT token
-    # Handle cases where "Bearer " might be included
-    token = token.replace("Bearer ", "").strip()
-    
-    # Validate token is not empty
-    if not token or not isinstance(token, str):
-        raise HTTPException(status_code=401, detail="Invalid token: token is empty")
-
-    # Verify token has exactly 3 segments (header.payload.signature)
-    segment_count = token.count(".") + 1
-    if segment_count != 3:
-        raise HTTPException(
-            status_code=401, 
-            detail=f"Invalid token: has {segment_count} segments, expected 3. Token: {token[:30]}..."
-        )
+    if not await verify_password_async(form_data.password, hashed_password):
+        raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    try:
-        payload = jwt.decode(
-            token,
-            SECRET_KEY,
-            algorithms=[ALGORITHM]
+    # Upgrade hashes made with an older BCRYPT_ROUNDS while we have the password
+    if needs_rehash(hashed_password):
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(hashed_password=await hash_password_async(form_data.password))
         )
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token: missing user_id")
-    except JWTError as e:
-        raise HTTPException(status_code=401, detail=f"JWT decode error: {str(e)}")
+        await db.commit()
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
+    access_token = create_access_token({"sub": str(user_id)})
 
-    return user
+    return {"access_token": access_token, "token_type": "bearer"}
 
 
 from fastapi import Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
 from app.storage.factory import get_storage
 from app.storage.base import StorageBackend
-from app.db import get_db
+from app.storage.cached import CachedStorage
 from app.models import Image, User
 from app.security import get_current_user
 
 
 @app.post("/images/upload")
 async def upload_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user),
     storage: StorageBackend = Depends(get_storage)
 ):
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
-    # Save using storage backend
-    file_path = await storage.save(file)
+    # Header only; quotas weigh transforms of this image by its megapixels
+    dimensions = probe_size(file.file) or (None, None)
+
+    # Stream into the storage backend, hashing as we go
+    stored = await storage.save(file)
+
+    # Identical bytes share one stored blob, across accounts. That stays
+    # internal: nothing in the response or in other rows tells a user that
+    # someone else already uploaded the same file
+    file_path, reused = await acquire_blob(db, storage, stored)
 
     new_image = Image(
         filename=file.filename,
         file_path=file_path,
+        size_bytes=stored.size,
+        width=dimensions[0],
+        height=dimensions[1],
+        content_hash=stored.content_hash,
         user_id=current_user.id
     )
 
+    # A duplicate inherits the perceptual hash of its bytes, which is the
+    # same whoever uploaded them, and renditions of the user's own copies
+    donor = None
+    if reused:
+        donor = (await db.execute(
+            select(Image.perceptual_hash).where(
+                Image.content_hash == stored.content_hash,
+                Image.perceptual_hash.is_not(None)
+            ).limit(1)
+        )).first()
+    if donor:
+        for key, value in perceptual_hash_values(hash_from_hex(donor.perceptual_hash)).items():
+            setattr(new_image, key, value)
+
     db.add(new_image)
-    db.commit()
-    db.refresh(new_image)
+    await db.flush()
+    missing_renditions = (
+        await reuse_renditions(db, new_image.id, current_user.id, stored.content_hash)
+        if reused else get_rendition_specs()
+    )
+    await db.commit()
+
+    # Runs after the response is sent, so the upload itself stays fast
+    if not donor:
+        background_tasks.add_task(index_image, new_image.id, new_image.file_path)
+    if missing_renditions:
+        background_tasks.add_task(
+            generate_renditions, new_image.id, new_image.file_path, missing_renditions
+        )
 
     return {
         "id": new_image.id,
         "filename": new_image.filename,
-        "uploaded_by": current_user.email
+        "uploaded_by": current_user.email,
+        "renditions": [spec.name for spec in get_rendition_specs()]
     }
 
 
 
+async def run_transform(func, *args):
+    """Run a transform job in the worker pool, mapping pool errors to HTTP errors"""
+    try:
+        return await get_executor().run(func, *args)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidOperation as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Transform workers are busy. Try again later.",
+            headers={"Retry-After": str(settings.TRANSFORM_RETRY_AFTER_SECONDS)},
+        )
+    except WorkerCrashed:
+        raise HTTPException(
+            status_code=503,
+            detail="Transform worker crashed. Try again later.",
+            headers={"Retry-After": str(settings.TRANSFORM_RETRY_AFTER_SECONDS)},
+        )
+    except TransformTimeout:
+        raise HTTPException(status_code=504, detail="Transformation timed out")
+    except ValueError as e:
+        # Pillow rejects some parameters (e.g. a degenerate box) itself
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/images/transform")
-@limiter.limit("10/minute")
 async def transform_image(
     request: Request,
     image_id: int,
@@ -276,68 +373,66 @@ async def transform_image(
     angle: int | None = None,
     output_format: str = "jpeg",
     quality: int | None = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    preset: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(rate_limited_user)
 ):
-    image_record = db.query(Image).filter(Image.id == image_id).first()
+    image_record = await db.scalar(select(Image).where(
+        Image.id == image_id,
+        Image.user_id == current_user.id
+    ))
     if not image_record:
         raise HTTPException(status_code=404, detail="Image not found")
 
-    input_path = Path(image_record.file_path)
-    image = load_image(input_path)
-
-    # Apply transformation
-    if action == "resize":
-        if width is None or height is None:
-            raise HTTPException(status_code=400, detail="Width and height required")
-        image = resize_image(image, width, height)
-
-    elif action == "crop":
-        if None in (left, top, right, bottom):
-            raise HTTPException(status_code=400, detail="Crop coordinates required")
-        image = crop_image(image, left, top, right, bottom)
-
-    elif action == "rotate":
-        if angle is None:
-            raise HTTPException(status_code=400, detail="Angle required")
-        image = rotate_image(image, angle)
-
-    elif action == "flip_horizontal":
-        image = flip_horizontal(image)
-
-    elif action == "flip_vertical":
-        image = flip_vertical(image)
-
-    elif action == "mirror":
-        image = mirror_image(image)
+    operation = {
+        k: v for k, v in {
+            "action": action,
+            "width": width,
+            "height": height,
+            "left": left,
+            "top": top,
+            "right": right,
+            "bottom": bottom,
+            "angle": angle,
+        }.items() if v is not None
+    }
 
-    elif action == "grayscale":
-        image = grayscale_image(image)
+    try:
+        validate_operations([operation])
+    except InvalidOperation as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    elif action == "sepia":
-        image = sepia_image(image)
+    output_format = checked_output(request, output_format, quality, preset)
 
-    else:
-        raise HTTPException(status_code=400, detail="Invalid action")
+    cache = get_transform_cache()
+    cache_key = transform_cache_key(image_record, [operation], output_format, quality, preset)
 
-    # Save to memory buffer
-    output_filename = f"{uuid.uuid4()}.{output_format.lower()}"
-    buffer = BytesIO()
+    cached = await cache.lookup(db, cache_key)
+    if cached:
+        return {
+            "message": "Transformation already exists",
+            "original_image_id": image_id,
+            "action": action,
+            "output_file": Path(cached.output_file_path).name
+        }
 
-    image.save(
-        buffer,
-        format=output_format.upper(),
-        quality=quality if quality else 85
-    )
+    async with transform_slot(current_user.id):
+        await charge_render(current_user.id, image_record, [operation], output_format)
+        output_bytes = await run_with_source(
+            run_transform, get_storage(), image_record.file_path, decode_cache_key(image_record),
+            render, [operation], output_format, quality, preset
+        )
 
-    buffer.seek(0)
+    output_filename = f"{uuid.uuid4()}.{output_format}"
+    buffer = BytesIO(output_bytes)
 
     # Use storage abstraction
     storage = get_storage()
 
-    output_path = await storage.save(
+    stored = await storage.save(
         file=UploadFile(file=buffer, filename=output_filename)
     )
+    output_path = stored.path
 
     # Track used parameters
     params_used = {
@@ -350,109 +445,702 @@ async def transform_image(
             "bottom": bottom,
             "angle": angle,
             "output_format": output_format,
-            "quality": quality
+            "quality": quality,
+            "preset": preset
         }.items() if v is not None
     }
 
-    existing_transformation = db.query(ImageTransformation).filter(
-        ImageTransformation.image_id == image_id,
-        ImageTransformation.action == action,
-        ImageTransformation.params == str(params_used)
-    ).first()
-
-    if existing_transformation:
-        return {
-            "message": "Transformation already exists",
-            "output_file": Path(existing_transformation.output_file_path).name
-        }
-
     transformation = ImageTransformation(
         image_id=image_id,
         action=action,
         params=str(params_used),
-        output_file_path=str(output_path)
+        output_file_path=str(output_path),
+        cache_key=cache_key
     )
 
-    db.add(transformation)
-    db.commit()
+    [entry] = await cache.record(db, [transformation])
+    if entry.output_file_path != output_path:
+        # A concurrent request for the same key recorded its output first
+        await storage.delete(output_path)
 
     return {
         "original_image_id": image_id,
         "action": action,
-        "output_file": output_filename
+        "output_file": Path(entry.output_file_path).name
     }
 
+from app.schemas import BatchTransformRequest, PipelineRequest, TransformOperation
+
+
+async def render_and_record(
+    db: AsyncSession,
+    user_id: int,
+    image_record: Image,
+    operations: List[dict],
+    output_format: str,
+    quality: int | None,
+    preset: str | None,
+    cache_key: str
+) -> CachedTransformation:
+    """Render a pipeline in the worker pool for user_id, store it and record it in the cache"""
+    storage = get_storage()
+
+    async with transform_slot(user_id):
+        await charge_render(user_id, image_record, operations, output_format)
+        # One decode, every step in memory, one encode
+        output_bytes = await run_with_source(
+            run_transform, storage, image_record.file_path, decode_cache_key(image_record),
+            render, operations, output_format, quality, preset
+        )
+
+    stored = await storage.save(
+        file=UploadFile(
+            file=BytesIO(output_bytes),
+            filename=f"{uuid.uuid4()}.{normalize_format(output_format)}"
+        )
+    )
+
+    transformation = ImageTransformation(
+        image_id=image_record.id,
+        action="pipeline",
+        params=pipeline_params(operations, output_format, quality, preset),
+        output_file_path=stored.path,
+        cache_key=cache_key
+    )
+
+    [entry] = await get_transform_cache().record(db, [transformation])
+    if entry.output_file_path != stored.path:
+        # A concurrent request for the same key recorded its output first
+        await storage.delete(stored.path)
+    return entry
+
+
+def checked_operations(operations: List[TransformOperation]) -> List[dict]:
+    """Turn request operations into validated pipeline dicts"""
+    if not operations:
+        raise HTTPException(status_code=400, detail="At least one operation required")
+    if len(operations) > settings.PIPELINE_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.PIPELINE_MAX_OPERATIONS} operations allowed"
+        )
+
+    operations = [op.model_dump(exclude_none=True) for op in operations]
+
+    try:
+        validate_operations(operations)
+    except InvalidOperation as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return operations
+
+
+def checked_output(request: Request, output_format: str, quality: int | None, preset: str | None) -> str:
+    """Resolve output_format="auto" from the Accept header and validate the encoder settings"""
+    output_format = normalize_format(output_format)
+    if output_format == "auto":
+        output_format = negotiate_format(request.headers.get("accept"))
+
+    try:
+        validate_output(output_format, quality, preset)
+    except InvalidOperation as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return output_format
+
+
+@app.post("/images/pipeline")
+async def run_pipeline(
+    request: Request,
+    pipeline: PipelineRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(rate_limited_user)
+):
+    image_record = await db.scalar(select(Image).where(
+        Image.id == pipeline.image_id,
+        Image.user_id == current_user.id
+    ))
+    if not image_record:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    operations = checked_operations(pipeline.operations)
+    output_format = checked_output(request, pipeline.output_format, pipeline.quality, pipeline.preset)
+
+    cache = get_transform_cache()
+    cache_key = transform_cache_key(
+        image_record, operations, output_format, pipeline.quality, pipeline.preset
+    )
+
+    cached = await cache.lookup(db, cache_key)
+    if cached:
+        return {
+            "message": "Transformation already exists",
+            "original_image_id": image_record.id,
+            "transformation_id": cached.transformation_id,
+            "operations": [op["action"] for op in operations],
+            "output_file": Path(cached.output_file_path).name
+        }
+
+    transformation = await render_and_record(
+        db, current_user.id, image_record, operations, output_format,
+        pipeline.quality, pipeline.preset, cache_key
+    )
+
+    return {
+        "original_image_id": pipeline.image_id,
+        "transformation_id": transformation.transformation_id,
+        "operations": [op["action"] for op in operations],
+        "output_file": Path(transformation.output_file_path).name
+    }
+
+
+@app.post("/images/transform/batch")
+async def batch_transform(
+    request: Request,
+    batch: BatchTransformRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(rate_limited_user)
+):
+    """Apply one pipeline to many images, streaming one NDJSON line per image"""
+    image_ids = list(dict.fromkeys(batch.image_ids))
+    if not image_ids:
+        raise HTTPException(status_code=400, detail="At least one image_id required")
+    if len(image_ids) > settings.BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_MAX_IMAGES} images per batch"
+        )
+
+    operations = checked_operations(batch.operations)
+    output_format = checked_output(request, batch.output_format, batch.quality, batch.preset)
+    params = pipeline_params(operations, output_format, batch.quality, batch.preset)
+
+    images = {
+        image.id: image
+        for image in await db.scalars(select(Image).where(
+            Image.id.in_(image_ids),
+            Image.user_id == current_user.id
+        ))
+    }
+    keys = {
+        image_id: transform_cache_key(image, operations, output_format, batch.quality, batch.preset)
+        for image_id, image in images.items()
+    }
+    cache = get_transform_cache()
+    cached = await cache.lookup_many(db, list(keys.values()))
+
+    sources = {image_id: image.file_path for image_id, image in images.items()}
+    storage = get_storage()
+    executor = get_executor()
+    # Keep at most one job per worker in flight so a large batch queues
+    # here instead of starving interactive requests of pool capacity, and
+    # never more than the user's own concurrency quota
+    slots = asyncio.Semaphore(min(executor.workers, settings.USER_MAX_CONCURRENT_TRANSFORMS))
+
+    async def record_output(image_id: int, output_path: str) -> CachedTransformation:
+        """Insert the row for one stored output, so nothing stored goes unrecorded"""
+        row = ImageTransformation(
+            image_id=image_id,
+            action="pipeline",
+            params=params,
+            output_file_path=output_path,
+            cache_key=keys[image_id]
+        )
+        async with AsyncSessionLocal() as session:
+            [entry] = await cache.record(session, [row])
+        if entry.output_file_path != output_path:
+            # A concurrent request for the same key recorded its output first
+            await storage.delete(output_path)
+        return entry
+
+    async def process(image_id: int) -> dict:
+        async with slots:
+            try:
+                # Waits out the user's other renders rather than failing the image
+                async with transform_slot(current_user.id, wait=settings.TRANSFORM_TIMEOUT_SECONDS):
+                    await charge_render(current_user.id, images[image_id], operations, output_format)
+                    output_bytes = await run_with_source(
+                        executor.run, storage, sources[image_id], decode_cache_key(images[image_id]),
+                        render, operations, output_format, batch.quality, batch.preset
+                    )
+                stored = await storage.save(
+                    file=UploadFile(
+                        file=BytesIO(output_bytes),
+                        filename=f"{uuid.uuid4()}.{output_format}"
+                    )
+                )
+            except (ExecutorSaturated, TransformTimeout, WorkerCrashed, InvalidOperation, ImageTooLarge, QuotaExceeded, OSError) as e:
+                # OSError covers missing sources and undecodable images
+                detail = str(e) or type(e).__name__
+                return {"image_id": image_id, "status": "error", "detail": detail}
+            except Exception as e:
+                # Anything else fails this image only; the stream must go on
+                traceback.print_exc()
+                return {"image_id": image_id, "status": "error", "detail": f"Transformation failed: {type(e).__name__}"}
+
+            # Shielded: a client disconnect cancels this task, but the row for
+            # an output already in storage is still written
+            entry = await asyncio.shield(record_output(image_id, stored.path))
+            return {
+                "image_id": image_id,
+                "status": "created",
+                "transformation_id": entry.transformation_id,
+                "output_file": Path(entry.output_file_path).name
+            }
+
+    async def results():
+        pending = []
+        for image_id in image_ids:
+            if image_id not in images:
+                yield json.dumps({"image_id": image_id, "status": "error", "detail": "Image not found"}) + "\n"
+            elif keys[image_id] in cached:
+                yield json.dumps({
+                    "image_id": image_id,
+                    "status": "cached",
+                    "transformation_id": cached[keys[image_id]].transformation_id,
+                    "output_file": Path(cached[keys[image_id]].output_file_path).name
+                }) + "\n"
+            else:
+                pending.append(asyncio.create_task(process(image_id)))
+
+        created = 0
+        try:
+            for finished in asyncio.as_completed(pending):
+                result = await finished
+                if result["status"] == "created":
+                    created += 1
+                yield json.dumps(result) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+
+        cached_count = sum(1 for key in keys.values() if key in cached)
+        yield json.dumps({
+            "done": True,
+            "created": created,
+            "cached": cached_count,
+            "failed": len(image_ids) - created - cached_count
+        }) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def job_response(job: TransformJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "image_id": job.image_id,
+        "attempts": job.attempts,
+        "error": job.error,
+        "transformation_id": job.transformation_id,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at
+    }
+
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    request: Request,
+    pipeline: PipelineRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(rate_limited_user)
+):
+    """Queue a pipeline for app.worker and return immediately"""
+    image_record = await db.scalar(select(Image).where(
+        Image.id == pipeline.image_id,
+        Image.user_id == current_user.id
+    ))
+    if not image_record:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    operations = checked_operations(pipeline.operations)
+    output_format = checked_output(request, pipeline.output_format, pipeline.quality, pipeline.preset)
+
+    await check_pending_jobs(db, current_user.id)
+    await charge_render(current_user.id, image_record, operations, output_format)
+
+    job = await enqueue_job(
+        db, current_user.id, image_record.id, operations, output_format, pipeline.quality, pipeline.preset
+    )
+    return job_response(job)
+
+
+@app.get("/jobs/metrics")
+async def get_job_metrics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    return await job_metrics(db)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    wait: float = 0,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """Job status; with ?wait=N, long-poll up to N seconds for a final state"""
+    query = select(TransformJob).where(
+        TransformJob.id == job_id,
+        TransformJob.user_id == current_user.id
+    )
+    job = await db.scalar(query)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    deadline = asyncio.get_running_loop().time() + min(max(wait, 0), settings.JOB_MAX_WAIT_SECONDS)
+    while job.status not in TERMINAL_STATUSES and asyncio.get_running_loop().time() < deadline:
+        # End the read transaction so the connection goes back to the pool
+        # while we wait; otherwise every waiting client pins one
+        await db.rollback()
+        await asyncio.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+        job = await db.scalar(query)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+    return job_response(job)
+
+
+@app.get("/images/export")
+async def export_images(
+    image_id: List[int] | None = Query(None),
+    transformation_id: List[int] | None = Query(None),
+    all_transformations: bool = False,
+    originals: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(rate_limited_user)
+):
+    """ZIP of the user's originals (all, or ?image_id=...) plus chosen
+    transformation outputs, streamed as it is built"""
+    entries = await export_entries(
+        db, current_user.id, image_id, transformation_id, all_transformations, originals
+    )
+    if not entries:
+        raise HTTPException(status_code=404, detail="Nothing to export")
+
+    return StreamingResponse(
+        stream_zip(
+            get_storage(),
+            entries,
+            settings.EXPORT_PREFETCH_FILES,
+            settings.EXPORT_PREFETCH_CHUNKS
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="images-export.zip"'}
+    )
+
+
 @app.get("/images/{image_id}")
-def get_image(
+async def get_image(
+    request: Request,
     image_id: int,
     transformation_id: int | None = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    rendition: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
-    image = db.query(Image).filter(
+    image = await db.scalar(select(Image).where(
         Image.id == image_id,
         Image.user_id == current_user.id
-    ).first()
+    ))
 
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
 
     # If transformation requested
     if transformation_id:
-        transformation = db.query(ImageTransformation).filter(
+        transformation = await db.scalar(select(ImageTransformation).where(
             ImageTransformation.id == transformation_id,
             ImageTransformation.image_id == image_id
-        ).first()
+        ))
 
         if not transformation:
             raise HTTPException(status_code=404, detail="Transformation not found")
 
-        file_path = Path(transformation.output_file_path)
+        file_path = transformation.output_file_path
+    elif rendition:
+        image_rendition = await db.scalar(select(ImageRendition).where(
+            ImageRendition.image_id == image_id,
+            ImageRendition.name == rendition
+        ))
+
+        if not image_rendition:
+            raise HTTPException(status_code=404, detail="Rendition not found")
+
+        file_path = image_rendition.output_file_path
+    else:
+        file_path = image.file_path
+
+    # Works for local paths and S3 URLs alike, with Range support
+    return await stream_from_storage(get_storage(), file_path, request)
+
+@app.delete("/images/{image_id}")
+async def delete_image(
+    image_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    storage: StorageBackend = Depends(get_storage)
+):
+    image = await db.scalar(select(Image).where(
+        Image.id == image_id,
+        Image.user_id == current_user.id
+    ))
+
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    transformations = (await db.execute(
+        select(ImageTransformation.output_file_path, ImageTransformation.cache_key)
+        .where(ImageTransformation.image_id == image_id)
+    )).all()
+    rendition_paths = list(await db.scalars(
+        select(ImageRendition.output_file_path).where(ImageRendition.image_id == image_id)
+    ))
+
+    await db.execute(delete(TransformJob).where(TransformJob.image_id == image_id))
+    await db.execute(delete(ImageTransformation).where(ImageTransformation.image_id == image_id))
+    await db.execute(delete(ImageRendition).where(ImageRendition.image_id == image_id))
+    await db.execute(delete(Image).where(Image.id == image_id))
+
+    # Originals and renditions may be shared with duplicates of the same bytes
+    original_unused = await release_blob(db, image.content_hash, image.file_path)
+    renditions_in_use = await rendition_paths_in_use(db, rendition_paths)
+    await db.commit()
+
+    cache = get_transform_cache()
+    for row in transformations:
+        if row.cache_key:
+            cache.discard(row.cache_key)
+
+    # Files go only after the rows are gone, so nothing can point at them
+    unused = [row.output_file_path for row in transformations]
+    unused += [path for path in set(rendition_paths) if path not in renditions_in_use]
+    if original_unused:
+        unused.append(image.file_path)
+    for path in unused:
+        try:
+            await storage.delete(path)
+        except Exception as e:
+            print(f"❌ Could not delete {path} for image {image_id}: {e}")
+
+    return {"message": "Image deleted", "id": image_id}
+
+
+@app.get("/images/{image_id}/similar")
+async def similar_images(
+    image_id: int,
+    max_distance: int = 8,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user)
+):
+    """The user's images whose dHash is within max_distance bits of this one"""
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise HTTPException(status_code=400, detail=f"max_distance must be between 0 and {MAX_DISTANCE}")
+    if limit < 1 or limit > 100:
+        raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
+
+    image = await db.scalar(select(Image).where(
+        Image.id == image_id,
+        Image.user_id == current_user.id
+    ))
+
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if image.perceptual_hash is None:
+        # Not indexed yet (or indexing failed): hash now and store it
+        value = await run_with_source(
+            run_transform, get_storage(), image.file_path, decode_cache_key(image), dhash
+        )
+        await db.execute(
+            update(Image).where(Image.id == image_id).values(**perceptual_hash_values(value))
+        )
+        await db.commit()
     else:
-        file_path = Path(image.file_path)
+        value = hash_from_hex(image.perceptual_hash)
+
+    matches = await find_similar(
+        db, current_user.id, value, max_distance, limit, exclude_id=image_id
+    )
+
+    return {
+        "image_id": image_id,
+        "max_distance": max_distance,
+        "items": [
+            {"id": match.image_id, "filename": match.filename, "distance": match.distance}
+            for match in matches
+        ]
+    }
+
+
+@app.get("/images/{image_id}/{spec}")
+async def get_rendition(
+    request: Request,
+    image_id: int,
+    spec: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(rate_limited_user)
+):
+    """Serve a rendition described in the URL, e.g. /images/7/w_400,h_300,f_webp.
+
+    The first request renders and stores it; later ones reuse the stored
+    output. The ETag is the transform cache key, which changes whenever the
+    source or the spec does, so the representation behind it never changes.
+    """
+    image = await db.scalar(select(Image).where(
+        Image.id == image_id,
+        Image.user_id == current_user.id
+    ))
+
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    try:
+        rendition = parse_url_spec(spec)
+        validate_operations(rendition.operations)
+    except (InvalidSpec, InvalidOperation) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    output_format = checked_output(request, rendition.output_format, rendition.quality, rendition.preset)
+
+    cache_key = transform_cache_key(
+        image, rendition.operations, output_format, rendition.quality, rendition.preset
+    )
+    etag = f'"{cache_key}"'
+    headers = {
+        "ETag": etag,
+        # Authenticated content: browsers may keep it, shared caches may not
+        "Cache-Control": "private, max-age=31536000, immutable",
+        # f_auto answers differently per Accept header
+        "Vary": "Authorization, Accept" if rendition.output_format == "auto" else "Authorization",
+    }
 
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found on disk")
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
 
-    return FileResponse(path=file_path)
+    cached = await get_transform_cache().lookup(db, cache_key)
+    if cached:
+        output_path = cached.output_file_path
+    else:
+        transformation = await render_and_record(
+            db, current_user.id, image, rendition.operations, output_format,
+            rendition.quality, rendition.preset, cache_key
+        )
+        output_path = transformation.output_file_path
+
+    return await stream_from_storage(
+        get_storage(),
+        output_path,
+        request,
+        media_type=media_type(output_format),
+        headers=headers
+    )
 
 from app.schemas import ImageResponse, PaginatedImages
 from typing import List
+from datetime import datetime
+from sqlalchemy import and_, func, or_
+import base64
+
+def encode_cursor(created_at: datetime, image_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{image_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, image_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(image_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 @app.get("/images", response_model=PaginatedImages)
-def list_user_images(
-    page: int = 1,
+async def list_user_images(
+    cursor: str | None = None,
     size: int = 5,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    page: int | None = Query(None, deprecated=True, description="Use cursor instead"),
+    with_total: bool = Query(False, deprecated=True, description="Count all of the user's images"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
-    if page < 1 or size < 1:
-        raise HTTPException(status_code=400, detail="Page and size must be positive")
+    if size < 1 or size > 100:
+        raise HTTPException(status_code=400, detail="Size must be between 1 and 100")
+    if page is not None and page < 1:
+        raise HTTPException(status_code=400, detail="Page must be positive")
+    if page is not None and cursor:
+        raise HTTPException(status_code=400, detail="Use either page or cursor, not both")
+
+    # The page is picked from images alone, so the work is bounded by the
+    # page size however many images and transformations the user has
+    query = (
+        select(Image.id, Image.filename, Image.created_at)
+        .where(Image.user_id == current_user.id)
+    )
 
-    query = db.query(Image).filter(Image.user_id == current_user.id)
+    # Keyset pagination: seek past the last row of the previous page
+    # using the (user_id, created_at) index rather than OFFSET
+    if cursor:
+        created_at, image_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Image.created_at < created_at,
+                and_(Image.created_at == created_at, Image.id < image_id)
+            )
+        )
 
-    total = query.count()
+    query = query.order_by(Image.created_at.desc(), Image.id.desc())
+    if page is not None:
+        # Deprecated page numbers still cost an OFFSET scan
+        query = query.offset((page - 1) * size)
+    rows = (await db.execute(query.limit(size + 1))).all()
 
-    images = (
-        query
-        .offset((page - 1) * size)
-        .limit(size)
-        .all()
-    )
+    has_more = len(rows) > size
+    rows = rows[:size]
+
+    page_ids = [row.id for row in rows]
+
+    # Transformation counts for this page only, off ix_image_transformations_image_id
+    counts = dict((await db.execute(
+        select(ImageTransformation.image_id, func.count(ImageTransformation.id))
+        .where(ImageTransformation.image_id.in_(page_ids))
+        .group_by(ImageTransformation.image_id)
+    )).all())
+
+    # One query for the renditions of the whole page
+    renditions = {}
+    for image_id, name in await db.execute(
+        select(ImageRendition.image_id, ImageRendition.name)
+        .where(ImageRendition.image_id.in_(page_ids))
+    ):
+        renditions.setdefault(image_id, []).append(name)
 
     result = []
 
-    for image in images:
+    for row in rows:
         result.append({
-            "id": image.id,
-            "filename": image.filename,
-            "created_at": image.created_at,
-            "transformation_count": len(image.transformations)
+            "id": row.id,
+            "filename": row.filename,
+            "created_at": row.created_at,
+            "transformation_count": counts.get(row.id, 0),
+            "renditions": sorted(renditions.get(row.id, []))
         })
 
+    # Deprecated, like page: a count grows with the user's library, so it
+    # is only paid for by clients that still ask for it
+    total = None
+    if with_total or page is not None:
+        total = await db.scalar(
+            select(func.count()).select_from(Image).where(Image.user_id == current_user.id)
+        )
+
     return {
-        "total": total,
-        "page": page,
         "size": size,
-        "items": result
+        "items": result,
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "total": total,
+        "page": page if page is not None else (None if cursor else 1)
     }
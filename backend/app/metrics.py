@@ -0,0 +1,177 @@
+import time
+from typing import Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from app.auth_cache import get_token_cache
+from app.services.executor import get_executor
+from app.storage.cached import CachedStorage
+from app.storage.factory import get_storage
+from app.services.timing import Timings, collecting, record, set_observer
+
+# Stages range from sub-millisecond filters to multi-second AVIF encodes of
+# large images; queries are a couple of orders of magnitude faster
+IMAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time until the response finished, by route template",
+    ["method", "route", "status"], buckets=IMAGE_BUCKETS
+)
+TRANSFORM_SECONDS = Histogram(
+    "image_transform_seconds", "Wall time of a worker pool job, including time queued",
+    buckets=IMAGE_BUCKETS
+)
+DECODE_SECONDS = Histogram(
+    "image_decode_seconds", "Source decode time; strips mode includes the filters applied per band, cached counts decode cache hits",
+    ["mode"], buckets=IMAGE_BUCKETS
+)
+ACTION_SECONDS = Histogram(
+    "image_action_seconds", "Time spent in one pipeline operation", ["action"], buckets=IMAGE_BUCKETS
+)
+ENCODE_SECONDS = Histogram(
+    "image_encode_seconds", "Output encode time", ["format"], buckets=IMAGE_BUCKETS
+)
+STORAGE_SECONDS = Histogram(
+    "storage_operation_seconds", "StorageBackend call time", ["operation"], buckets=IMAGE_BUCKETS
+)
+DB_SECONDS = Histogram(
+    "db_query_seconds", "Time per executed SQL statement", buckets=DB_BUCKETS
+)
+
+TRANSFORM_CACHE_LOOKUPS = Counter(
+    "transform_cache_lookups_total", "Transform cache lookups by where the key was found",
+    ["result"]
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total", "Requests rejected with 429 by per-user quotas",
+    ["route", "reason"]
+)
+TRANSFORMS_IN_FLIGHT = Gauge(
+    "transform_jobs_in_flight", "Jobs admitted to the worker pool and not yet finished"
+)
+TRANSFORMS_IN_FLIGHT.set_function(lambda: get_executor().in_flight)
+
+
+class AuthCacheCollector:
+    """Expose the token cache's own counters instead of counting twice"""
+
+    def collect(self):
+        stats = get_token_cache().stats()
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            yield CounterMetricFamily(f"auth_cache_{name}", f"Token cache {name}", value=stats[name])
+        yield GaugeMetricFamily("auth_cache_entries", "Tokens currently cached", value=stats["size"])
+
+
+REGISTRY.register(AuthCacheCollector())
+
+
+class StorageCacheCollector:
+    """Counters of the read-through storage cache, when one is configured"""
+
+    def collect(self):
+        storage = get_storage()
+        if not isinstance(storage, CachedStorage):
+            return
+        stats = storage.stats()
+        lookups = CounterMetricFamily("storage_cache_lookups", "Storage cache lookups by outcome", labels=["result"])
+        for result in ("memory_hits", "disk_hits", "misses", "coalesced", "bypassed"):
+            lookups.add_metric([result.removesuffix("_hits")], stats[result])
+        yield lookups
+        yield CounterMetricFamily("storage_cache_evictions", "Storage cache evictions", value=stats["evictions"])
+        cached = GaugeMetricFamily("storage_cache_bytes", "Bytes held by the storage cache", labels=["tier"])
+        cached.add_metric(["memory"], stats["memory_bytes"])
+        cached.add_metric(["disk"], stats["disk_bytes"])
+        yield cached
+
+
+REGISTRY.register(StorageCacheCollector())
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    kind, _, label = stage.partition(":")
+    if kind == "decode":
+        DECODE_SECONDS.labels(mode=label or "full").observe(seconds)
+    elif kind == "action":
+        ACTION_SECONDS.labels(action=label).observe(seconds)
+    elif kind == "encode":
+        ENCODE_SECONDS.labels(format=label).observe(seconds)
+    elif kind == "storage":
+        STORAGE_SECONDS.labels(operation=label).observe(seconds)
+    elif kind == "db":
+        DB_SECONDS.observe(seconds)
+    elif kind == "transform":
+        TRANSFORM_SECONDS.observe(seconds)
+
+
+set_observer(observe_stage)
+
+
+def instrument_engine(engine) -> None:
+    """Record every statement's execution time as a "db" stage"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        record("db", time.perf_counter() - context._query_started)
+
+
+def route_name(scope) -> str:
+    # Route templates rather than raw paths keep label cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+def server_timing(timings: Timings, total: float) -> str:
+    """Sum repeated stages, e.g. every query of a request into one "db" entry"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+
+    # Metric names are tokens, which may not contain ":"
+    entries = [f"{stage.replace(':', '-')};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """Collect stage timings per request into a Server-Timing header and the latency histogram.
+
+    Plain ASGI rather than BaseHTTPMiddleware so the endpoint runs in this
+    context and its records land in this request's list.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        with collecting() as timings:
+            async def send_with_timing(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(timings, time.perf_counter() - start)
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                HTTP_SECONDS.labels(
+                    scope["method"], route_name(scope), str(status_code)
+                ).observe(time.perf_counter() - start)
+
@@ -0,0 +1,45 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db import Base
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+# Schema the service had before migrations existed, when tables only ever
+# came from Base.metadata.create_all
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def migrate(engine: Engine) -> None:
+    """Bring the database schema up to date.
+
+    An empty database gets every table from the models and is stamped at
+    the latest revision. A database without an alembic_version table but
+    with tables was created by create_all from the baseline models, so it
+    is stamped at the baseline and then upgraded like any other.
+    """
+    import app.models  # noqa: F401  (registers every table on Base.metadata)
+
+    with engine.begin() as connection:
+        config = alembic_config(connection)
+        tables = set(inspect(connection).get_table_names())
+
+        if not tables:
+            Base.metadata.create_all(bind=connection)
+            command.stamp(config, "head")
+            return
+
+        if "alembic_version" not in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db import Base
 from sqlalchemy import DateTime
@@ -14,19 +14,39 @@ class User(Base):
 
 class Image(Base):
   __tablename__ = "images"
+  # Serves the per-user listing, ordered and paginated by (created_at, id)
+  __table_args__ = (
+      Index("ix_images_user_id_created_at", "user_id", "created_at"),
+      # One index per dHash band for multi-index near-duplicate lookup
+      Index("ix_images_user_id_phash_band0", "user_id", "phash_band0"),
+      Index("ix_images_user_id_phash_band1", "user_id", "phash_band1"),
+      Index("ix_images_user_id_phash_band2", "user_id", "phash_band2"),
+      Index("ix_images_user_id_phash_band3", "user_id", "phash_band3"),
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   filename = Column(String, nullable=False)
   file_path = Column(String, nullable=False)
+  size_bytes = Column(Integer)
+  # Read from the header at upload; quotas weigh transforms by megapixels
+  width = Column(Integer)
+  height = Column(Integer)
+  content_hash = Column(String, index=True)
+  perceptual_hash = Column(String)
+  phash_band0 = Column(Integer)
+  phash_band1 = Column(Integer)
+  phash_band2 = Column(Integer)
+  phash_band3 = Column(Integer)
   user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
   user = relationship("User", back_populates="images")
 
 
-  created_at = Column(DateTime, default=datetime.utcnow)
+  # NOT NULL because the listing's keyset cursor is built from it
+  created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -35,12 +55,90 @@ class ImageTransformation(Base):
     __tablename__ = "image_transformations"
 
     id = Column(Integer, primary_key=True, index=True)
-    image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=False, index=True)
 
     action = Column(String, nullable=False)
     params = Column(String, nullable=False)
     output_file_path = Column(String, nullable=False)
+    cache_key = Column(String, unique=True, index=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
     image = relationship("Image", backref="transformations")
+
+
+class ImageRendition(Base):
+    __tablename__ = "image_renditions"
+    __table_args__ = (UniqueConstraint("image_id", "name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=False, index=True)
+
+    name = Column(String, nullable=False)
+    output_format = Column(String, nullable=False)
+    output_file_path = Column(String, nullable=False)
+    size_bytes = Column(Integer)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    image = relationship("Image", backref="renditions")
+
+
+class TransformJob(Base):
+    __tablename__ = "transform_jobs"
+    # Workers claim the oldest runnable job for a status
+    __table_args__ = (Index("ix_transform_jobs_status_available_at", "status", "available_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
+
+    # queued -> running -> succeeded, or back to queued for a retry, or dead
+    # once max_attempts is used up
+    status = Column(String, nullable=False, default="queued")
+    payload = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    error = Column(String)
+    worker_id = Column(String)
+    transformation_id = Column(Integer, ForeignKey("image_transformations.id"))
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    # Renewed by the worker while it renders; a running job whose heartbeat
+    # is older than JOB_LEASE_SECONDS is presumed lost
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class StoredBlob(Base):
+    """One stored original shared by every Image with the same content hash"""
+    __tablename__ = "stored_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String, unique=True, nullable=False)
+    file_path = Column(String, nullable=False)
+    size_bytes = Column(Integer)
+    ref_count = Column(Integer, nullable=False, default=1)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RateLimitBucket(Base):
+    """Token bucket state for the sql rate-limit backend"""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # Unix time of the last refill
+    updated_at = Column(Float, nullable=False)
+
+
+class RateLimitLease(Base):
+    """One held concurrency slot for the sql rate-limit backend; expires on its own"""
+    __tablename__ = "rate_limit_leases"
+
+    id = Column(String, primary_key=True)
+    key = Column(String, nullable=False, index=True)
+    expires_at = Column(Float, nullable=False)
@@ -0,0 +1,33 @@
+from abc import ABC, abstractmethod
+
+
+class RateLimitBackend(ABC):
+    """Shared state behind per-user quotas.
+
+    Every method is a single atomic step in the backend, so any number of
+    API processes can share one SQL database or Redis without a lock
+    around the calls. Times are Unix seconds from the caller.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float, now: float) -> float:
+        """
+        Refill the bucket, then take cost tokens if there are enough. Returns
+        0.0 on success, otherwise the seconds until cost tokens will be there
+        """
+        pass
+
+    @abstractmethod
+    async def acquire(self, key: str, lease_id: str, limit: int, expires_at: float, now: float) -> bool:
+        """
+        Hold one of limit slots under lease_id until release or expires_at,
+        so a crashed process cannot leak slots for good
+        """
+        pass
+
+    @abstractmethod
+    async def release(self, key: str, lease_id: str) -> None:
+        """
+        Give a slot back; unknown or expired leases are ignored
+        """
+        pass
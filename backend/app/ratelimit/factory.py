@@ -0,0 +1,21 @@
+from functools import lru_cache
+
+from app.ratelimit.base import RateLimitBackend
+from app.ratelimit.memory import MemoryRateLimitBackend
+from app.ratelimit.redis_backend import RedisRateLimitBackend
+from app.ratelimit.sql import SQLRateLimitBackend
+from app.config import settings
+
+
+@lru_cache()
+def get_rate_limit_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimitBackend()
+
+    if settings.RATE_LIMIT_BACKEND == "sql":
+        return SQLRateLimitBackend()
+
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(settings.RATE_LIMIT_REDIS_URL)
+
+    raise ValueError("Invalid RATE_LIMIT_BACKEND configuration")
@@ -0,0 +1,41 @@
+import threading
+from typing import Dict, Tuple
+
+from app.ratelimit.base import RateLimitBackend
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """State in this process only: limits apply per API worker, not per deployment"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._leases: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float, now: float) -> float:
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * refill_per_second)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / refill_per_second
+
+    async def acquire(self, key: str, lease_id: str, limit: int, expires_at: float, now: float) -> bool:
+        with self._lock:
+            leases = {
+                lease: expiry for lease, expiry in self._leases.get(key, {}).items() if expiry > now
+            }
+            admitted = len(leases) < limit
+            if admitted:
+                leases[lease_id] = expires_at
+            self._leases[key] = leases
+            return admitted
+
+    async def release(self, key: str, lease_id: str) -> None:
+        with self._lock:
+            leases = self._leases.get(key, {})
+            leases.pop(lease_id, None)
+            if not leases:
+                self._leases.pop(key, None)
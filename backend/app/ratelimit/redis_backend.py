@@ -0,0 +1,58 @@
+from redis import asyncio as redis
+
+from app.ratelimit.base import RateLimitBackend
+
+# Both scripts run atomically inside Redis. Lua numbers come back as
+# integers, so the wait is returned as a string.
+TAKE_SCRIPT = """
+local capacity, rate, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+-- A full bucket carries no information, so let idle keys disappear
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+ACQUIRE_SCRIPT = """
+local limit, expires_at, now = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+  return 0
+end
+redis.call('ZADD', KEYS[1], expires_at, ARGV[1])
+-- The key lives as long as its longest lease; relative, since lease
+-- times come from the API server's clock, not Redis's
+local latest = tonumber(redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')[2])
+redis.call('PEXPIRE', KEYS[1], math.ceil((latest - now) * 1000) + 1000)
+return 1
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """State in Redis, or anything that speaks its protocol and Lua scripting
+    (Valkey, KeyDB, a local stand-in), shared by every API process"""
+
+    def __init__(self, url: str | None = None, client=None):
+        self.client = client if client is not None else redis.from_url(url)
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float, now: float) -> float:
+        wait = await self._take(keys=[f"bucket:{key}"], args=[capacity, refill_per_second, cost, now])
+        return float(wait)
+
+    async def acquire(self, key: str, lease_id: str, limit: int, expires_at: float, now: float) -> bool:
+        admitted = await self._acquire(keys=[f"leases:{key}"], args=[lease_id, limit, expires_at, now])
+        return bool(admitted)
+
+    async def release(self, key: str, lease_id: str) -> None:
+        await self.client.zrem(f"leases:{key}", lease_id)
@@ -0,0 +1,74 @@
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import AsyncSessionLocal
+from app.models import RateLimitBucket, RateLimitLease
+from app.ratelimit.base import RateLimitBackend
+
+
+class SQLRateLimitBackend(RateLimitBackend):
+    """State in the application database, shared by every API process.
+
+    Each call runs in its own short transaction, independent of the
+    request's session. Refill and take are one conditional UPDATE, like
+    job claiming in app.services.jobs, so it is atomic on SQLite and
+    PostgreSQL alike.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def take(self, key: str, cost: float, capacity: float, refill_per_second: float, now: float) -> float:
+        refilled = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * refill_per_second
+        available = case((refilled > capacity, capacity), else_=refilled)
+
+        async with self.session_factory() as db:
+            while True:
+                result = await db.execute(
+                    update(RateLimitBucket)
+                    .where(RateLimitBucket.key == key, available >= cost)
+                    .values(tokens=available - cost, updated_at=now)
+                )
+                if result.rowcount:
+                    await db.commit()
+                    return 0.0
+
+                tokens = await db.scalar(select(available).where(RateLimitBucket.key == key))
+                if tokens is not None:
+                    await db.rollback()
+                    return (cost - tokens) / refill_per_second
+
+                # First request for this key; a concurrent first request may win
+                try:
+                    await db.execute(insert(RateLimitBucket).values(
+                        key=key, tokens=capacity - cost, updated_at=now
+                    ))
+                    await db.commit()
+                    return 0.0
+                except IntegrityError:
+                    await db.rollback()
+
+    async def acquire(self, key: str, lease_id: str, limit: int, expires_at: float, now: float) -> bool:
+        async with self.session_factory() as db:
+            await db.execute(delete(RateLimitLease).where(
+                RateLimitLease.key == key, RateLimitLease.expires_at <= now
+            ))
+            # Insert first, then count what is committed: two racing requests
+            # can both back out, but never both get in past the limit
+            await db.execute(insert(RateLimitLease).values(id=lease_id, key=key, expires_at=expires_at))
+            await db.commit()
+
+            held = await db.scalar(select(func.count()).select_from(RateLimitLease).where(
+                RateLimitLease.key == key, RateLimitLease.expires_at > now
+            ))
+            if held <= limit:
+                return True
+
+            await db.execute(delete(RateLimitLease).where(RateLimitLease.id == lease_id))
+            await db.commit()
+            return False
+
+    async def release(self, key: str, lease_id: str) -> None:
+        async with self.session_factory() as db:
+            await db.execute(delete(RateLimitLease).where(RateLimitLease.id == lease_id))
+            await db.commit()
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import List
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Literal
 from datetime import datetime
 
 class ImageResponse(BaseModel):
@@ -7,15 +7,20 @@ class ImageResponse(BaseModel):
   filename: str
   created_at: datetime
   transformation_count: int
+  renditions: List[str] = []
 
   class Config:
     from_attributes = True
 
 class PaginatedImages(BaseModel):
-  total: int
-  page: int
   size: int
   items: List[ImageResponse]
+  next_cursor: str | None = None
+  # Kept for clients written against page-numbered listing; new clients
+  # follow next_cursor
+  # Only counted when asked for (with_total) or paging by number
+  total: int | None = Field(None, json_schema_extra={"deprecated": True})
+  page: int | None = Field(None, json_schema_extra={"deprecated": True})
 
 class UserCreate(BaseModel):
   email: EmailStr
@@ -24,3 +29,33 @@ class UserCreate(BaseModel):
 class UserLogin(BaseModel):
   email: EmailStr
   password: str
+
+class TransformOperation(BaseModel):
+  action: Literal[
+    "resize", "thumbnail", "crop", "rotate", "flip_horizontal", "flip_vertical",
+    "mirror", "grayscale", "sepia", "invert", "brightness_contrast"
+  ]
+  width: int | None = None
+  height: int | None = None
+  left: int | None = None
+  top: int | None = None
+  right: int | None = None
+  bottom: int | None = None
+  angle: int | None = None
+  brightness: float | None = None
+  contrast: float | None = None
+
+class PipelineRequest(BaseModel):
+  image_id: int
+  operations: List[TransformOperation]
+  # "auto" picks AVIF, WebP or JPEG from the Accept header
+  output_format: str = "jpeg"
+  quality: int | None = None
+  preset: str | None = None
+
+class BatchTransformRequest(BaseModel):
+  image_ids: List[int]
+  operations: List[TransformOperation]
+  output_format: str = "jpeg"
+  quality: int | None = None
+  preset: str | None = None
@@ -1,10 +1,15 @@
+import asyncio
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from app.config import settings
 
 def hash_password(password: str) -> str:
     """Hash password using bcrypt directly"""
     # Ensure password is within bcrypt's 72-byte limit
     password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
@@ -15,23 +20,61 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     hashed_bytes = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_bytes, hashed_bytes)
 
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with a different cost than configured"""
+    # Modular crypt format: $2b$<rounds>$<salt+hash>
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+@lru_cache()
+def get_password_executor() -> ThreadPoolExecutor:
+    # bcrypt releases the GIL, so threads give real parallelism while the
+    # bounded pool caps how many cores a signup burst can take
+    return ThreadPoolExecutor(
+        max_workers=settings.PASSWORD_HASH_WORKERS,
+        thread_name_prefix="bcrypt",
+    )
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_password_executor(), verify_password, plain_password, hashed_password
+    )
+
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import settings
-from app.db import get_db
+from app.auth_cache import AuthenticatedUser, get_token_cache
+from app.db import get_async_db
 from app.models import User
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthenticatedUser:
+    """The one auth dependency for every protected endpoint.
+
+    Repeat tokens are answered from the token cache, skipping both the
+    signature check and the user lookup.
+    """
+    cache = get_token_cache()
+    cached = cache.get(token)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -44,17 +87,23 @@ def get_current_user(
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        user_id: int = payload.get("sub")
+        user_id = int(payload.get("sub"))
 
-        if user_id is None:
-            raise credentials_exception
-
-    except JWTError:
+    except (JWTError, TypeError, ValueError):
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
+    row = (await db.execute(
+        select(User.id, User.email).where(User.id == user_id)
+    )).first()
 
-    if user is None:
+    if row is None:
         raise credentials_exception
 
-    return user
\ No newline at end of file
+    user = AuthenticatedUser(id=row.id, email=row.email)
+    cache.put(token, user, token_expires_at=payload.get("exp"))
+    return user
+
+
+@event.listens_for(User, "after_delete")
+def forget_deleted_user(mapper, connection, target):
+    get_token_cache().invalidate_user(target.id)
@@ -0,0 +1,81 @@
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Image, ImageRendition, StoredBlob
+from app.storage.base import StorageBackend, StoredFile
+
+
+async def acquire_blob(db: AsyncSession, storage: StorageBackend, stored: StoredFile) -> tuple[str, bool]:
+    """Take a reference on the blob for stored.content_hash.
+
+    Returns the path the Image should point at and whether an existing blob
+    was reused, in which case the freshly stored copy is deleted. Call it
+    before adding anything else to the session (a lost insert race rolls
+    the transaction back); the caller commits, so the reference and the
+    Image row land together.
+    """
+    while True:
+        claimed = await db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.content_hash == stored.content_hash)
+            .values(ref_count=StoredBlob.ref_count + 1)
+        )
+        if claimed.rowcount:
+            file_path = await db.scalar(
+                select(StoredBlob.file_path).where(StoredBlob.content_hash == stored.content_hash)
+            )
+            await storage.delete(stored.path)
+            return file_path, True
+
+        db.add(StoredBlob(
+            content_hash=stored.content_hash,
+            file_path=stored.path,
+            size_bytes=stored.size,
+            ref_count=1
+        ))
+        try:
+            await db.flush()
+            return stored.path, False
+        except IntegrityError:
+            # A concurrent upload of the same bytes created it first
+            await db.rollback()
+
+
+async def release_blob(db: AsyncSession, content_hash: str | None, file_path: str) -> bool:
+    """Drop one reference; True when the stored file is no longer used.
+
+    Call after the Image row is deleted in the same transaction and delete
+    the file only once that transaction has committed.
+    """
+    released = await db.execute(
+        update(StoredBlob)
+        .where(StoredBlob.content_hash == content_hash)
+        .values(ref_count=StoredBlob.ref_count - 1)
+    )
+
+    if released.rowcount:
+        # A concurrent acquire that got in first keeps the row, and the file
+        removed = await db.execute(
+            delete(StoredBlob).where(
+                StoredBlob.content_hash == content_hash,
+                StoredBlob.ref_count <= 0
+            )
+        )
+        return bool(removed.rowcount)
+
+    # Uploads from before blobs were tracked own their file outright
+    shared = await db.scalar(select(func.count(Image.id)).where(Image.file_path == file_path))
+    return not shared
+
+
+async def rendition_paths_in_use(db: AsyncSession, paths: list[str]) -> set[str]:
+    """Rendition outputs still referenced by some image"""
+    if not paths:
+        return set()
+    rows = await db.scalars(
+        select(ImageRendition.output_file_path)
+        .where(ImageRendition.output_file_path.in_(paths))
+        .distinct()
+    )
+    return set(rows)
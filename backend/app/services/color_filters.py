@@ -0,0 +1,98 @@
+from typing import Sequence, Tuple
+
+from PIL import Image
+
+# A color matrix is a 3x4 affine transform in row-major order, exactly the
+# layout Pillow's ``Image.convert(mode, matrix)`` expects:
+#
+#   R' = m[0] * R + m[1] * G + m[2]  * B + m[3]
+#   G' = m[4] * R + m[5] * G + m[6]  * B + m[7]
+#   B' = m[8] * R + m[9] * G + m[10] * B + m[11]
+#
+# Results are rounded and clipped to 0..255 inside Pillow's C loop, so a whole
+# frame is processed in a single pass without touching Python per pixel.
+ColorMatrix = Tuple[float, ...]
+
+SEPIA: ColorMatrix = (
+    0.393, 0.769, 0.189, 0.0,
+    0.349, 0.686, 0.168, 0.0,
+    0.272, 0.534, 0.131, 0.0,
+)
+
+# ITU-R 601-2 luma, the same weights Pillow uses for convert("L")
+GRAYSCALE: ColorMatrix = (
+    0.299, 0.587, 0.114, 0.0,
+    0.299, 0.587, 0.114, 0.0,
+    0.299, 0.587, 0.114, 0.0,
+)
+
+INVERT: ColorMatrix = (
+    -1.0, 0.0, 0.0, 255.0,
+    0.0, -1.0, 0.0, 255.0,
+    0.0, 0.0, -1.0, 255.0,
+)
+
+
+def as_color_matrix(matrix: Sequence[float]) -> ColorMatrix:
+    """Normalise a 3x3 (no offset) or 3x4 matrix to the 3x4 layout"""
+    values = tuple(float(v) for v in matrix)
+
+    if len(values) == 9:
+        return (
+            values[0], values[1], values[2], 0.0,
+            values[3], values[4], values[5], 0.0,
+            values[6], values[7], values[8], 0.0,
+        )
+
+    if len(values) != 12:
+        raise ValueError("Color matrix must have 9 (3x3) or 12 (3x4) values")
+
+    return values
+
+
+def brightness_contrast_matrix(
+    brightness: float = 0.0,
+    contrast: float = 1.0
+) -> ColorMatrix:
+    """Scale around mid-grey by ``contrast`` then shift by ``brightness`` levels"""
+    offset = 128.0 * (1.0 - contrast) + brightness
+    return (
+        contrast, 0.0, 0.0, offset,
+        0.0, contrast, 0.0, offset,
+        0.0, 0.0, contrast, offset,
+    )
+
+
+def channel_mix_matrix(
+    red: Sequence[float] = (1.0, 0.0, 0.0),
+    green: Sequence[float] = (0.0, 1.0, 0.0),
+    blue: Sequence[float] = (0.0, 0.0, 1.0)
+) -> ColorMatrix:
+    """Build a matrix where each output channel is a weighted mix of R, G, B"""
+    return as_color_matrix(tuple(red) + tuple(green) + tuple(blue))
+
+
+def apply_color_matrix(image: Image.Image, matrix: Sequence[float]) -> Image.Image:
+    """Apply a 3x3/3x4 color matrix to the whole image in one bulk pass.
+
+    Alpha is carried over untouched, including the transparency of palette
+    and single-band images; everything else is converted to RGB first.
+    """
+    matrix = as_color_matrix(matrix)
+    alpha = None
+
+    if "transparency" in image.info:
+        image = image.convert("RGBA")
+    if "A" in image.getbands():
+        alpha = image.getchannel("A")
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    result = image.convert("RGB", matrix)
+
+    if alpha is not None:
+        result.putalpha(alpha)
+
+    return result
+
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Set, Tuple
+
+from PIL import Image
+
+from app.services.image_transformer import REDUCING_GAP
+
+# Decoded sources kept by the process that rendered them. Transforms run in
+# pool workers and the pool hands each job to whichever worker is free, so
+# every worker holds its own cache and a hot image ends up decoded at most
+# once per worker. Set from Settings by configure_decode_cache; like the
+# pixel limits in image_transformer, nothing here reads Settings itself.
+MAX_BYTES = 256 * 1024 * 1024
+
+# A single entry may take at most this share of the budget, so one huge
+# source cannot flush everything else
+MAX_ENTRY_SHARE = 4
+
+
+class SourceRequired(Exception):
+    """Raised by a worker function called without a source whose decoded
+    bitmap is not in this worker's cache; see run_with_source"""
+
+
+class DecodedEntry(NamedTuple):
+    image: Image.Image
+    # False when decoded at reduced scale (JPEG draft); such a level only
+    # serves requests that would have been downscaled at least as far
+    full: bool
+    nbytes: int
+
+
+def pixel_bytes(image: Image.Image) -> int:
+    """Memory Pillow holds for a decoded image: 1 byte per pixel for
+    single-band 8-bit modes, 2 for I;16, 4 for everything else (RGB included)"""
+    if image.mode in ("1", "L", "P"):
+        per_pixel = 1
+    elif image.mode.startswith("I;16"):
+        per_pixel = 2
+    else:
+        per_pixel = 4
+    return image.width * image.height * per_pixel
+
+
+class DecodedImageCache:
+    """LRU of decoded bitmaps bounded by their total pixel bytes.
+
+    A key (image id and content hash) may hold several pyramid levels: the
+    full decode and JPEG draft decodes at 1/2, 1/4 or 1/8 scale. Lookups
+    with a downscale target take the smallest level that is still at least
+    REDUCING_GAP times the target, as load_image would have decoded.
+
+    Cached images are shared between renders and must never be modified in
+    place; every action in the pipeline returns a new image.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Hashable, Tuple[int, int]], DecodedEntry]" = OrderedDict()
+        self._levels: Dict[Hashable, Set[Tuple[int, int]]] = {}
+        self._used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, target_size: Tuple[int, int] | None = None) -> Image.Image | None:
+        best = None
+        for size in self._levels.get(key, ()):
+            entry = self._entries[(key, size)]
+            if not entry.full and (
+                target_size is None
+                or size[0] < target_size[0] * REDUCING_GAP
+                or size[1] < target_size[1] * REDUCING_GAP
+            ):
+                continue
+            if best is None or size[0] * size[1] < best[0] * best[1]:
+                best = size
+
+        if best is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((key, best))
+        self.hits += 1
+        return self._entries[(key, best)].image
+
+    def put(self, key: Hashable, image: Image.Image, full: bool) -> None:
+        """Keep a loaded image; stores a copy, since the original still belongs to its file"""
+        nbytes = pixel_bytes(image)
+        if nbytes > self.max_bytes // MAX_ENTRY_SHARE or (key, image.size) in self._entries:
+            return
+
+        self._entries[(key, image.size)] = DecodedEntry(image.copy(), full, nbytes)
+        self._levels.setdefault(key, set()).add(image.size)
+        self._used += nbytes
+        while self._used > self.max_bytes:
+            (evicted_key, size), entry = self._entries.popitem(last=False)
+            self._levels[evicted_key].discard(size)
+            if not self._levels[evicted_key]:
+                del self._levels[evicted_key]
+            self._used -= entry.nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._levels.clear()
+        self._used = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_cache = DecodedImageCache(MAX_BYTES)
+
+
+def configure_decode_cache(max_bytes: int) -> None:
+    global MAX_BYTES, _cache
+    MAX_BYTES = max_bytes
+    _cache = DecodedImageCache(max_bytes)
+
+
+def get_decode_cache() -> DecodedImageCache:
+    return _cache
+
+
+async def run_with_source(
+    run: Callable[..., Awaitable[Any]],
+    storage,
+    file_path: str,
+    source_key: Hashable | None,
+    func: Callable[..., Any],
+    *args
+) -> Any:
+    """Call ``run(func, source, *args, source_key)`` and only fetch the source
+    from storage if the worker that takes the job has not decoded it yet.
+
+    The first call goes out without a source; a worker holding the bitmap
+    answers from its cache, any other raises SourceRequired and the call is
+    repeated with the source read from storage. A miss therefore costs one
+    extra round trip to the pool (well under a millisecond of pickling for
+    a key and a few dicts) to save a storage read on every hit.
+
+    Each worker keeps its own cache and the pool gives a job to whichever
+    worker is free, so a probe hits with the share of workers that have
+    decoded the image: a source rendered repeatedly is cached by all of
+    them after at most one decode each, while a source rendered once (most
+    fresh uploads, and images too big for the cache) always pays the probe.
+    """
+    if source_key is not None:
+        try:
+            return await run(func, None, *args, source_key)
+        except SourceRequired:
+            pass
+    source = await storage.read_source(file_path)
+    return await run(func, source, *args, source_key)
@@ -0,0 +1,166 @@
+from io import BytesIO
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from PIL import Image, features
+
+# Like pipeline.py this runs inside transform worker processes, so it only
+# depends on Pillow.
+
+# Pillow registers encoders under these names
+FORMAT_ALIASES = {"jpg": "jpeg", "tif": "tiff"}
+
+PRESETS = ("fast", "balanced", "small")
+DEFAULT_PRESET = "balanced"
+
+# Formats tried for output_format="auto", best compression first
+NEGOTIATION_ORDER = ("avif", "webp", "jpeg")
+FALLBACK_FORMAT = "jpeg"
+
+
+class EncoderSpec(NamedTuple):
+    pil_format: str
+    media_type: str
+    # Pillow plugin that must be compiled in, if any
+    feature: str | None
+    # Used when the request leaves quality unset; None for lossless formats
+    default_quality: int | None
+    # Encoder effort per preset: fast favours CPU time, small favours bytes
+    presets: Dict[str, Dict[str, Any]]
+    prepare: Callable[[Image.Image], Image.Image]
+
+
+def _for_jpeg(image: Image.Image) -> Image.Image:
+    # No alpha or palette in JPEG
+    return image if image.mode in ("RGB", "L", "CMYK") else image.convert("RGB")
+
+
+def _for_rgba(image: Image.Image) -> Image.Image:
+    # WebP and AVIF encode RGB(A) only
+    if image.mode in ("RGB", "RGBA"):
+        return image
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _as_is(image: Image.Image) -> Image.Image:
+    return image
+
+
+ENCODERS: Dict[str, EncoderSpec] = {
+    "jpeg": EncoderSpec("JPEG", "image/jpeg", None, 85, {
+        "fast": {},
+        "balanced": {"optimize": True},
+        "small": {"optimize": True, "progressive": True},
+    }, _for_jpeg),
+    "png": EncoderSpec("PNG", "image/png", None, None, {
+        "fast": {"compress_level": 1},
+        "balanced": {"compress_level": 6},
+        "small": {"compress_level": 9, "optimize": True},
+    }, _as_is),
+    "webp": EncoderSpec("WEBP", "image/webp", "webp", 80, {
+        "fast": {"method": 0},
+        "balanced": {"method": 4},
+        "small": {"method": 6},
+    }, _for_rgba),
+    "avif": EncoderSpec("AVIF", "image/avif", "avif", 60, {
+        "fast": {"speed": 10},
+        "balanced": {"speed": 8},
+        "small": {"speed": 6},
+    }, _for_rgba),
+    "gif": EncoderSpec("GIF", "image/gif", None, None, {
+        "fast": {},
+        "balanced": {},
+        "small": {"optimize": True},
+    }, _as_is),
+    "tiff": EncoderSpec("TIFF", "image/tiff", None, None, {
+        "fast": {},
+        "balanced": {"compression": "tiff_lzw"},
+        "small": {"compression": "tiff_adobe_deflate"},
+    }, _as_is),
+    "bmp": EncoderSpec("BMP", "image/bmp", None, None, {
+        "fast": {},
+        "balanced": {},
+        "small": {},
+    }, _as_is),
+}
+
+
+def normalize_format(output_format: str) -> str:
+    output_format = output_format.lower()
+    return FORMAT_ALIASES.get(output_format, output_format)
+
+
+def available_formats() -> List[str]:
+    """Output formats this Pillow build can encode"""
+    return [
+        name for name, spec in ENCODERS.items()
+        if spec.feature is None or features.check(spec.feature)
+    ]
+
+
+def check_encoding(output_format: str, quality: int | None = None, preset: str | None = None) -> None:
+    """Raise ValueError for anything encode() would reject; output_format is normalized"""
+    if output_format not in available_formats():
+        raise ValueError(f"Unsupported output format {output_format!r}")
+    if preset is not None and preset not in PRESETS:
+        raise ValueError(f"Preset must be one of {', '.join(PRESETS)}")
+    if quality is not None and not 1 <= quality <= 95:
+        raise ValueError("Quality must be between 1 and 95")
+
+
+def media_type(output_format: str) -> str:
+    return ENCODERS[output_format].media_type
+
+
+def encoder_options(output_format: str, quality: int | None = None, preset: str | None = None) -> Dict[str, Any]:
+    spec = ENCODERS[output_format]
+    options = dict(spec.presets[preset or DEFAULT_PRESET])
+    if spec.default_quality is not None:
+        options["quality"] = quality or spec.default_quality
+    return options
+
+
+def encode(image: Image.Image, output_format: str, quality: int | None = None, preset: str | None = None) -> bytes:
+    check_encoding(output_format, quality, preset)
+
+    buffer = BytesIO()
+    ENCODERS[output_format].prepare(image).save(
+        buffer,
+        format=ENCODERS[output_format].pil_format,
+        **encoder_options(output_format, quality, preset)
+    )
+    return buffer.getvalue()
+
+
+def negotiate_format(accept: str | None, candidates=NEGOTIATION_ORDER) -> str:
+    """Pick the best candidate the client accepts, honouring q-values.
+
+    Wildcards only count for formats every client can show, so a bare
+    ``*/*`` gets JPEG rather than AVIF.
+    """
+    weights = {}
+    for part in (accept or "").split(","):
+        media, *params = [piece.strip() for piece in part.split(";")]
+        if not media:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[media.lower()] = weight
+
+    available = available_formats()
+    best, best_weight = FALLBACK_FORMAT, 0.0
+    for name in candidates:
+        if name not in available:
+            continue
+        explicit = weights.get(ENCODERS[name].media_type)
+        if explicit is None and name == FALLBACK_FORMAT:
+            explicit = weights.get("image/*", weights.get("*/*"))
+        if explicit is not None and explicit > best_weight:
+            best, best_weight = name, explicit
+    return best
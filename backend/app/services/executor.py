@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from app.config import settings
+from app.services.decode_cache import configure_decode_cache
+from app.services.image_transformer import configure_limits
+from app.services.timing import record, run_timed, timed
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class TransformTimeout(Exception):
+    """Raised when a job does not finish within the configured timeout"""
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process died (OOM kill, segfault) under a job;
+    the pool has already been replaced, so the job may simply be retried"""
+
+
+def initialize_worker(limits, decode_cache_bytes: int) -> None:
+    configure_limits(*limits)
+    configure_decode_cache(decode_cache_bytes)
+
+
+class TransformExecutor:
+    """Process pool for CPU-bound image work with bounded admission.
+
+    At most ``workers + queue_depth`` jobs are admitted at once; anything
+    beyond that is rejected immediately instead of piling up behind the pool.
+    A slot is only released when the job really finishes in its worker, so a
+    timed-out job still counts against capacity until the process is free.
+
+    A worker dying breaks the whole ProcessPoolExecutor: every job on it
+    fails and it refuses new ones. The first caller to notice swaps in a
+    fresh pool; jobs that were on the broken one raise WorkerCrashed.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, timeout: float):
+        self.workers = workers
+        self.capacity = workers + queue_depth
+        self.timeout = timeout
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            # Spawned workers do not read Settings themselves
+            initializer=initialize_worker,
+            initargs=(
+                (settings.MAX_IMAGE_PIXELS, settings.MAX_DECODE_PIXELS, settings.TRANSFORM_STRIP_BYTES),
+                settings.DECODE_CACHE_BYTES,
+            ),
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise ExecutorSaturated("Transform queue is full")
+            self._in_flight += 1
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._pool_lock:
+            # Every job on the broken pool fails at once; only the first replaces it
+            if self._pool is broken:
+                self._pool = self._new_pool()
+                broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, func, *args):
+        """Submit to the current pool, replacing it first if it is already
+        broken; returns the pool the job went to along with its future"""
+        pool = self._pool
+        try:
+            return pool, pool.submit(func, *args)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            pool = self._pool
+            return pool, pool.submit(func, *args)
+
+    async def run(self, func, *args, timeout: float | None = None):
+        """Run ``func(*args)`` in a worker process and await its result.
+
+        Stages the worker timed come back with the result and are recorded
+        here, where the caller's request and the metrics registry live.
+        """
+        self._acquire()
+        try:
+            pool, future = self._submit(run_timed, func, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            with timed("transform"):
+                result, timings = await asyncio.wait_for(
+                    asyncio.wrap_future(future),
+                    timeout=timeout or self.timeout,
+                )
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise TransformTimeout("Transform timed out")
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            raise WorkerCrashed("Transform worker crashed")
+
+        for stage, seconds in timings:
+            record(stage, seconds)
+        return result
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache()
+def get_executor() -> TransformExecutor:
+    return TransformExecutor(
+        workers=settings.TRANSFORM_WORKERS,
+        queue_depth=settings.TRANSFORM_QUEUE_DEPTH,
+        timeout=settings.TRANSFORM_TIMEOUT_SECONDS,
+    )
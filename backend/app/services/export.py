@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+import zipfile
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Iterable, List, NamedTuple
+
+from anyio import to_thread
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Image, ImageTransformation
+from app.storage.base import StorageBackend
+
+# Formats that are already entropy-coded gain nothing from deflate and
+# only cost CPU; everything else (BMP, TIFF, PPM, ...) is deflated
+STORED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "avif", "heic", "heif"}
+
+# ZIP cannot represent timestamps before 1980
+ZIP_EPOCH = datetime(1980, 1, 1)
+
+
+class ExportEntry(NamedTuple):
+    arcname: str
+    file_path: str
+    # Known for originals; None makes the member ZIP64 just in case
+    size: int | None
+    modified: datetime | None
+    image_id: int
+    transformation_id: int | None = None
+
+
+def _safe_name(name: str) -> str:
+    # Client-supplied filenames must not climb out of the archive folder
+    return os.path.basename(name.replace("\\", "/")) or "image"
+
+
+def _extension(path: str) -> str:
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+
+async def export_entries(
+    db: AsyncSession,
+    user_id: int,
+    image_ids: List[int] | None = None,
+    transformation_ids: List[int] | None = None,
+    all_transformations: bool = False,
+    originals: bool = True
+) -> List[ExportEntry]:
+    """Archive members for one user's selection, originals first, in id order"""
+    entries = []
+
+    image_filter = [Image.user_id == user_id]
+    if image_ids is not None:
+        image_filter.append(Image.id.in_(image_ids))
+
+    if originals:
+        rows = await db.execute(
+            select(Image.id, Image.filename, Image.file_path, Image.size_bytes, Image.created_at)
+            .where(*image_filter)
+            .order_by(Image.id)
+        )
+        for row in rows:
+            entries.append(ExportEntry(
+                f"originals/{row.id}-{_safe_name(row.filename)}",
+                row.file_path, row.size_bytes, row.created_at, row.id
+            ))
+
+    selected = []
+    if all_transformations:
+        selected.append(Image.id.in_(select(Image.id).where(*image_filter)))
+    if transformation_ids:
+        selected.append(ImageTransformation.id.in_(transformation_ids))
+
+    if selected:
+        rows = await db.execute(
+            select(
+                ImageTransformation.id,
+                ImageTransformation.image_id,
+                ImageTransformation.action,
+                ImageTransformation.output_file_path,
+                ImageTransformation.created_at
+            )
+            .join(Image, Image.id == ImageTransformation.image_id)
+            .where(Image.user_id == user_id, or_(*selected))
+            .order_by(ImageTransformation.image_id, ImageTransformation.id)
+        )
+        for row in rows:
+            extension = _extension(row.output_file_path) or "bin"
+            entries.append(ExportEntry(
+                f"transformations/{row.image_id}/{row.id}-{row.action}.{extension}",
+                row.output_file_path, None, row.created_at, row.image_id, row.id
+            ))
+
+    return entries
+
+
+class _Sink:
+    """Write-only target for ZipFile. It has no tell() or seek(), so zipfile
+    writes data descriptors after each member instead of patching headers"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_info(entry: ExportEntry) -> zipfile.ZipInfo:
+    modified = max(entry.modified or datetime.utcnow(), ZIP_EPOCH)
+    info = zipfile.ZipInfo(entry.arcname, date_time=modified.timetuple()[:6])
+    if _extension(entry.file_path) in STORED_EXTENSIONS:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    if entry.size is not None:
+        # Lets zipfile decide on ZIP64 from the real size
+        info.file_size = entry.size
+    return info
+
+
+async def _fetch(storage: StorageBackend, file_path: str, queue: asyncio.Queue, chunk_size: int | None) -> None:
+    """Copy one stored file into a bounded queue, ending with None or the error"""
+    try:
+        async for chunk in storage.stream(file_path, chunk_size=chunk_size):
+            await queue.put(chunk)
+    except Exception as e:
+        await queue.put(e)
+        return
+    await queue.put(None)
+
+
+async def stream_zip(
+    storage: StorageBackend,
+    entries: Iterable[ExportEntry],
+    prefetch_files: int,
+    prefetch_chunks: int,
+    chunk_size: int | None = None
+) -> AsyncIterator[bytes]:
+    """Yield a ZIP of the entries as it is written.
+
+    While one member is written, the next ``prefetch_files`` are already
+    streaming from storage into queues of ``prefetch_chunks`` chunks, which
+    hides per-object latency on remote backends. Memory stays bounded by
+    those queues whatever the archive size. Files missing from storage are
+    left out and listed in manifest.json.
+    """
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", allowZip64=True)
+    pending = iter(entries)
+    window = deque()
+    manifest = {"files": [], "missing": []}
+
+    def start_next() -> None:
+        entry = next(pending, None)
+        if entry is not None:
+            queue = asyncio.Queue(maxsize=prefetch_chunks)
+            window.append((entry, queue, asyncio.create_task(_fetch(storage, entry.file_path, queue, chunk_size))))
+
+    try:
+        for _ in range(prefetch_files + 1):
+            start_next()
+
+        while window:
+            entry, queue, _ = window.popleft()
+            start_next()
+
+            chunk = await queue.get()
+            if isinstance(chunk, Exception):
+                manifest["missing"].append({"path": entry.arcname, "error": type(chunk).__name__})
+                continue
+
+            info = _zip_info(entry)
+            deflated = info.compress_type == zipfile.ZIP_DEFLATED
+            with archive.open(info, "w", force_zip64=entry.size is None) as member:
+                while chunk is not None:
+                    if isinstance(chunk, Exception):
+                        # Headers are already sent; all we can do is cut the archive short
+                        raise chunk
+                    if deflated:
+                        await to_thread.run_sync(member.write, chunk)
+                    else:
+                        member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+                    chunk = await queue.get()
+            yield sink.drain()
+
+            manifest["files"].append({
+                "path": entry.arcname,
+                "image_id": entry.image_id,
+                "transformation_id": entry.transformation_id,
+            })
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2), zipfile.ZIP_DEFLATED)
+        archive.close()
+        yield sink.drain()
+    finally:
+        for _, _, task in window:
+            task.cancel()
@@ -1,9 +1,82 @@
-from PIL import Image, ImageOps
+import math
+from io import BytesIO
+from PIL import Image, ImageFile, ImageOps, UnidentifiedImageError
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, List, NamedTuple, Sequence, Tuple
 
-def load_image(image_path: Path) -> Image.Image:
-  return Image.open(image_path)
+from app.services.encoders import ENCODERS, encode, normalize_format
+from app.services.color_filters import (
+    GRAYSCALE,
+    INVERT,
+    SEPIA,
+    apply_color_matrix,
+    brightness_contrast_matrix,
+    channel_mix_matrix
+)
+
+# Downscales first shrink by an integer factor (JPEG DCT scaling or
+# Image.reduce) while staying at least this many times the target size,
+# then finish with a regular resample, as Image.thumbnail does.
+REDUCING_GAP = 3.0
+
+# Pixel guards, set from Settings in every process that decodes images
+# (see configure_limits). MAX_IMAGE_PIXELS rejects a source outright;
+# anything above MAX_DECODE_PIXELS is never held as one bitmap and has to
+# go through transform_strips instead. Pillow's own decompression-bomb check
+# is switched off in favour of these.
+MAX_IMAGE_PIXELS = 2_000_000_000
+MAX_DECODE_PIXELS = 100_000_000
+STRIP_BYTES = 32 * 1024 * 1024
+
+Image.MAX_IMAGE_PIXELS = None
+
+
+class ImageTooLarge(ValueError):
+  """Raised when an image is over the configured pixel limits"""
+
+
+def configure_limits(max_image_pixels: int, max_decode_pixels: int, strip_bytes: int) -> None:
+  global MAX_IMAGE_PIXELS, MAX_DECODE_PIXELS, STRIP_BYTES
+  MAX_IMAGE_PIXELS = max_image_pixels
+  MAX_DECODE_PIXELS = max_decode_pixels
+  STRIP_BYTES = strip_bytes
+
+
+def load_image(
+    image_path: Path,
+    target_size: Tuple[int, int] | None = None
+) -> Image.Image:
+  image = Image.open(image_path)
+
+  if image.width * image.height > MAX_IMAGE_PIXELS:
+    image.close()
+    raise ImageTooLarge(
+        f"Image is {image.width}x{image.height}, over the {MAX_IMAGE_PIXELS} pixel limit"
+    )
+
+  if target_size and image.format == "JPEG":
+    # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when the result is still
+    # at least REDUCING_GAP times the requested size.
+    width, height = target_size
+    image.draft(
+        image.mode,
+        (int(width * REDUCING_GAP), int(height * REDUCING_GAP))
+    )
+
+  return image
+
+def probe_size(fileobj) -> Tuple[int, int] | None:
+  """Dimensions from the header alone, or None if Pillow cannot read it.
+
+  Leaves fileobj rewound so it can still be streamed to storage.
+  """
+  try:
+    with Image.open(fileobj) as image:
+      return image.size
+  except (UnidentifiedImageError, OSError):
+    return None
+  finally:
+    fileobj.seek(0)
 
 def save_image(image: Image.Image, output_path: Path) -> None:
   image.save(output_path)
@@ -13,7 +86,19 @@ def resize_image(
     width: int,
     height: int
 ) -> Image.Image:
-  return image.resize((width, height))
+  return image.resize((width, height), reducing_gap=REDUCING_GAP)
+
+def thumbnail_image(
+    image: Image.Image,
+    width: int,
+    height: int
+) -> Image.Image:
+  """Fit within width x height, keeping the aspect ratio and never upscaling"""
+  scale = min(width / image.width, height / image.height, 1.0)
+  size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+  if size == image.size:
+    return image.copy()
+  return image.resize(size, reducing_gap=REDUCING_GAP)
 
 def crop_image(
     image: Image.Image,
@@ -31,27 +116,28 @@ def rotate_image(
   return image.rotate(angle, expand=True)
 
 def grayscale_image(image: Image.Image) -> Image.Image:
-  return image.convert("L").convert("RGB")
+  return apply_color_matrix(image, GRAYSCALE)
 
 def sepia_image(image: Image.Image) -> Image.Image:
-    sepia = image.convert("RGB")
-    pixels = sepia.load()
+  return apply_color_matrix(image, SEPIA)
 
-    for y in range(sepia.height):
-        for x in range(sepia.width):
-            r, g, b = pixels[x, y]
+def invert_image(image: Image.Image) -> Image.Image:
+  return apply_color_matrix(image, INVERT)
 
-            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-
-            pixels[x, y] = (
-                min(255, tr),
-                min(255, tg),
-                min(255, tb)
-            )
+def brightness_contrast_image(
+    image: Image.Image,
+    brightness: float = 0.0,
+    contrast: float = 1.0
+) -> Image.Image:
+  return apply_color_matrix(image, brightness_contrast_matrix(brightness, contrast))
 
-    return sepia
+def channel_mix_image(
+    image: Image.Image,
+    red: Sequence[float],
+    green: Sequence[float],
+    blue: Sequence[float]
+) -> Image.Image:
+  return apply_color_matrix(image, channel_mix_matrix(red, green, blue))
 
 def flip_horizontal(image: Image.Image) -> Image.Image:
    return image.transpose(Image.FLIP_LEFT_RIGHT)
@@ -63,21 +149,149 @@ def mirror_image(image: Image.Image) -> Image.Image:
     return ImageOps.mirror(image)
 
 def convert_format(image: Image.Image, output_format: str) -> Image.Image:
-   return image.convert("RGB") if output_format.lower() in ["jpeg", "jpg"] else image
+   output_format = normalize_format(output_format)
+   return ENCODERS[output_format].prepare(image) if output_format in ENCODERS else image
 
-def save_image_with_options(image, output_path, output_format, quality=None):
-    output_format = output_format.lower()
+def save_image_with_options(image, output_path, output_format, quality=None, preset=None):
+    output_format = normalize_format(output_format)
+    quality = int(quality) if quality else None
 
-    if output_format in ["jpeg", "jpg"]:
-        image = image.convert("RGB")  # JPEG does not support alpha
-        quality = int(quality) if quality else 85
+    # Same encoder settings as the worker pipeline
+    with open(output_path, "wb") as output:
+        output.write(encode(image, output_format, quality, preset))
 
-        if quality < 1 or quality > 95:
-            raise ValueError("Quality must be between 1 and 95")
+    return output_path
 
-        image.save(output_path, format="JPEG", quality=quality)
 
-    else:
-        image.save(output_path, format=output_format.upper())
+# Bytes per pixel of the raw layouts transform_strips can address row by row
+RAW_PIXEL_BYTES = {
+    "L": 1, "P": 1, "LA": 2, "RGB": 3, "BGR": 3,
+    "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4, "CMYK": 4,
+}
 
-    return output_path
+
+class RawTile(NamedTuple):
+    extents: Tuple[int, int, int, int]
+    offset: int
+    rawmode: str
+    stride: int
+    orientation: int
+
+
+def raw_layout(image: Image.Image) -> List[RawTile] | None:
+    """Where each row of an undecoded image sits in the file, if it is stored raw.
+
+    Uncompressed TIFF, BMP and PPM/PGM keep pixels at fixed offsets, so any
+    band of rows can be decoded on its own. Compressed formats decode as one
+    stream and return None.
+    """
+    if not image.tile:
+        return None
+
+    layout = []
+    for tile in image.tile:
+        args = tile.args if isinstance(tile.args, tuple) else (tile.args,)
+        rawmode = args[0]
+        if tile.codec_name != "raw" or rawmode not in RAW_PIXEL_BYTES:
+            return None
+        x0, y0, x1, y1 = tile.extents
+        stride = (args[1] if len(args) > 1 else 0) or (x1 - x0) * RAW_PIXEL_BYTES[rawmode]
+        orientation = args[2] if len(args) > 2 else 1
+        layout.append(RawTile(tile.extents, tile.offset, rawmode, stride, orientation))
+    return layout
+
+
+def _decode_rows(source, layout: List[RawTile], width: int, top: int, bottom: int) -> Image.Image:
+    """Decode rows top..bottom only, by narrowing the tile list before load()"""
+    # Closing an image can close the file object it came from, so every
+    # band gets its own reader over the same bytes
+    image = Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+
+    tiles = []
+    for (x0, y0, x1, y1), offset, rawmode, stride, orientation in layout:
+        low, high = max(top, y0), min(bottom, y1)
+        if low >= high:
+            continue
+        # Bottom-up files (BMP) store the last row first
+        skip = (y1 - high) if orientation < 0 else (low - y0)
+        tiles.append(ImageFile._Tile(
+            "raw", (x0, low - top, x1, high - top), offset + skip * stride, (rawmode, stride, orientation)
+        ))
+
+    image.tile = tiles
+    image._size = (width, bottom - top)
+    image.load()
+    return image
+
+
+def needs_strips(image: Image.Image) -> bool:
+    """Whether the (possibly draft-reduced) image is too big to decode in one piece"""
+    return image.width * image.height > MAX_DECODE_PIXELS
+
+
+def strip_reduce_factor(size: Tuple[int, int], target: Tuple[int, int] | None) -> Tuple[int, int]:
+    """The integer pre-shrink Image.resize would use for this downscale"""
+    if target is None:
+        return 1, 1
+    return (
+        max(1, int(size[0] / target[0] / REDUCING_GAP)),
+        max(1, int(size[1] / target[1] / REDUCING_GAP)),
+    )
+
+
+def transform_strips(
+    source,
+    box: Tuple[int, int, int, int],
+    strip_filter: Callable[[Image.Image], Image.Image] | None = None,
+    reduce: Tuple[int, int] = (1, 1)
+) -> Image.Image:
+  """Crop, filter and integer-downscale a raw-stored image band by band.
+
+  Only one band of about STRIP_BYTES is decoded at a time; the output holds
+  box / reduce pixels. Bands are aligned to the reduce factor, so the result
+  matches doing the same on the whole bitmap. strip_filter must act on each
+  pixel row independently (color filters, horizontal flips).
+  """
+  if isinstance(source, BytesIO):
+    # Shares the buffer of an unmodified BytesIO rather than copying it
+    source = source.getvalue()
+  with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as image:
+    layout = raw_layout(image)
+    width, height = image.size
+  if layout is None:
+    raise ImageTooLarge("Image is too large to decode at once and is not stored in strips")
+
+  left, top, right, bottom = box
+  fx, fy = reduce
+  output_size = (math.ceil((right - left) / fx), math.ceil((bottom - top) / fy))
+  if output_size[0] * output_size[1] > MAX_DECODE_PIXELS:
+    raise ImageTooLarge(
+        f"Result would be {output_size[0]}x{output_size[1]}, over the {MAX_DECODE_PIXELS} pixel limit"
+    )
+
+  row_bytes = max(tile.stride for tile in layout)
+  rows = max(fy, STRIP_BYTES // row_bytes // fy * fy)
+
+  output = None
+  for y in range(top, bottom, rows):
+    # Rows outside the source stay black, as Image.crop pads them
+    low, high = max(y, 0), min(y + rows, bottom, height)
+    if low >= high:
+      continue
+
+    strip = _decode_rows(source, layout, width, low, high)
+    band = strip.crop((left, 0, right, high - low))
+    strip.close()
+
+    if band.mode == "P":
+      band = band.convert("RGB")
+    if strip_filter is not None:
+      band = strip_filter(band)
+    if output is None:
+      output = Image.new(band.mode, output_size)
+    if (fx, fy) != (1, 1):
+      band = band.reduce((fx, fy))
+
+    output.paste(band, (0, (low - top) // fy))
+
+  return output if output is not None else Image.new("RGB", output_size)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from anyio import to_thread
+from fastapi import UploadFile
+from PIL import UnidentifiedImageError
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Image, ImageTransformation, TransformJob
+from app.services.pipeline import normalize_format, pipeline_params, render
+from app.services.decode_cache import run_with_source
+from app.services.transform_cache import decode_cache_key, transform_cache_key
+from app.storage.factory import get_storage
+
+TERMINAL_STATUSES = ("succeeded", "dead")
+
+# Failures that would repeat on every attempt: bad operations, images that
+# are too large, gone or undecodable. These are dead-lettered at once
+# (ImageTooLarge and InvalidOperation are ValueErrors).
+PERMANENT_ERRORS = (ValueError, UnidentifiedImageError)
+
+# The API side (enqueue, metrics) runs on AsyncSession; the worker process
+# claims and executes jobs with a plain synchronous Session.
+
+
+async def enqueue_job(
+    db: AsyncSession,
+    user_id: int,
+    image_id: int,
+    operations: list,
+    output_format: str,
+    quality: int | None = None,
+    preset: str | None = None
+) -> TransformJob:
+    job = TransformJob(
+        user_id=user_id,
+        image_id=image_id,
+        status="queued",
+        payload=json.dumps({
+            "operations": operations,
+            "output_format": output_format,
+            "quality": quality,
+            "preset": preset,
+        }),
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+def claim_next_job(db: Session, worker_id: str) -> TransformJob | None:
+    """Atomically move the oldest runnable job to running.
+
+    The conditional UPDATE only succeeds for one worker, which works the same
+    on SQLite and PostgreSQL without SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = datetime.utcnow()
+
+    while True:
+        candidate = db.query(TransformJob.id).filter(
+            TransformJob.status == "queued",
+            TransformJob.available_at <= now,
+            TransformJob.attempts < TransformJob.max_attempts
+        ).order_by(TransformJob.available_at, TransformJob.id).first()
+
+        if candidate is None:
+            return None
+
+        claimed = db.query(TransformJob).filter(
+            TransformJob.id == candidate.id,
+            TransformJob.status == "queued",
+            TransformJob.attempts < TransformJob.max_attempts
+        ).update({
+            "status": "running",
+            "worker_id": worker_id,
+            "started_at": now,
+            "heartbeat_at": now,
+            "attempts": TransformJob.attempts + 1,
+        }, synchronize_session=False)
+        db.commit()
+
+        if claimed:
+            return db.get(TransformJob, candidate.id)
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """Hand jobs whose worker died mid-run back to the queue.
+
+    A job that keeps killing its worker (OOM, SIGKILL) never reaches
+    mark_failed, so the attempt limit is enforced here too: once its
+    attempts are used up it is dead-lettered instead of requeued.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    stale = (
+        TransformJob.status == "running",
+        func.coalesce(TransformJob.heartbeat_at, TransformJob.started_at) < cutoff,
+    )
+
+    db.query(TransformJob).filter(
+        *stale, TransformJob.attempts >= TransformJob.max_attempts
+    ).update({
+        "status": "dead",
+        "worker_id": None,
+        "error": "Worker lost while running the job",
+        "finished_at": now,
+    }, synchronize_session=False)
+    count = db.query(TransformJob).filter(
+        *stale, TransformJob.attempts < TransformJob.max_attempts
+    ).update({"status": "queued", "worker_id": None}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def renew_lease(job_id: int, worker_id: str) -> bool:
+    """Push back a running job's heartbeat; False if the job is no longer ours"""
+    with SessionLocal() as db:
+        renewed = db.query(TransformJob).filter(
+            TransformJob.id == job_id,
+            TransformJob.status == "running",
+            TransformJob.worker_id == worker_id
+        ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return bool(renewed)
+
+
+async def keep_alive(job_id: int, worker_id: str) -> None:
+    """Renew a job's lease every JOB_HEARTBEAT_SECONDS until cancelled"""
+    while True:
+        await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+        if not await to_thread.run_sync(renew_lease, job_id, worker_id):
+            print(f"⚠️ Job {job_id} lease lost; another worker may pick it up")
+            return
+
+
+def _finish(db: Session, job_id: int, worker_id: str, values: dict) -> bool:
+    """Write a running job's outcome only while this worker still holds it.
+
+    The job may have been deleted with its image, or reclaimed by another
+    worker after our lease expired; then nothing is written and False is
+    returned.
+    """
+    updated = db.query(TransformJob).filter(
+        TransformJob.id == job_id,
+        TransformJob.worker_id == worker_id,
+        TransformJob.status == "running"
+    ).update(values, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+
+def mark_succeeded(db: Session, job_id: int, worker_id: str, transformation_id: int) -> bool:
+    return _finish(db, job_id, worker_id, {
+        "status": "succeeded",
+        "transformation_id": transformation_id,
+        "error": None,
+        "finished_at": datetime.utcnow(),
+    })
+
+
+def mark_failed(
+    db: Session,
+    job_id: int,
+    worker_id: str,
+    attempts: int,
+    max_attempts: int,
+    error: str,
+    permanent: bool = False
+) -> str | None:
+    """Retry with linear backoff, or dead-letter once attempts are used up
+    (or straight away for a permanent error); returns the new status, or
+    None if the job is no longer ours"""
+    values = {"error": error, "worker_id": None}
+    if permanent or attempts >= max_attempts:
+        values.update(status="dead", finished_at=datetime.utcnow())
+    else:
+        values.update(status="queued", available_at=datetime.utcnow() + timedelta(
+            seconds=settings.JOB_RETRY_BACKOFF_SECONDS * attempts
+        ))
+    return values["status"] if _finish(db, job_id, worker_id, values) else None
+
+
+async def execute_job(db: Session, job: TransformJob) -> int:
+    """Render a claimed job, store the output and return its transformation id"""
+    payload = json.loads(job.payload)
+    operations = payload["operations"]
+    output_format = payload["output_format"]
+    quality = payload["quality"]
+    preset = payload.get("preset")
+
+    image = db.get(Image, job.image_id)
+    if image is None:
+        raise ValueError("Image not found")
+
+    cache_key = transform_cache_key(image, operations, output_format, quality, preset)
+    existing = db.query(ImageTransformation.id).filter(
+        ImageTransformation.cache_key == cache_key
+    ).first()
+    if existing:
+        return existing.id
+
+    storage = get_storage()
+    # In a thread, so keep_alive can renew the lease while it renders
+    output_bytes = await run_with_source(
+        to_thread.run_sync, storage, image.file_path, decode_cache_key(image),
+        render, operations, output_format, quality, preset
+    )
+
+    stored = await storage.save(
+        file=UploadFile(
+            file=BytesIO(output_bytes),
+            filename=f"{uuid.uuid4()}.{normalize_format(output_format)}"
+        )
+    )
+
+    transformation = ImageTransformation(
+        image_id=image.id,
+        action="pipeline",
+        params=pipeline_params(operations, output_format, quality, preset),
+        output_file_path=stored.path,
+        cache_key=cache_key
+    )
+    db.add(transformation)
+    try:
+        db.commit()
+    except IntegrityError:
+        # An API request or another worker recorded the same key meanwhile
+        db.rollback()
+        existing = db.query(ImageTransformation.id).filter(
+            ImageTransformation.cache_key == cache_key
+        ).first()
+        if existing is None:
+            raise
+        await storage.delete(stored.path)
+        return existing.id
+    return transformation.id
+
+
+async def job_metrics(db: AsyncSession) -> dict:
+    """Queue depth per status plus wait and run latency of recent jobs"""
+    now = datetime.utcnow()
+
+    depth = dict((await db.execute(
+        select(TransformJob.status, func.count(TransformJob.id))
+        .group_by(TransformJob.status)
+    )).all())
+
+    oldest_queued = (await db.execute(
+        select(func.min(TransformJob.created_at))
+        .where(TransformJob.status == "queued")
+    )).scalar()
+
+    recent = (await db.execute(
+        select(
+            TransformJob.created_at,
+            TransformJob.started_at,
+            TransformJob.finished_at
+        )
+        .where(TransformJob.status == "succeeded")
+        .order_by(TransformJob.finished_at.desc())
+        .limit(settings.JOB_METRICS_WINDOW)
+    )).all()
+
+    def average(values):
+        values = list(values)
+        return round(sum(values) / len(values), 3) if values else None
+
+    return {
+        "depth": {status: depth.get(status, 0) for status in ("queued", "running", "succeeded", "dead")},
+        "oldest_queued_age_seconds": (now - oldest_queued).total_seconds() if oldest_queued else None,
+        "recent_succeeded": len(recent),
+        "avg_wait_seconds": average((row.started_at - row.created_at).total_seconds() for row in recent),
+        "avg_run_seconds": average((row.finished_at - row.started_at).total_seconds() for row in recent),
+        "avg_latency_seconds": average((row.finished_at - row.created_at).total_seconds() for row in recent),
+    }
@@ -0,0 +1,284 @@
+import json
+import time
+from io import BytesIO
+from typing import Any, Dict, Hashable, List, Tuple
+
+from PIL import Image
+
+from app.services.decode_cache import SourceRequired, get_decode_cache
+from app.services.encoders import (
+    DEFAULT_PRESET,
+    check_encoding,
+    encode,
+    normalize_format
+)
+from app.services.image_transformer import (
+    crop_image,
+    flip_horizontal,
+    brightness_contrast_image,
+    flip_vertical,
+    grayscale_image,
+    invert_image,
+    load_image,
+    mirror_image,
+    needs_strips,
+    resize_image,
+    rotate_image,
+    sepia_image,
+    strip_reduce_factor,
+    thumbnail_image,
+    transform_strips
+)
+from app.services.timing import record, timed
+
+# Everything in this module must stay importable without the web app or the
+# database: render() runs inside transform worker processes, and operations
+# cross the process boundary as plain dicts such as
+# {"action": "resize", "width": 200, "height": 100}.
+Operation = Dict[str, Any]
+
+
+class InvalidOperation(ValueError):
+    """Raised when an operation is unknown or misses required parameters"""
+
+
+ACTIONS = {
+    "resize": lambda image, op: resize_image(image, op["width"], op["height"]),
+    "thumbnail": lambda image, op: thumbnail_image(image, op["width"], op["height"]),
+    "crop": lambda image, op: crop_image(image, op["left"], op["top"], op["right"], op["bottom"]),
+    "rotate": lambda image, op: rotate_image(image, op["angle"]),
+    "flip_horizontal": lambda image, op: flip_horizontal(image),
+    "flip_vertical": lambda image, op: flip_vertical(image),
+    "mirror": lambda image, op: mirror_image(image),
+    "grayscale": lambda image, op: grayscale_image(image),
+    "sepia": lambda image, op: sepia_image(image),
+    "invert": lambda image, op: invert_image(image),
+    "brightness_contrast": lambda image, op: brightness_contrast_image(
+        image, op.get("brightness", 0.0), op.get("contrast", 1.0)
+    ),
+}
+
+REQUIRED_PARAMS = {
+    "resize": (("width", "height"), "Width and height required"),
+    "thumbnail": (("width", "height"), "Width and height required"),
+    "crop": (("left", "top", "right", "bottom"), "Crop coordinates required"),
+    "rotate": (("angle",), "Angle required"),
+}
+
+# Same bounds as the w_/h_ URL tokens (see url_spec). A thumbnail never
+# upscales, so its box may be larger: an open side is UNBOUNDED.
+MAX_DIMENSION = 10_000
+UNBOUNDED = 100_000
+# No single operation may produce more pixels than this
+MAX_OUTPUT_PIXELS = 40_000_000
+
+
+def _check_output(width: int, height: int) -> None:
+    if width * height > MAX_OUTPUT_PIXELS:
+        raise InvalidOperation(f"Result would be {width}x{height}, over the {MAX_OUTPUT_PIXELS} pixel limit")
+
+
+def validate_operations(operations: List[Operation]) -> None:
+    """Check every operation up front so bad requests fail before any decode"""
+    for op in operations:
+        action = op.get("action")
+        if action not in ACTIONS:
+            raise InvalidOperation("Invalid action")
+
+        required, message = REQUIRED_PARAMS.get(action, ((), ""))
+        if any(op.get(name) is None for name in required):
+            raise InvalidOperation(message)
+
+        if action == "resize":
+            if not (1 <= op["width"] <= MAX_DIMENSION and 1 <= op["height"] <= MAX_DIMENSION):
+                raise InvalidOperation(f"Width and height must be between 1 and {MAX_DIMENSION}")
+            _check_output(op["width"], op["height"])
+        elif action == "thumbnail":
+            if not (1 <= op["width"] <= UNBOUNDED and 1 <= op["height"] <= UNBOUNDED):
+                raise InvalidOperation(f"Width and height must be between 1 and {UNBOUNDED}")
+        elif action == "crop":
+            if op["left"] < 0 or op["top"] < 0:
+                raise InvalidOperation("Crop coordinates must not be negative")
+            if op["left"] >= op["right"] or op["top"] >= op["bottom"]:
+                raise InvalidOperation("Crop needs left < right and top < bottom")
+            _check_output(op["right"] - op["left"], op["bottom"] - op["top"])
+        elif action == "rotate":
+            if not -360 <= op["angle"] <= 360:
+                raise InvalidOperation("Angle must be between -360 and 360")
+
+
+def validate_output(output_format: str, quality: int | None = None, preset: str | None = None) -> None:
+    """Check the encoder settings up front, like validate_operations"""
+    try:
+        check_encoding(normalize_format(output_format), quality, preset)
+    except ValueError as e:
+        raise InvalidOperation(str(e))
+
+
+def canonicalize_operations(operations: List[Operation]) -> List[Operation]:
+    """Drop unset parameters and order keys so equal pipelines compare equal"""
+    return [
+        {key: op[key] for key in sorted(op) if op[key] is not None}
+        for op in operations
+    ]
+
+
+def pipeline_params(
+    operations: List[Operation],
+    output_format: str,
+    quality: int | None = None,
+    preset: str | None = None
+) -> str:
+    """Serialize a pipeline into the string stored in ImageTransformation.params"""
+    return json.dumps(
+        {
+            "operations": canonicalize_operations(operations),
+            "output_format": normalize_format(output_format),
+            "quality": quality,
+            "preset": preset or DEFAULT_PRESET,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+# Operations that keep pixel dimensions and commute with scaling
+SIZE_PRESERVING_ACTIONS = {"flip_horizontal", "flip_vertical", "mirror"}
+
+
+def decode_size_hint(operations: List[Operation]) -> Tuple[int, int] | None:
+    """Return the resize target when the source is only ever seen downscaled"""
+    for op in operations:
+        if op["action"] in ("resize", "thumbnail"):
+            return op["width"], op["height"]
+        if op["action"] not in SIZE_PRESERVING_ACTIONS:
+            return None
+    return None
+
+
+# Each output row depends only on the same input row, so these can run on
+# horizontal bands of a huge image
+ROW_LOCAL_ACTIONS = {"grayscale", "sepia", "invert", "brightness_contrast", "mirror", "flip_horizontal"}
+
+
+def plan_strips(
+    size: Tuple[int, int],
+    operations: List[Operation]
+) -> Tuple[Tuple[int, int, int, int], List[Operation], Tuple[int, int] | None, List[Operation]]:
+    """Split a pipeline into what transform_strips can do and what must follow.
+
+    Returns the source crop box, the row-local filters, the downscale target
+    (if the leading steps end in one) and the remaining operations, which
+    start with an exact resize to that target.
+    """
+    left, top, right, bottom = 0, 0, size[0], size[1]
+    filters = []
+    remaining = []
+
+    for index, op in enumerate(operations):
+        action = op["action"]
+        mirrored = any(f["action"] in ("mirror", "flip_horizontal") for f in filters)
+
+        if action == "crop" and not mirrored:
+            left, top, right, bottom = (
+                left + op["left"], top + op["top"], left + op["right"], top + op["bottom"]
+            )
+            continue
+        if action in ROW_LOCAL_ACTIONS:
+            filters.append(op)
+            continue
+
+        remaining = operations[index:]
+        if action in ("resize", "thumbnail"):
+            width, height = right - left, bottom - top
+            if action == "thumbnail":
+                scale = min(op["width"] / width, op["height"] / height, 1.0)
+                target = (max(1, round(width * scale)), max(1, round(height * scale)))
+            else:
+                target = (op["width"], op["height"])
+            # Upscales gain nothing from shrinking in bands
+            if target[0] <= width and target[1] <= height:
+                resize = {"action": "resize", "width": target[0], "height": target[1]}
+                return (left, top, right, bottom), filters, target, [resize] + operations[index + 1:]
+        break
+
+    return (left, top, right, bottom), filters, None, remaining
+
+
+def apply_operations(image: Image.Image, operations: List[Operation]) -> Image.Image:
+    validate_operations(operations)
+
+    for op in operations:
+        with timed(f"action:{op['action']}"):
+            image = ACTIONS[op["action"]](image, op)
+    return image
+
+
+def encode_image(
+    image: Image.Image,
+    output_format: str,
+    quality: int | None = None,
+    preset: str | None = None
+) -> bytes:
+    output_format = normalize_format(output_format)
+    with timed(f"encode:{output_format}"):
+        return encode(image, output_format, quality, preset)
+
+
+def render(
+    source: str | bytes | None,
+    operations: List[Operation],
+    output_format: str,
+    quality: int | None = None,
+    preset: str | None = None,
+    source_key: Hashable | None = None
+) -> bytes:
+    """Decode, transform and encode one image; the unit of work for worker processes.
+
+    ``source`` is a local path or the encoded bytes fetched from storage.
+    With a ``source_key`` (image id and content hash) the decoded bitmap is
+    kept in this process's decode cache, and a later render of the same
+    source skips decoding it. A None source only renders from that cache
+    and raises SourceRequired on a miss (see run_with_source).
+    """
+    validate_operations(operations)
+    validate_output(output_format, quality, preset)
+
+    target_size = decode_size_hint(operations)
+    decoded = get_decode_cache() if source_key is not None else None
+    if decoded is not None:
+        started = time.perf_counter()
+        image = decoded.get(source_key, target_size)
+        if image is not None:
+            # Hits show up as decode stages of their own, next to full and strips
+            record("decode:cached", time.perf_counter() - started)
+            result = apply_operations(image, operations)
+            return encode_image(result, output_format, quality, preset)
+
+    if source is None:
+        raise SourceRequired("Source is not decoded in this worker")
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+
+    with load_image(source, target_size) as image:
+        if needs_strips(image):
+            # Too big for one bitmap: crop, filter and shrink band by band,
+            # then finish the pipeline on the much smaller result
+            box, filters, target, operations = plan_strips(image.size, operations)
+            with timed("decode:strips"):
+                image = transform_strips(
+                    source,
+                    box,
+                    (lambda band: apply_operations(band, filters)) if filters else None,
+                    strip_reduce_factor((box[2] - box[0], box[3] - box[1]), target)
+                )
+        else:
+            # Pillow decodes lazily; force it here so the first action is not billed for it
+            with timed("decode"):
+                image.load()
+            if decoded is not None:
+                # Only JPEG honours the draft request behind target_size
+                decoded.put(source_key, image, full=target_size is None or image.format != "JPEG")
+
+        result = apply_operations(image, operations)
+        return encode_image(result, output_format, quality, preset)
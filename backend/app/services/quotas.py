@@ -0,0 +1,145 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List
+from uuid import uuid4
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth_cache import AuthenticatedUser
+from app.config import settings
+from app.models import Image, TransformJob
+from app.ratelimit.factory import get_rate_limit_backend
+from app.security import get_current_user
+from app.services.encoders import normalize_format
+from app.services.pipeline import Operation
+
+# Relative CPU cost per source megapixel. Resampling and rotation touch
+# every pixel with a kernel; color filters are one matrix pass; crops and
+# flips are mostly memory copies.
+ACTION_WEIGHTS = {
+    "resize": 1.0,
+    "thumbnail": 1.0,
+    "rotate": 1.5,
+    "crop": 0.25,
+    "flip_horizontal": 0.25,
+    "flip_vertical": 0.25,
+    "mirror": 0.25,
+    "grayscale": 0.5,
+    "sepia": 0.5,
+    "invert": 0.5,
+    "brightness_contrast": 0.5,
+}
+# Every render ends in an encode; AVIF and WebP cost several times JPEG/PNG
+FORMAT_WEIGHTS = {"avif": 4.0, "webp": 2.0}
+DEFAULT_FORMAT_WEIGHT = 1.0
+
+# Images uploaded before dimensions were recorded are sized from their bytes,
+# assuming typical JPEG compression
+BYTES_PER_MEGAPIXEL = 250_000
+
+SLOT_POLL_SECONDS = 0.05
+JOB_STATUSES_PENDING = ("queued", "running")
+
+
+class QuotaExceeded(Exception):
+    """Raised when a user is over their rate or concurrency quota; maps to 429"""
+
+    def __init__(self, detail: str, retry_after: float, reason: str):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def image_megapixels(image: Image) -> float:
+    if image.width and image.height:
+        return image.width * image.height / 1_000_000
+    return (image.size_bytes or BYTES_PER_MEGAPIXEL) / BYTES_PER_MEGAPIXEL
+
+
+def transform_cost(image: Image, operations: List[Operation], output_format: str) -> float:
+    """Tokens a render of this pipeline costs: megapixels x summed weights"""
+    weight = sum(ACTION_WEIGHTS.get(op["action"], 1.0) for op in operations)
+    weight += FORMAT_WEIGHTS.get(normalize_format(output_format), DEFAULT_FORMAT_WEIGHT)
+    return max(settings.RATE_LIMIT_MIN_COST, image_megapixels(image) * weight)
+
+
+async def charge(user_id: int, cost: float) -> None:
+    """Take cost tokens from the user's bucket or raise QuotaExceeded"""
+    if not settings.RATE_LIMIT_ENABLED or cost <= 0:
+        return
+
+    capacity = settings.RATE_LIMIT_BURST
+    wait = await get_rate_limit_backend().take(
+        f"user:{user_id}",
+        # A pipeline bigger than the bucket still runs once it is full
+        min(cost, capacity),
+        capacity,
+        settings.RATE_LIMIT_PER_MINUTE / 60,
+        time.time(),
+    )
+    if wait > 0:
+        raise QuotaExceeded("Rate limit exceeded. Try again later.", wait, "rate")
+
+
+async def charge_render(user_id: int, image: Image, operations: List[Operation], output_format: str) -> None:
+    """Charge a cache miss what it costs beyond the per-request minimum already paid"""
+    await charge(user_id, transform_cost(image, operations, output_format) - settings.RATE_LIMIT_MIN_COST)
+
+
+async def rate_limited_user(
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> AuthenticatedUser:
+    """get_current_user plus the minimum charge every limited request pays"""
+    await charge(current_user.id, settings.RATE_LIMIT_MIN_COST)
+    return current_user
+
+
+@asynccontextmanager
+async def transform_slot(user_id: int, wait: float = 0.0):
+    """Hold one of the user's USER_MAX_CONCURRENT_TRANSFORMS render slots.
+
+    Interactive requests fail fast; batches pass ``wait`` to queue behind
+    the user's own work instead.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        yield
+        return
+
+    backend = get_rate_limit_backend()
+    key = f"user:{user_id}:transforms"
+    lease_id = uuid4().hex
+    # Outlives a timed-out render, which keeps its worker until it finishes
+    lease_seconds = settings.TRANSFORM_TIMEOUT_SECONDS * 2
+    deadline = time.monotonic() + wait
+
+    while True:
+        now = time.time()
+        if await backend.acquire(key, lease_id, settings.USER_MAX_CONCURRENT_TRANSFORMS, now + lease_seconds, now):
+            break
+        if time.monotonic() >= deadline:
+            raise QuotaExceeded("Too many transforms in progress. Try again shortly.", 1.0, "concurrency")
+        await asyncio.sleep(SLOT_POLL_SECONDS)
+
+    try:
+        yield
+    finally:
+        await backend.release(key, lease_id)
+
+
+async def check_pending_jobs(db: AsyncSession, user_id: int) -> None:
+    """Refuse new queued jobs while the user already has USER_MAX_PENDING_JOBS waiting or running"""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+
+    pending = await db.scalar(select(func.count()).select_from(TransformJob).where(
+        TransformJob.user_id == user_id,
+        TransformJob.status.in_(JOB_STATUSES_PENDING)
+    ))
+    if pending >= settings.USER_MAX_PENDING_JOBS:
+        raise QuotaExceeded(
+            "Too many queued jobs. Wait for some to finish.", settings.JOB_POLL_INTERVAL_SECONDS, "jobs"
+        )
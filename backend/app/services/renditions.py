@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+from io import BytesIO
+from typing import List, NamedTuple
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import Image, ImageRendition
+from app.services.executor import ExecutorSaturated, TransformTimeout, WorkerCrashed, get_executor
+from app.services.pipeline import normalize_format, render
+from app.storage.factory import get_storage
+
+
+class RenditionSpec(NamedTuple):
+    name: str
+    size: int
+    output_format: str
+
+    @property
+    def operations(self):
+        return [{"action": "thumbnail", "width": self.size, "height": self.size}]
+
+
+def parse_renditions(spec: str) -> List[RenditionSpec]:
+    """Parse "thumb:256:webp,preview:1024:jpeg" into rendition specs"""
+    renditions = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, size, output_format = (value.strip() for value in item.split(":"))
+            renditions.append(RenditionSpec(name, int(size), normalize_format(output_format)))
+        except ValueError:
+            raise ValueError(f"Invalid rendition spec {item!r}, expected name:size:format")
+    return renditions
+
+
+def get_rendition_specs() -> List[RenditionSpec]:
+    return parse_renditions(settings.RENDITIONS)
+
+
+async def _render_with_retry(source: str | bytes, spec: RenditionSpec) -> bytes:
+    # Background work yields to interactive transforms when the pool is full
+    for attempt in range(settings.RENDITION_MAX_ATTEMPTS):
+        try:
+            return await get_executor().run(
+                render, source, spec.operations, spec.output_format, None
+            )
+        except (ExecutorSaturated, TransformTimeout, WorkerCrashed):
+            if attempt == settings.RENDITION_MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(settings.TRANSFORM_RETRY_AFTER_SECONDS * (attempt + 1))
+
+
+async def reuse_renditions(db: AsyncSession, image_id: int, user_id: int, content_hash: str) -> List[RenditionSpec]:
+    """Point a deduplicated upload at the renditions already made for the
+    user's own copies of its bytes.
+
+    Adds the rows to the session and returns the specs that still need
+    rendering. The output files are shared, so they are only deleted once
+    no rendition row references them.
+    """
+    rows = await db.scalars(
+        select(ImageRendition)
+        .join(Image, Image.id == ImageRendition.image_id)
+        .where(Image.content_hash == content_hash, Image.user_id == user_id)
+    )
+    existing = {(row.name, row.output_format): row for row in rows}
+
+    missing = []
+    for spec in get_rendition_specs():
+        row = existing.get((spec.name, spec.output_format))
+        if row is None:
+            missing.append(spec)
+            continue
+        db.add(ImageRendition(
+            image_id=image_id,
+            name=row.name,
+            output_format=row.output_format,
+            output_file_path=row.output_file_path,
+            size_bytes=row.size_bytes
+        ))
+    return missing
+
+
+async def generate_renditions(
+    image_id: int,
+    source_path: str,
+    specs: List[RenditionSpec] | None = None
+) -> None:
+    """Render configured renditions (all of them by default) for a freshly committed upload"""
+    storage = get_storage()
+
+    try:
+        source = await storage.read_source(source_path)
+    except Exception as e:
+        print(f"❌ Renditions skipped for image {image_id}: {e}")
+        return
+
+    for spec in get_rendition_specs() if specs is None else specs:
+        try:
+            output_bytes = await _render_with_retry(source, spec)
+            stored = await storage.save(
+                file=UploadFile(
+                    file=BytesIO(output_bytes),
+                    filename=f"{uuid.uuid4()}.{spec.output_format}"
+                )
+            )
+        except Exception as e:
+            print(f"❌ Rendition {spec.name} failed for image {image_id}: {e}")
+            continue
+
+        async with AsyncSessionLocal() as db:
+            try:
+                db.add(ImageRendition(
+                    image_id=image_id,
+                    name=spec.name,
+                    output_format=spec.output_format,
+                    output_file_path=stored.path,
+                    size_bytes=stored.size
+                ))
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                await storage.delete(stored.path)
+                print(f"❌ Rendition {spec.name} could not be recorded for image {image_id}: {e}")
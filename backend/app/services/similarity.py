@@ -0,0 +1,168 @@
+from io import BytesIO
+from itertools import combinations
+from typing import Hashable, List, NamedTuple, Tuple
+
+from PIL import Image as PILImage
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal
+from app.models import Image
+from app.services.decode_cache import SourceRequired, get_decode_cache
+from app.services.executor import get_executor
+from app.services.image_transformer import (
+    load_image,
+    needs_strips,
+    strip_reduce_factor,
+    transform_strips
+)
+from app.storage.factory import get_storage
+
+# 64-bit dHash split into four 16-bit bands for multi-index hashing: two
+# hashes within distance d agree to within d // 4 bits on at least one band
+# (pigeonhole), so candidates come from indexed IN lookups on the bands and
+# only those are checked at full precision.
+HASH_SIZE = 8
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Radius 2 per band means 1 + 16 + 120 probe values per band; beyond that
+# the probes stop being selective and a distance that large is no longer
+# "the same picture" for a 64-bit dHash anyway
+MAX_DISTANCE = BANDS * 3 - 1
+
+
+def _grid(image: PILImage.Image) -> bytes:
+    small = image.convert("L").resize(
+        (HASH_SIZE + 1, HASH_SIZE), PILImage.Resampling.LANCZOS, reducing_gap=3.0
+    )
+    return small.tobytes()
+
+
+def dhash(source: str | bytes | None, source_key: Hashable | None = None) -> int:
+    """Difference hash: one bit per horizontally adjacent pair of a 9x8 grayscale thumbnail.
+
+    Like render, uses a bitmap from this worker's decode cache when
+    ``source_key`` has one, and raises SourceRequired without a source.
+    """
+    size = (HASH_SIZE + 1, HASH_SIZE)
+    cached = get_decode_cache().get(source_key, size) if source_key is not None else None
+    if cached is not None:
+        pixels = _grid(cached)
+    elif source is None:
+        raise SourceRequired("Source is not decoded in this worker")
+    else:
+        if isinstance(source, bytes):
+            source = BytesIO(source)
+
+        with load_image(source, size) as image:
+            if needs_strips(image):
+                image = transform_strips(
+                    source,
+                    (0, 0, image.width, image.height),
+                    reduce=strip_reduce_factor(image.size, size)
+                )
+            pixels = _grid(image)
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def hash_bands(value: int) -> Tuple[int, ...]:
+    return tuple((value >> (BAND_BITS * i)) & BAND_MASK for i in range(BANDS))
+
+
+def hash_from_hex(text: str) -> int:
+    return int(text, 16)
+
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def band_variants(band: int, radius: int) -> List[int]:
+    """Every 16-bit value within `radius` bit flips of `band`"""
+    variants = [band]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flips):
+            variant = band
+            for bit in bits:
+                variant ^= 1 << bit
+            variants.append(variant)
+    return variants
+
+
+def band_columns():
+    return (Image.phash_band0, Image.phash_band1, Image.phash_band2, Image.phash_band3)
+
+
+def perceptual_hash_values(value: int) -> dict:
+    """Column values to store on an Image for the given hash"""
+    values = {"perceptual_hash": hash_to_hex(value)}
+    for column, band in zip(band_columns(), hash_bands(value)):
+        values[column.key] = band
+    return values
+
+
+async def index_image(image_id: int, source_path: str) -> None:
+    """Hash a freshly committed upload in the worker pool and store its bands"""
+    try:
+        source = await get_storage().read_source(source_path)
+        value = await get_executor().run(dhash, source)
+    except Exception as e:
+        # Unindexed images are hashed on demand by the similar-images endpoint
+        print(f"❌ Perceptual hash skipped for image {image_id}: {e}")
+        return
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Image).where(Image.id == image_id).values(**perceptual_hash_values(value))
+        )
+        await db.commit()
+
+
+class SimilarImage(NamedTuple):
+    image_id: int
+    filename: str
+    distance: int
+
+
+async def find_similar(
+    db: AsyncSession,
+    user_id: int,
+    value: int,
+    max_distance: int,
+    limit: int,
+    exclude_id: int | None = None
+) -> List[SimilarImage]:
+    """Images of one user within max_distance of the hash, nearest first"""
+    radius = max_distance // BANDS
+    probes = [
+        column.in_(band_variants(band, radius))
+        for column, band in zip(band_columns(), hash_bands(value))
+    ]
+
+    query = select(Image.id, Image.filename, Image.perceptual_hash).where(
+        Image.user_id == user_id,
+        or_(*probes)
+    )
+    if exclude_id is not None:
+        query = query.where(Image.id != exclude_id)
+
+    matches = []
+    for row in await db.execute(query):
+        distance = hamming(value, hash_from_hex(row.perceptual_hash))
+        if distance <= max_distance:
+            matches.append(SimilarImage(row.id, row.filename, distance))
+
+    matches.sort(key=lambda match: (match.distance, match.image_id))
+    return matches[:limit]
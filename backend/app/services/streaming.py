@@ -0,0 +1,86 @@
+import mimetypes
+import re
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.storage.base import StorageBackend
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Resolve a single-range ``Range`` header to inclusive (start, end).
+
+    Returns None when the header should be ignored (multiple ranges or
+    another unit) and raises 416 when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise range_not_satisfiable(size)
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise range_not_satisfiable(size)
+    return start, end
+
+
+def range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+async def stream_from_storage(
+    storage: StorageBackend,
+    file_path: str,
+    request: Request,
+    media_type: str | None = None,
+    headers: dict | None = None
+) -> StreamingResponse:
+    """Stream a stored file from any backend, honouring a single byte range"""
+    try:
+        size = await storage.size(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found in storage")
+
+    headers = {**(headers or {}), "Accept-Ranges": "bytes"}
+    media_type = media_type or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and size:
+        # A stale If-Range validator means the client must refetch everything
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range == headers.get("ETag"):
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            storage.stream(file_path), media_type=media_type, headers=headers
+        )
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        storage.stream(file_path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Tuple
+
+# Stage timings for the current request (or worker job), as (stage, seconds)
+# pairs. Stage names look like "decode", "action:sepia", "encode:webp",
+# "storage:save" or "db". This module has no dependencies so pipeline code in
+# worker processes can record into it; app.metrics turns the records into
+# Prometheus histograms and Server-Timing headers in the API process.
+Timings = List[Tuple[str, float]]
+
+_timings: ContextVar[Timings | None] = ContextVar("stage_timings", default=None)
+_observer: Callable[[str, float], None] | None = None
+
+
+def set_observer(observer: Callable[[str, float], None] | None) -> None:
+    """Receive every recorded stage in this process, request or not"""
+    global _observer
+    _observer = observer
+
+
+def record(stage: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+    if _observer is not None:
+        _observer(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def collecting():
+    """Collect the stages recorded inside the block, including in child tasks"""
+    timings: Timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def run_timed(func, *args):
+    """Call func in a worker process and return its result with the stages it recorded"""
+    with collecting() as timings:
+        result = func(*args)
+    return result, timings
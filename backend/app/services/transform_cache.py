@@ -0,0 +1,209 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Hashable, List, NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.metrics import TRANSFORM_CACHE_LOOKUPS
+from app.models import Image, ImageTransformation
+from app.services.encoders import DEFAULT_PRESET
+from app.services.pipeline import Operation, canonicalize_operations, normalize_format
+
+
+class CachedTransformation(NamedTuple):
+    transformation_id: int
+    output_file_path: str
+
+
+def transform_cache_key(
+    image: Image,
+    operations: List[Operation],
+    output_format: str,
+    quality: int | None = None,
+    preset: str | None = None
+) -> str:
+    """Content address of a transform result.
+
+    The source is named by its content hash; rows from before hashing fall
+    back to the storage path, which is never rewritten in place either. The
+    image id stays in the key so results belong to one image (and so one
+    user), even when deduplicated uploads share their bytes.
+    """
+    payload = json.dumps(
+        {
+            "source": f"{image.id}:{image.content_hash or image.file_path}",
+            "operations": canonicalize_operations(operations),
+            "output_format": normalize_format(output_format),
+            "quality": quality,
+            "preset": preset or DEFAULT_PRESET,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def decode_cache_key(image: Image) -> Hashable | None:
+    """Key of an original in the workers' decode caches; None when they are
+    disabled, so callers do not probe caches that cannot hit"""
+    if settings.DECODE_CACHE_BYTES <= 0:
+        return None
+    return (image.id, image.content_hash)
+
+
+class TransformCache:
+    """Small LRU of recent cache keys in front of the image_transformations index.
+
+    Each API process has its own LRU, and any of them may delete an image
+    and its transformations, so a remembered entry is only trusted after a
+    primary-key check that its row still exists.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedTransformation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CachedTransformation | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedTransformation) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def _existing_ids(self, db: AsyncSession, entries: List[CachedTransformation]) -> set:
+        ids = [entry.transformation_id for entry in entries]
+        return set(await db.scalars(
+            select(ImageTransformation.id).where(ImageTransformation.id.in_(ids))
+        ))
+
+    async def lookup(self, db: AsyncSession, key: str) -> CachedTransformation | None:
+        """Check the in-process LRU first, then the indexed cache_key column"""
+        entry = self.get(key)
+        if entry is not None:
+            if await self._existing_ids(db, [entry]):
+                TRANSFORM_CACHE_LOOKUPS.labels(result="memory").inc()
+                return entry
+            self.discard(key)
+
+        row = (await db.execute(
+            select(
+                ImageTransformation.id,
+                ImageTransformation.output_file_path
+            ).where(ImageTransformation.cache_key == key).limit(1)
+        )).first()
+
+        if row is None:
+            TRANSFORM_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+        TRANSFORM_CACHE_LOOKUPS.labels(result="database").inc()
+        entry = CachedTransformation(row.id, row.output_file_path)
+        self.put(key, entry)
+        return entry
+
+    async def lookup_many(self, db: AsyncSession, keys: List[str]) -> Dict[str, CachedTransformation]:
+        """Resolve many keys with at most one indexed IN query"""
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                found[key] = entry
+            else:
+                missing.append(key)
+
+        if found:
+            existing = await self._existing_ids(db, list(found.values()))
+            for key, entry in list(found.items()):
+                if entry.transformation_id not in existing:
+                    self.discard(key)
+                    del found[key]
+                    missing.append(key)
+
+        if missing:
+            rows = await db.execute(
+                select(
+                    ImageTransformation.cache_key,
+                    ImageTransformation.id,
+                    ImageTransformation.output_file_path
+                ).where(ImageTransformation.cache_key.in_(missing))
+            )
+
+            for row in rows:
+                entry = CachedTransformation(row.id, row.output_file_path)
+                found[row.cache_key] = entry
+                self.put(row.cache_key, entry)
+
+        hits_in_memory = len(keys) - len(missing)
+        hits_in_database = len(found) - hits_in_memory
+        TRANSFORM_CACHE_LOOKUPS.labels(result="memory").inc(hits_in_memory)
+        TRANSFORM_CACHE_LOOKUPS.labels(result="database").inc(hits_in_database)
+        TRANSFORM_CACHE_LOOKUPS.labels(result="miss").inc(len(keys) - len(found))
+        return found
+
+
+    async def record(
+        self,
+        db: AsyncSession,
+        rows: List[ImageTransformation]
+    ) -> List[CachedTransformation]:
+        """Insert freshly rendered transformations and remember them.
+
+        cache_key is unique, so when a concurrent render of the same key
+        committed first the insert fails; the rows are then inserted one by
+        one and each loser gets the winner's entry instead. Callers should
+        delete the output of a row whose entry points at another file.
+        """
+        db.add_all(rows)
+        try:
+            await db.commit()
+            entries = [CachedTransformation(row.id, row.output_file_path) for row in rows]
+        except IntegrityError:
+            await db.rollback()
+            entries = [await self._record_one(db, row) for row in rows]
+
+        for row, entry in zip(rows, entries):
+            self.put(row.cache_key, entry)
+        return entries
+
+    async def _record_one(self, db: AsyncSession, row: ImageTransformation) -> CachedTransformation:
+        db.add(row)
+        try:
+            await db.commit()
+            return CachedTransformation(row.id, row.output_file_path)
+        except IntegrityError:
+            await db.rollback()
+            existing = (await db.execute(
+                select(
+                    ImageTransformation.id,
+                    ImageTransformation.output_file_path
+                ).where(ImageTransformation.cache_key == row.cache_key)
+            )).first()
+            if existing is None:
+                raise
+            return CachedTransformation(existing.id, existing.output_file_path)
+
+
+@lru_cache()
+def get_transform_cache() -> TransformCache:
+    return TransformCache(max_entries=settings.TRANSFORM_CACHE_SIZE)
@@ -0,0 +1,99 @@
+from typing import List, NamedTuple
+
+from app.services.encoders import PRESETS, available_formats
+from app.services.pipeline import MAX_DIMENSION, UNBOUNDED, Operation, normalize_format
+
+EFFECTS = {"grayscale", "sepia", "invert"}
+FLIPS = {"h": "flip_horizontal", "v": "flip_vertical"}
+
+
+class InvalidSpec(ValueError):
+    """Raised when a URL transform spec cannot be parsed"""
+
+
+class RenditionRequest(NamedTuple):
+    operations: List[Operation]
+    output_format: str
+    quality: int | None
+    preset: str | None
+
+
+def parse_url_spec(spec: str, default_format: str = "jpeg") -> RenditionRequest:
+    """Parse a comma separated spec such as ``w_400,h_300,c_fit,e_sepia,f_webp,q_80,p_small``.
+
+    ``w``/``h`` size (``c_fit`` keeps the aspect ratio and never upscales and
+    is the default, ``c_scale`` stretches to exactly w x h), ``r`` rotates by
+    degrees, ``fl`` flips (``h`` or ``v``), ``e`` applies an effect, ``f``
+    picks the output format (``f_auto`` negotiates it from the Accept header),
+    ``q`` the quality and ``p`` the encoder preset. Operations always apply in
+    that order regardless of their order in the URL, so equivalent URLs map
+    to the same cached rendition.
+    """
+    values = {}
+    for token in filter(None, spec.split(",")):
+        key, sep, value = token.partition("_")
+        if not sep or not value:
+            raise InvalidSpec(f"Invalid token {token!r}")
+        if key in values:
+            raise InvalidSpec(f"Duplicate token {key!r}")
+        values[key] = value
+
+    unknown = set(values) - {"w", "h", "c", "r", "fl", "e", "f", "q", "p"}
+    if unknown:
+        raise InvalidSpec(f"Unknown token {sorted(unknown)[0]!r}")
+
+    def integer(key: str, low: int, high: int) -> int | None:
+        if key not in values:
+            return None
+        try:
+            number = int(values[key])
+        except ValueError:
+            raise InvalidSpec(f"{key}_ must be an integer")
+        if not low <= number <= high:
+            raise InvalidSpec(f"{key}_ must be between {low} and {high}")
+        return number
+
+    width = integer("w", 1, MAX_DIMENSION)
+    height = integer("h", 1, MAX_DIMENSION)
+    angle = integer("r", -360, 360)
+    quality = integer("q", 1, 95)
+    crop_mode = values.get("c", "fit")
+
+    operations = []
+
+    if width or height:
+        if crop_mode == "fit":
+            operations.append({
+                "action": "thumbnail",
+                "width": width or UNBOUNDED,
+                "height": height or UNBOUNDED,
+            })
+        elif crop_mode == "scale":
+            if not (width and height):
+                raise InvalidSpec("c_scale needs both w_ and h_")
+            operations.append({"action": "resize", "width": width, "height": height})
+        else:
+            raise InvalidSpec("c_ must be fit or scale")
+
+    if angle:
+        operations.append({"action": "rotate", "angle": angle})
+
+    if "fl" in values:
+        if values["fl"] not in FLIPS:
+            raise InvalidSpec("fl_ must be h or v")
+        operations.append({"action": FLIPS[values["fl"]]})
+
+    if "e" in values:
+        if values["e"] not in EFFECTS:
+            raise InvalidSpec(f"e_ must be one of {', '.join(sorted(EFFECTS))}")
+        operations.append({"action": values["e"]})
+
+    output_format = normalize_format(values.get("f", default_format))
+    if output_format != "auto" and output_format not in available_formats():
+        raise InvalidSpec(f"Unsupported format {values.get('f')!r}")
+
+    preset = values.get("p")
+    if preset is not None and preset not in PRESETS:
+        raise InvalidSpec(f"p_ must be one of {', '.join(PRESETS)}")
+
+    return RenditionRequest(operations, output_format, quality, preset)
@@ -1,11 +1,47 @@
+import functools
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from app.services.timing import timed
+
+# Whole-object calls timed as "storage:<name>" stages for every backend;
+# stream() is left out because its duration is set by the consumer
+TIMED_OPERATIONS = ("save", "delete", "size", "get")
+
+
+def _timed_operation(name: str, method):
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with timed(f"storage:{name}"):
+            return await method(self, *args, **kwargs)
+    return wrapper
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    """Where a saved file ended up, plus size and SHA-256 computed while streaming"""
+    path: str
+    size: int
+    content_hash: str
 
 
 class StorageBackend(ABC):
+    def __init_subclass__(cls, timed: bool = True, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Wrappers around another backend pass timed=False so an operation
+        # is not recorded twice
+        if not timed:
+            return
+        for name in TIMED_OPERATIONS:
+            method = cls.__dict__.get(name)
+            if method is not None:
+                setattr(cls, name, _timed_operation(name, method))
+
     @abstractmethod
-    async def save(self, file, filename: str = None) -> str:
+    async def save(self, file, filename: str = None) -> StoredFile:
         """
-        Save file and return file path or URL
+        Stream file into storage and return its path or URL, size and hash
         """
         pass
 
@@ -14,4 +50,44 @@ class StorageBackend(ABC):
         """
         Delete file from storage
         """
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def size(self, file_path: str) -> int:
+        """
+        Return the stored size in bytes, raising FileNotFoundError if missing
+        """
+        pass
+
+    @abstractmethod
+    def stream(
+        self,
+        file_path: str,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield bytes start..end (inclusive, end defaults to EOF) in chunks
+        """
+        pass
+
+    async def get(self, file_path: str) -> bytes:
+        """
+        Read a whole file; only for objects known to be small enough
+        """
+        return b"".join([chunk async for chunk in self.stream(file_path)])
+
+    get = _timed_operation("get", get)
+
+    def local_path(self, file_path: str) -> str | None:
+        """
+        Filesystem path for backends that have one, so readers can skip a copy
+        """
+        return None
+
+    async def read_source(self, file_path: str) -> str | bytes:
+        """
+        Something Image.open can read in a worker process: a path or the bytes
+        """
+        return self.local_path(file_path) or await self.get(file_path)
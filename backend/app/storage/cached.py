@@ -0,0 +1,335 @@
+import asyncio
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+
+from anyio import to_thread
+
+from app.services.timing import timed
+from app.storage.base import StorageBackend, StoredFile
+
+# Keys that turned out too large to cache, remembered so they are not
+# downloaded twice (once to try, once to stream) on every read
+UNCACHEABLE_KEYS = 1024
+
+
+@dataclass
+class _DiskEntry:
+    path: str
+    size: int
+    # Paths handed to transform workers must outlive the request that read them
+    protected_until: float = 0.0
+
+
+class CachedStorage(StorageBackend, timed=False):
+    """Read-through cache in front of another backend.
+
+    Objects are fetched whole on first full read and kept in two LRU tiers
+    bounded by total bytes: a directory on local disk, and memory for
+    objects up to ``memory_max_object_bytes``. Concurrent misses for the
+    same path share one download; range reads are served from the cache
+    when the object is there and straight from the backend otherwise. Writes go straight to the wrapped
+    backend; stored paths are never overwritten in place, so the only
+    invalidation needed is on delete.
+
+    Each process gets its own cache directory, removed at exit, so two
+    uvicorn workers never evict files from under each other.
+    """
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        memory_bytes: int,
+        memory_max_object_bytes: int,
+        disk_bytes: int = 0,
+        max_object_bytes: int | None = None,
+        cache_dir: str | None = None,
+        protect_seconds: float = 0.0,
+        chunk_size: int | None = None
+    ):
+        self.backend = backend
+        self.memory_bytes = memory_bytes
+        self.memory_max_object_bytes = min(memory_max_object_bytes, memory_bytes)
+        self.disk_bytes = disk_bytes
+        self.max_object_bytes = max_object_bytes or disk_bytes or self.memory_max_object_bytes
+        self.protect_seconds = protect_seconds
+        self.chunk_size = chunk_size or getattr(backend, "chunk_size", None)
+
+        self.cache_dir = None
+        if disk_bytes > 0:
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self.cache_dir = tempfile.mkdtemp(prefix="storage-cache-", dir=cache_dir)
+            atexit.register(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, _DiskEntry]" = OrderedDict()
+        self._disk_used = 0
+        self._uncacheable: "OrderedDict[str, None]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    # Index
+
+    def _cached(self, file_path: str) -> bytes | _DiskEntry | None:
+        """The memory or disk entry for a path, counting the hit and refreshing recency"""
+        data = self._memory.get(file_path)
+        if data is not None:
+            self._memory.move_to_end(file_path)
+            self.memory_hits += 1
+            return data
+        entry = self._disk.get(file_path)
+        if entry is not None:
+            self._disk.move_to_end(file_path)
+            self.disk_hits += 1
+            return entry
+        return None
+
+    def _remember_memory(self, file_path: str, data: bytes) -> None:
+        self._memory[file_path] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self.evictions += 1
+
+    def _remember_disk(self, file_path: str, entry: _DiskEntry) -> None:
+        self._disk[file_path] = entry
+        self._disk_used += entry.size
+        now = time.monotonic()
+        for key in list(self._disk):
+            if self._disk_used <= self.disk_bytes:
+                break
+            # The new entry is about to be returned to the caller, so it stays
+            # even when protected entries keep the tier over budget for a while
+            if key == file_path or self._disk[key].protected_until > now:
+                continue
+            self._forget_disk(key)
+            self.evictions += 1
+
+    def _forget_disk(self, file_path: str) -> None:
+        entry = self._disk.pop(file_path, None)
+        if entry is not None:
+            self._disk_used -= entry.size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, file_path: str) -> None:
+        data = self._memory.pop(file_path, None)
+        if data is not None:
+            self._memory_used -= len(data)
+        self._forget_disk(file_path)
+
+    def _too_large(self, file_path: str) -> None:
+        self._uncacheable[file_path] = None
+        if len(self._uncacheable) > UNCACHEABLE_KEYS:
+            self._uncacheable.popitem(last=False)
+        self.bypassed += 1
+
+    # Loading
+
+    async def _lookup(self, file_path: str) -> bytes | _DiskEntry | None:
+        """Cached copy of a path, loading it first on a miss; None if it is too big to cache"""
+        cached = self._cached(file_path)
+        if cached is not None:
+            return cached
+        if file_path in self._uncacheable:
+            self.bypassed += 1
+            return None
+
+        task = self._loading.get(file_path)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._load(file_path))
+            self._loading[file_path] = task
+            task.add_done_callback(lambda _: self._loading.pop(file_path, None))
+        else:
+            self.coalesced += 1
+
+        with timed("storage:fill"):
+            # One waiter giving up must not cancel the download for the others
+            return await asyncio.shield(task)
+
+    async def _load(self, file_path: str) -> bytes | _DiskEntry | None:
+        if await self.backend.size(file_path) > self.max_object_bytes:
+            # A stat (a HEAD for remote backends) is cheaper than downloading
+            # up to the limit to find out
+            return self._too_large(file_path)
+
+        chunks = []
+        size = 0
+        output = None
+        target = None
+        if self.cache_dir:
+            name = hashlib.sha256(file_path.encode("utf-8")).hexdigest()
+            target = os.path.join(self.cache_dir, name + os.path.splitext(file_path)[1])
+            output = await to_thread.run_sync(open, target + ".part", "wb")
+
+        complete = False
+        try:
+            async for chunk in self.backend.stream(file_path, chunk_size=self.chunk_size):
+                size += len(chunk)
+                if size > self.max_object_bytes:
+                    return self._too_large(file_path)
+                if chunks is not None and size <= self.memory_max_object_bytes:
+                    chunks.append(chunk)
+                else:
+                    chunks = None
+                if output is not None:
+                    await to_thread.run_sync(output.write, chunk)
+            complete = True
+        finally:
+            if output is not None:
+                await to_thread.run_sync(output.close)
+                if complete:
+                    await to_thread.run_sync(os.replace, target + ".part", target)
+                else:
+                    await to_thread.run_sync(_remove, target + ".part")
+
+        data = b"".join(chunks) if chunks is not None else None
+        if data is not None:
+            self._remember_memory(file_path, data)
+        if output is None:
+            return data
+
+        entry = _DiskEntry(target, size)
+        self._remember_disk(file_path, entry)
+        return data if data is not None else entry
+
+    # StorageBackend
+
+    async def save(self, file, filename: str = None) -> StoredFile:
+        return await self.backend.save(file, filename)
+
+    async def delete(self, file_path: str) -> None:
+        self._forget(file_path)
+        await self.backend.delete(file_path)
+
+    async def size(self, file_path: str) -> int:
+        data = self._memory.get(file_path)
+        if data is not None:
+            return len(data)
+        entry = self._disk.get(file_path)
+        if entry is not None:
+            return entry.size
+        return await self.backend.size(file_path)
+
+    async def stream(
+        self,
+        file_path: str,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None
+    ) -> AsyncIterator[bytes]:
+        chunk_size = chunk_size or self.chunk_size
+        if start or end is not None:
+            # A range read fills nothing: loading the whole object to serve a
+            # slice of it would multiply the bytes fetched for a seek
+            cached = self._cached(file_path)
+            if cached is None:
+                self.bypassed += 1
+        else:
+            cached = await self._lookup(file_path)
+
+        if isinstance(cached, bytes):
+            stop = len(cached) if end is None else min(end + 1, len(cached))
+            for offset in range(start, stop, chunk_size):
+                yield cached[offset:min(offset + chunk_size, stop)]
+            return
+
+        source = None
+        if cached is not None:
+            try:
+                source = await to_thread.run_sync(open, cached.path, "rb")
+            except FileNotFoundError:
+                self._forget_disk(file_path)
+        if source is None:
+            async for chunk in self.backend.stream(file_path, start, end, chunk_size):
+                yield chunk
+            return
+
+        remaining = None if end is None else end - start + 1
+        try:
+            if start:
+                await to_thread.run_sync(source.seek, start)
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await to_thread.run_sync(source.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await to_thread.run_sync(source.close)
+
+    async def get(self, file_path: str) -> bytes:
+        cached = await self._lookup(file_path)
+        if isinstance(cached, bytes):
+            return cached
+        if cached is not None:
+            try:
+                return await to_thread.run_sync(_read, cached.path)
+            except FileNotFoundError:
+                self._forget_disk(file_path)
+        return await self.backend.get(file_path)
+
+    def local_path(self, file_path: str) -> str | None:
+        return self.backend.local_path(file_path)
+
+    async def read_source(self, file_path: str) -> str | bytes:
+        """Small objects as bytes, larger ones as a cache file the worker can open"""
+        path = self.backend.local_path(file_path)
+        if path:
+            return path
+        cached = await self._lookup(file_path)
+        if isinstance(cached, bytes):
+            return cached
+        if cached is not None:
+            cached.protected_until = time.monotonic() + self.protect_seconds
+            return cached.path
+        return await self.backend.read_source(file_path)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses + self.coalesced
+        hits = self.memory_hits + self.disk_hits + self.coalesced
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_used,
+        }
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as source:
+        return source.read()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,42 +1,197 @@
+import asyncio
+import hashlib
+import mimetypes
+from functools import partial
+from typing import AsyncIterator
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from uuid import uuid4
+from anyio import CapacityLimiter, to_thread
 from fastapi import UploadFile
 
-from app.storage.base import StorageBackend
+from app.storage.base import StorageBackend, StoredFile
 from app.config import settings
 
 
 class S3Storage(StorageBackend):
     def __init__(self):
         self.bucket_name = settings.S3_BUCKET_NAME
+        self.part_size = settings.S3_MULTIPART_PART_SIZE
+        self.upload_concurrency = settings.S3_UPLOAD_CONCURRENCY
+        self.endpoint_url = settings.S3_ENDPOINT_URL
 
+        # boto3 clients are thread-safe; one client shares one urllib3 pool.
+        # "standard" retry mode backs off exponentially with jitter on
+        # throttling and transient network errors.
         self.client = boto3.client(
             "s3",
             aws_access_key_id=settings.S3_ACCESS_KEY,
             aws_secret_access_key=settings.S3_SECRET_KEY,
             region_name=settings.S3_REGION,
+            endpoint_url=self.endpoint_url,
+            config=Config(
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                connect_timeout=settings.S3_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=settings.S3_READ_TIMEOUT_SECONDS,
+                retries={"mode": "standard", "max_attempts": settings.S3_MAX_ATTEMPTS},
+            ),
         )
 
-    async def save(self, file: UploadFile, filename: str = None) -> str:
+        # Blocking boto3 calls run in worker threads; the limiter keeps them
+        # from exhausting the shared thread pool or the connection pool.
+        self.limiter = CapacityLimiter(settings.S3_MAX_CONCURRENCY)
+
+    async def _call(self, method: str, **kwargs):
+        """Run a boto3 client method off the event loop"""
+        return await to_thread.run_sync(
+            partial(getattr(self.client, method), **kwargs),
+            limiter=self.limiter,
+        )
+
+    def _url(self, key: str) -> str:
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket_name}/{key}"
+        return f"https://{self.bucket_name}.s3.{settings.S3_REGION}.amazonaws.com/{key}"
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return file_path.split("/")[-1]
+
+    async def _read_part(self, file: UploadFile) -> bytes:
+        """Read up to one part, looping because UploadFile.read may return short"""
+        chunks = []
+        remaining = self.part_size
+        while remaining > 0:
+            chunk = await file.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    async def save(self, file: UploadFile, filename: str = None) -> StoredFile:
         if not filename:
             extension = file.filename.split(".")[-1]
             filename = f"{uuid4().hex}.{extension}"
 
-        content = await file.read()
+        content_type = file.content_type or mimetypes.guess_type(filename)[0]
+        extra = {"ContentType": content_type} if content_type else {}
+        digest = hashlib.sha256()
+
+        first = await self._read_part(file)
+        digest.update(first)
 
-        self.client.put_object(
-            Bucket=self.bucket_name,
-            Key=filename,
-            Body=content,
-            ContentType=file.content_type,
+        if len(first) < self.part_size:
+            # Fits in a single part: a plain PUT is one round-trip
+            await self._call(
+                "put_object", Bucket=self.bucket_name, Key=filename, Body=first, **extra
+            )
+            return StoredFile(path=self._url(filename), size=len(first), content_hash=digest.hexdigest())
+
+        upload = await self._call(
+            "create_multipart_upload", Bucket=self.bucket_name, Key=filename, **extra
         )
+        upload_id = upload["UploadId"]
+        slots = asyncio.Semaphore(self.upload_concurrency)
+        tasks = []
+        size = 0
 
-        return f"https://{self.bucket_name}.s3.{settings.S3_REGION}.amazonaws.com/{filename}"
+        async def upload_part(number: int, body: bytes) -> dict:
+            try:
+                response = await self._call(
+                    "upload_part",
+                    Bucket=self.bucket_name,
+                    Key=filename,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=body,
+                )
+            finally:
+                slots.release()
+            return {"PartNumber": number, "ETag": response["ETag"]}
 
-    async def delete(self, file_path: str) -> None:
-        key = file_path.split("/")[-1]
+        try:
+            part, number = first, 1
+            while part:
+                size += len(part)
+                # Waiting for a free slot before reading the next part keeps
+                # memory at roughly part_size * upload_concurrency
+                await slots.acquire()
+                tasks.append(asyncio.create_task(upload_part(number, part)))
+                part = await self._read_part(file)
+                digest.update(part)
+                number += 1
 
-        self.client.delete_object(
-            Bucket=self.bucket_name,
-            Key=key,
-        )
\ No newline at end of file
+            parts = await asyncio.gather(*tasks)
+
+            await self._call(
+                "complete_multipart_upload",
+                Bucket=self.bucket_name,
+                Key=filename,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": list(parts)},
+            )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._call(
+                "abort_multipart_upload",
+                Bucket=self.bucket_name,
+                Key=filename,
+                UploadId=upload_id,
+            )
+            raise
+
+        return StoredFile(path=self._url(filename), size=size, content_hash=digest.hexdigest())
+
+    async def get(self, file_path: str) -> bytes:
+        try:
+            response = await self._call("get_object", Bucket=self.bucket_name, Key=self._key(file_path))
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(file_path)
+        body = response["Body"]
+        try:
+            return await to_thread.run_sync(body.read, limiter=self.limiter)
+        finally:
+            body.close()
+
+    async def size(self, file_path: str) -> int:
+        try:
+            response = await self._call("head_object", Bucket=self.bucket_name, Key=self._key(file_path))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(file_path)
+            raise
+        return response["ContentLength"]
+
+    async def stream(
+        self,
+        file_path: str,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """Yield the object, or a byte range of it, without holding it all in memory"""
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        extra = {}
+        if start or end is not None:
+            extra["Range"] = f"bytes={start}-{'' if end is None else end}"
+
+        try:
+            response = await self._call(
+                "get_object", Bucket=self.bucket_name, Key=self._key(file_path), **extra
+            )
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(file_path)
+
+        body = response["Body"]
+        try:
+            while chunk := await to_thread.run_sync(body.read, chunk_size, limiter=self.limiter):
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, file_path: str) -> None:
+        await self._call("delete_object", Bucket=self.bucket_name, Key=self._key(file_path))
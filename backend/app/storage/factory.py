@@ -3,15 +3,35 @@ from functools import lru_cache
 from app.storage.local import LocalStorage
 from app.storage.cloud import S3Storage
 from app.storage.base import StorageBackend
+from app.storage.cached import CachedStorage
 from app.config import settings
 
 
-@lru_cache()
-def get_storage() -> StorageBackend:
+def _backend() -> StorageBackend:
     if settings.STORAGE_BACKEND == "local":
         return LocalStorage(upload_dir=settings.UPLOAD_DIR)
 
     if settings.STORAGE_BACKEND == "s3":
         return S3Storage()
 
-    raise ValueError("Invalid STORAGE_BACKEND configuration")
\ No newline at end of file
+    raise ValueError("Invalid STORAGE_BACKEND configuration")
+
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    backend = _backend()
+    if not settings.STORAGE_CACHE_ENABLED:
+        return backend
+
+    # Local files are already on disk, so they only get the memory tier
+    remote = not isinstance(backend, LocalStorage)
+    return CachedStorage(
+        backend,
+        memory_bytes=settings.STORAGE_CACHE_MEMORY_BYTES,
+        memory_max_object_bytes=settings.STORAGE_CACHE_MEMORY_MAX_OBJECT_BYTES,
+        disk_bytes=settings.STORAGE_CACHE_DISK_BYTES if remote else 0,
+        max_object_bytes=settings.STORAGE_CACHE_MAX_OBJECT_BYTES if remote else None,
+        cache_dir=settings.STORAGE_CACHE_DIR,
+        # Long enough for a transform worker to open the file it was handed
+        protect_seconds=settings.TRANSFORM_TIMEOUT_SECONDS,
+    )
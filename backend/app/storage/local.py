@@ -1,28 +1,76 @@
+import hashlib
 import os
+from typing import AsyncIterator
 from uuid import uuid4
+
+from anyio import to_thread
 from fastapi import UploadFile
 
-from app.storage.base import StorageBackend
+from app.config import settings
+from app.storage.base import StorageBackend, StoredFile
 
 
 class LocalStorage(StorageBackend):
-    def __init__(self, upload_dir: str = "uploads"):
+    def __init__(self, upload_dir: str = "uploads", chunk_size: int | None = None):
         self.upload_dir = upload_dir
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
         os.makedirs(self.upload_dir, exist_ok=True)
 
-    async def save(self, file: UploadFile, filename: str = None) -> str:
+    async def save(self, file: UploadFile, filename: str = None) -> StoredFile:
         if not filename:
             extension = file.filename.split(".")[-1]
             filename = f"{uuid4().hex}.{extension}"
 
         file_path = os.path.join(self.upload_dir, filename)
+        digest = hashlib.sha256()
+        size = 0
 
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Only one chunk is held in memory; disk writes run in a worker thread
+        buffer = await to_thread.run_sync(open, file_path, "wb")
+        try:
+            while chunk := await file.read(self.chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                await to_thread.run_sync(buffer.write, chunk)
+        except BaseException:
+            await to_thread.run_sync(buffer.close)
+            await self.delete(file_path)
+            raise
+        await to_thread.run_sync(buffer.close)
 
-        return file_path
+        return StoredFile(path=file_path, size=size, content_hash=digest.hexdigest())
 
     async def delete(self, file_path: str) -> None:
         if os.path.exists(file_path):
-            os.remove(file_path)
\ No newline at end of file
+            os.remove(file_path)
+
+    async def size(self, file_path: str) -> int:
+        return await to_thread.run_sync(os.path.getsize, file_path)
+
+    async def stream(
+        self,
+        file_path: str,
+        start: int = 0,
+        end: int | None = None,
+        chunk_size: int | None = None
+    ) -> AsyncIterator[bytes]:
+        chunk_size = chunk_size or self.chunk_size
+        remaining = None if end is None else end - start + 1
+
+        source = await to_thread.run_sync(open, file_path, "rb")
+        try:
+            if start:
+                await to_thread.run_sync(source.seek, start)
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await to_thread.run_sync(source.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await to_thread.run_sync(source.close)
+
+    def local_path(self, file_path: str) -> str | None:
+        return file_path
@@ -0,0 +1,91 @@
+"""Transform job worker.
+
+Run alongside the API with the same settings and database:
+
+    python -m app.worker
+"""
+import asyncio
+import os
+import socket
+import traceback
+
+from app.config import settings
+from app.db import SessionLocal, engine
+from app.migrations import migrate
+from app.services.decode_cache import configure_decode_cache
+from app.services.image_transformer import configure_limits
+from app.services.jobs import (
+    PERMANENT_ERRORS,
+    claim_next_job,
+    execute_job,
+    keep_alive,
+    mark_failed,
+    mark_succeeded,
+    requeue_stale_jobs
+)
+
+
+async def run_worker(worker_id: str) -> None:
+    print(f"🔧 Transform worker {worker_id} started")
+    migrate(engine)
+    # Jobs render in this process
+    configure_limits(settings.MAX_IMAGE_PIXELS, settings.MAX_DECODE_PIXELS, settings.TRANSFORM_STRIP_BYTES)
+    configure_decode_cache(settings.DECODE_CACHE_BYTES)
+
+    while True:
+        db = SessionLocal()
+        try:
+            if not await run_next_job(db, worker_id):
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+        except Exception:
+            # A database hiccup must not end the worker; try again shortly
+            db.rollback()
+            traceback.print_exc()
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+        finally:
+            db.close()
+
+
+async def run_next_job(db, worker_id: str) -> bool:
+    """Claim and run one job; False when the queue is empty"""
+    requeue_stale_jobs(db)
+    job = claim_next_job(db, worker_id)
+    if job is None:
+        return False
+    # Plain values: the row may be deleted under us (DELETE /images/{id})
+    job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+
+    heartbeat = asyncio.create_task(keep_alive(job_id, worker_id))
+    try:
+        transformation_id = await execute_job(db, job)
+    except Exception as e:
+        heartbeat.cancel()
+        db.rollback()
+        traceback.print_exc()
+        status = mark_failed(
+            db, job_id, worker_id, attempts, max_attempts,
+            str(e) or type(e).__name__, permanent=isinstance(e, PERMANENT_ERRORS)
+        )
+        if status is None:
+            print(f"⚠️ Job {job_id} failed but is no longer ours; outcome dropped")
+        else:
+            print(f"❌ Job {job_id} failed (attempt {attempts}/{max_attempts}, now {status}): {e}")
+    else:
+        heartbeat.cancel()
+        if mark_succeeded(db, job_id, worker_id, transformation_id):
+            print(f"✅ Job {job_id} succeeded")
+        else:
+            print(f"⚠️ Job {job_id} finished but is no longer ours; outcome dropped")
+    return True
+
+
+def main():
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        asyncio.run(run_worker(worker_id))
+    except KeyboardInterrupt:
+        print(f"Transform worker {worker_id} stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the image processing service."""
@@ -0,0 +1,117 @@
+"""Save benchmark results as a baseline and fail on regressions against one.
+
+Scripts report a flat dict of metrics whose names end in their unit:
+``*_ms`` is lower-is-better, ``*_rps`` higher-is-better. Numbers are only
+comparable on the same machine with the same arguments, so the stored files
+under benchmarks/baselines/ are a reference for the host that wrote them;
+refresh them with --save-baseline after hardware or intentional changes.
+"""
+import json
+import os
+import platform
+import sys
+from typing import Callable, Dict, List
+
+import PIL
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def default_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def add_arguments(parser, name: str, tolerance: float) -> None:
+    parser.add_argument(
+        "--baseline", nargs="?", const=default_path(name), metavar="PATH",
+        help=f"Compare against a baseline and exit 1 on regressions (default: {default_path(name)})"
+    )
+    parser.add_argument(
+        "--save-baseline", nargs="?", const=default_path(name), metavar="PATH",
+        help="Write these results as the new baseline"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=tolerance,
+        help="Allowed relative slowdown before a metric counts as regressed"
+    )
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=0.5,
+        help="Ignore *_ms changes smaller than this, which are mostly timer noise"
+    )
+
+
+def environment(args) -> dict:
+    settings = {
+        key: value for key, value in vars(args).items()
+        if key not in ("baseline", "save_baseline", "tolerance", "min_delta_ms")
+    }
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": settings,
+    }
+
+
+def compare(
+    metrics: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerance: float,
+    min_delta_ms: float
+) -> List[str]:
+    """Human-readable lines for every metric worse than baseline by more than tolerance"""
+    regressions = []
+    for name, value in metrics.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        if name.endswith("_rps"):
+            worse = value < reference * (1 - tolerance)
+        else:
+            worse = value > reference * (1 + tolerance) and value - reference >= min_delta_ms
+        if worse:
+            regressions.append(f"{name}: {reference:.2f} -> {value:.2f} ({value / reference - 1:+.0%})")
+    return regressions
+
+
+def finish(metrics: Dict[str, float], args, remeasure: Callable[[str], float] | None = None) -> None:
+    """Save and/or check results as the command line asked, exiting 1 on regressions.
+
+    With ``remeasure``, flagged *_ms metrics are measured once more and keep
+    the lower value before anything counts as a regression.
+    """
+    current = environment(args)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as output:
+            json.dump({"environment": current, "metrics": metrics}, output, indent=2, sort_keys=True)
+            output.write("\n")
+        print(f"baseline saved to {args.save_baseline}")
+
+    if not args.baseline:
+        return
+
+    with open(args.baseline) as baseline_file:
+        stored = json.load(baseline_file)
+
+    if stored["environment"]["args"] != current["args"]:
+        print("warning: baseline was recorded with different arguments:", stored["environment"]["args"])
+    missing = sorted(set(stored["metrics"]) - set(metrics))
+    if missing:
+        print(f"warning: {len(missing)} baseline metrics not measured, e.g. {missing[0]}")
+
+    regressions = compare(metrics, stored["metrics"], args.tolerance, args.min_delta_ms)
+    if regressions and remeasure is not None:
+        flagged = [line.split(":")[0] for line in regressions]
+        print(f"rechecking {len(flagged)} flagged metric(s)")
+        for name in flagged:
+            metrics[name] = min(metrics[name], remeasure(name))
+        regressions = compare(metrics, stored["metrics"], args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} against {args.baseline}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
@@ -0,0 +1,74 @@
+"""Compare the legacy per-pixel sepia loop with the color-matrix engine.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_color_filters --sizes 1,4,12
+"""
+import argparse
+import time
+
+from PIL import Image
+
+from app.services.image_transformer import grayscale_image, sepia_image
+
+
+def legacy_sepia(image: Image.Image) -> Image.Image:
+    sepia = image.convert("RGB")
+    pixels = sepia.load()
+
+    for y in range(sepia.height):
+        for x in range(sepia.width):
+            r, g, b = pixels[x, y]
+
+            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
+            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
+            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
+
+            pixels[x, y] = (
+                min(255, tr),
+                min(255, tg),
+                min(255, tb)
+            )
+
+    return sepia
+
+
+def make_image(megapixels: float) -> Image.Image:
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    return Image.radial_gradient("L").resize((width, height)).convert("RGB")
+
+
+def measure(func, image: Image.Image, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(image)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1,4,12", help="Comma separated megapixel sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy-above", type=float, default=4.0,
+                        help="Skip the slow legacy loop above this many megapixels")
+    args = parser.parse_args()
+
+    print(f"{'MP':>6} {'filter':<18} {'seconds':>9} {'MP/s':>9}")
+    for size in (float(s) for s in args.sizes.split(",")):
+        image = make_image(size)
+        mp = image.width * image.height / 1_000_000
+
+        cases = [("sepia (matrix)", sepia_image), ("grayscale (matrix)", grayscale_image)]
+        if size <= args.skip_legacy_above:
+            cases.insert(0, ("sepia (legacy)", legacy_sepia))
+
+        for name, func in cases:
+            seconds = measure(func, image, 1 if func is legacy_sepia else args.repeat)
+            print(f"{mp:>6.1f} {name:<18} {seconds:>9.4f} {mp / seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
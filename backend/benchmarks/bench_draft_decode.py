@@ -0,0 +1,75 @@
+"""Full-resolution vs. draft-mode decoding for large-to-small resizes.
+
+Each case runs in a fresh process so its peak RSS is measured in isolation.
+Run from the backend directory:
+
+    python -m benchmarks.bench_draft_decode --megapixels 24 --target 200
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+from app.services.pipeline import encode_image, render
+
+
+def make_jpeg(path: str, megapixels: float) -> None:
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+    image.save(path, format="JPEG", quality=90)
+
+
+def full_decode(path: str, width: int, height: int) -> bytes:
+    with Image.open(path) as image:
+        image.load()
+        return encode_image(image.resize((width, height)), "jpeg")
+
+
+def draft_decode(path: str, width: int, height: int) -> bytes:
+    return render(path, [{"action": "resize", "width": width, "height": height}], "jpeg")
+
+
+def run_case(func, path: str, width: int, height: int, queue) -> None:
+    start = time.perf_counter()
+    func(path, width, height)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=24)
+    parser.add_argument("--target", type=int, default=200, help="Target width in pixels")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "source.jpg")
+        # Build the source in a child too: Linux carries ru_maxrss across exec
+        maker = context.Process(target=make_jpeg, args=(path, args.megapixels))
+        maker.start()
+        maker.join()
+        with Image.open(path) as source:
+            width = args.target
+            height = max(1, round(source.height * width / source.width))
+
+        print(f"source {args.megapixels:.0f} MP -> {width}x{height}")
+        print(f"{'decoder':<8} {'seconds':>9} {'peak RSS MB':>12}")
+        for name, func in (("full", full_decode), ("draft", draft_decode)):
+            queue = context.Queue()
+            process = context.Process(target=run_case, args=(func, path, width, height, queue))
+            process.start()
+            elapsed, peak = queue.get()
+            process.join()
+            print(f"{name:<8} {elapsed:>9.3f} {peak:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Encode time vs. output bytes for every format and encoder preset.
+
+The test image mixes smooth gradients, hard edges and noise so lossless and
+lossy encoders both have something to work on. Run from the backend directory:
+
+    python -m benchmarks.bench_encoders --megapixels 2
+    python -m benchmarks.bench_encoders --formats webp,avif --quality 70
+"""
+import argparse
+import time
+
+from PIL import Image, ImageDraw
+
+from app.services.encoders import PRESETS, available_formats, encode
+
+
+def make_image(megapixels: float) -> Image.Image:
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+
+    gradient = Image.radial_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    image = Image.merge("RGB", (gradient, noise, Image.linear_gradient("L").resize((width, height))))
+
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, max(1, width // 12)):
+        draw.rectangle((i, height // 3, i + width // 30, height // 2), fill=(240, 40, 40))
+    return image
+
+
+def measure(image: Image.Image, output_format: str, quality: int | None, preset: str, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = encode(image, output_format, quality, preset)
+        best = min(best, time.perf_counter() - start)
+    return best, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=2.0)
+    parser.add_argument("--formats", default=",".join(available_formats()))
+    parser.add_argument("--quality", type=int, default=None, help="Default: each format's own")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    image = make_image(args.megapixels)
+    raw = image.width * image.height * 3
+    print(f"{image.width}x{image.height} RGB, {raw / 1e6:.1f} MB raw")
+    print(f"{'format':<6} {'preset':<9} {'ms':>9} {'KiB':>9} {'ratio':>7}")
+
+    for output_format in args.formats.split(","):
+        for preset in PRESETS:
+            seconds, size = measure(image, output_format, args.quality, preset, args.repeat)
+            print(f"{output_format:<6} {preset:<9} {seconds * 1000:9.1f} {size / 1024:9.1f} {raw / size:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
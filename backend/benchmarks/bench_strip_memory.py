@@ -0,0 +1,109 @@
+"""Peak memory of band-wise processing on a synthetic gigapixel image.
+
+Writes an uncompressed PPM band by band (never holding the full bitmap),
+then renders crop + sepia + thumbnail through the normal pipeline in a fresh
+process and reports wall time and peak RSS. --baseline also times a plain
+whole-bitmap decode of the same file, which needs width x height x 3 bytes.
+Run from the backend directory:
+
+    python -m benchmarks.bench_strip_memory --megapixels 1000
+    python -m benchmarks.bench_strip_memory --megapixels 200 --baseline
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+
+def make_ppm(path: str, width: int, height: int, band_rows: int = 256) -> None:
+    band = Image.merge("RGB", (
+        Image.linear_gradient("L").rotate(90).resize((width, band_rows)),
+        Image.effect_noise((width, band_rows), 32),
+        Image.radial_gradient("L").resize((width, band_rows)),
+    )).tobytes()
+
+    with open(path, "wb") as output:
+        output.write(f"P6 {width} {height} 255\n".encode())
+        for top in range(0, height, band_rows):
+            rows = min(band_rows, height - top)
+            output.write(band[:rows * width * 3])
+
+
+def strip_render(path: str, target: int, strip_bytes: int) -> tuple:
+    from app.services.image_transformer import configure_limits
+    from app.services.pipeline import render
+
+    configure_limits(4_000_000_000, 100_000_000, strip_bytes)
+    with Image.open(path) as image:
+        width, height = image.size
+    operations = [
+        {"action": "crop", "left": width // 10, "top": height // 10, "right": width - width // 10, "bottom": height - height // 10},
+        {"action": "sepia"},
+        {"action": "thumbnail", "width": target, "height": target},
+    ]
+    output = render(path, operations, "jpeg")
+    return len(output),
+
+
+def full_decode(path: str, target: int, strip_bytes: int) -> tuple:
+    Image.MAX_IMAGE_PIXELS = None
+    with Image.open(path) as image:
+        image.load()
+        return image.size,
+
+
+def run_case(func, args, queue) -> None:
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux
+    queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megapixels", type=float, default=1000)
+    parser.add_argument("--target", type=int, default=1024, help="Thumbnail box in pixels")
+    parser.add_argument("--strip-mb", type=int, default=32)
+    parser.add_argument("--baseline", action="store_true", help="Also decode the whole bitmap at once")
+    args = parser.parse_args()
+
+    width = int((args.megapixels * 1_000_000 * 2) ** 0.5)
+    height = int(args.megapixels * 1_000_000 / width)
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "source.ppm")
+        start = time.perf_counter()
+        # Build the source in a child too: Linux carries ru_maxrss across exec
+        maker = context.Process(target=make_ppm, args=(path, width, height))
+        maker.start()
+        maker.join()
+        print(f"source {width}x{height} ({width * height / 1e6:.0f} MP, "
+              f"{os.path.getsize(path) / 2**30:.2f} GiB) written in {time.perf_counter() - start:.1f}s")
+
+        cases = [("strips", strip_render)]
+        if args.baseline:
+            cases.append(("whole", full_decode))
+
+        print(f"{'mode':<8} {'seconds':>9} {'peak RSS MB':>12}")
+        for name, func in cases:
+            queue = context.Queue()
+            process = context.Process(
+                target=run_case, args=(func, (path, args.target, args.strip_mb * 2**20), queue)
+            )
+            process.start()
+            process.join()
+            if queue.empty():
+                print(f"{name:<8} {'failed':>9} (exit code {process.exitcode})")
+                continue
+            elapsed, peak, _ = queue.get()
+            print(f"{name:<8} {elapsed:>9.2f} {peak:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
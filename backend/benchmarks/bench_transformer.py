@@ -0,0 +1,195 @@
+"""Micro-benchmarks for every function in app.services.image_transformer.
+
+Each case runs against synthetic images of several sizes and modes. Like
+pytest-benchmark it warms up once, then reports the min and median of
+--rounds runs. The baseline check uses the min: interference from other
+processes only ever adds time, so it is the steadier of the two. Functions
+without a case are listed at the end so new ones do not go unmeasured. Run
+from the backend directory:
+
+    python -m benchmarks.bench_transformer --sizes 0.25,1,4 --modes RGB,RGBA,L
+    python -m benchmarks.bench_transformer --only sepia,resize --rounds 10
+    python -m benchmarks.bench_transformer --baseline          # exit 1 on regressions
+    python -m benchmarks.bench_transformer --save-baseline
+"""
+import argparse
+import inspect
+import os
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from app.services import image_transformer as transformer
+from benchmarks import baseline
+
+# Functions that only set state or are covered by another case
+NOT_BENCHMARKED = {
+    "configure_limits": "sets module globals",
+}
+
+
+def make_image(megapixels: float, mode: str) -> Image.Image:
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    image = Image.merge("RGB", (
+        Image.radial_gradient("L").resize((width, height)),
+        Image.effect_noise((width, height), 24),
+        Image.linear_gradient("L").resize((width, height)),
+    ))
+    if mode == "RGBA":
+        image.putalpha(Image.linear_gradient("L").rotate(90).resize((width, height)))
+    return image.convert(mode)
+
+
+class Fixture:
+    """One source image plus the encoded and raw files some cases read"""
+
+    def __init__(self, image: Image.Image, tmp: str):
+        self.image = image
+        self.tmp = tmp
+        # Lossy JPEG where the mode allows it, so load_image can use draft mode
+        self.encoded_format = "PNG" if image.mode == "RGBA" else "JPEG"
+        buffer = BytesIO()
+        image.save(buffer, self.encoded_format)
+        self.encoded = buffer.getvalue()
+        # Raw PPM/PGM is what transform_strips addresses band by band
+        self.raw_path = os.path.join(tmp, f"source-{image.mode}-{image.width}x{image.height}.pnm")
+        if image.mode in ("RGB", "L"):
+            image.save(self.raw_path)
+        else:
+            self.raw_path = None
+
+    def output(self, extension: str) -> str:
+        return os.path.join(self.tmp, f"out.{extension}")
+
+
+def decode(fixture, target=None):
+    with transformer.load_image(BytesIO(fixture.encoded), target) as image:
+        image.load()
+
+
+def strips(fixture):
+    # Small bands so even the smallest size is split several ways
+    transformer.configure_limits(transformer.MAX_IMAGE_PIXELS, transformer.MAX_DECODE_PIXELS, 256 * 1024)
+    width, height = fixture.image.size
+    transformer.transform_strips(
+        fixture.raw_path,
+        (width // 8, height // 8, width - width // 8, height - height // 8),
+        transformer.sepia_image,
+        (2, 2),
+    )
+
+
+def layout(fixture):
+    with Image.open(fixture.raw_path) as image:
+        transformer.raw_layout(image)
+
+
+def case_table():
+    """name -> (function under test, callable taking a Fixture, needs raw file)"""
+    return {
+        "load_image": ("load_image", lambda f: decode(f), False),
+        "load_image[draft]": ("load_image", lambda f: decode(f, (256, 256)), False),
+        "probe_size": ("probe_size", lambda f: transformer.probe_size(BytesIO(f.encoded)), False),
+        "save_image": ("save_image", lambda f: transformer.save_image(f.image, f.output("png")), False),
+        "resize_image": ("resize_image", lambda f: transformer.resize_image(f.image, f.image.width // 2, f.image.height // 2), False),
+        "thumbnail_image": ("thumbnail_image", lambda f: transformer.thumbnail_image(f.image, 256, 256), False),
+        "crop_image": ("crop_image", lambda f: transformer.crop_image(
+            f.image, f.image.width // 4, f.image.height // 4, f.image.width * 3 // 4, f.image.height * 3 // 4
+        ), False),
+        "rotate_image[90]": ("rotate_image", lambda f: transformer.rotate_image(f.image, 90), False),
+        "rotate_image[17]": ("rotate_image", lambda f: transformer.rotate_image(f.image, 17), False),
+        "grayscale_image": ("grayscale_image", lambda f: transformer.grayscale_image(f.image), False),
+        "sepia_image": ("sepia_image", lambda f: transformer.sepia_image(f.image), False),
+        "invert_image": ("invert_image", lambda f: transformer.invert_image(f.image), False),
+        "brightness_contrast_image": ("brightness_contrast_image", lambda f: transformer.brightness_contrast_image(f.image, 0.1, 1.2), False),
+        "channel_mix_image": ("channel_mix_image", lambda f: transformer.channel_mix_image(
+            f.image, (0, 0, 1), (0, 1, 0), (1, 0, 0)
+        ), False),
+        "flip_horizontal": ("flip_horizontal", lambda f: transformer.flip_horizontal(f.image), False),
+        "flip_vertical": ("flip_vertical", lambda f: transformer.flip_vertical(f.image), False),
+        "mirror_image": ("mirror_image", lambda f: transformer.mirror_image(f.image), False),
+        "convert_format[jpeg]": ("convert_format", lambda f: transformer.convert_format(f.image, "jpeg"), False),
+        "save_image_with_options[jpeg]": ("save_image_with_options", lambda f: transformer.save_image_with_options(
+            f.image, f.output("jpeg"), "jpeg"
+        ), False),
+        "save_image_with_options[webp]": ("save_image_with_options", lambda f: transformer.save_image_with_options(
+            f.image, f.output("webp"), "webp"
+        ), False),
+        "raw_layout": ("raw_layout", layout, True),
+        "needs_strips": ("needs_strips", lambda f: transformer.needs_strips(f.image), False),
+        "strip_reduce_factor": ("strip_reduce_factor", lambda f: transformer.strip_reduce_factor(f.image.size, (256, 256)), False),
+        "transform_strips": ("transform_strips", strips, True),
+    }
+
+
+def measure(func, fixture, rounds: int):
+    limits = (transformer.MAX_IMAGE_PIXELS, transformer.MAX_DECODE_PIXELS, transformer.STRIP_BYTES)
+    try:
+        func(fixture)
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func(fixture)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        transformer.configure_limits(*limits)
+    return min(samples), statistics.median(samples)
+
+
+def uncovered(cases) -> list:
+    covered = {function for function, _, _ in cases.values()} | set(NOT_BENCHMARKED)
+    return sorted(
+        name for name, member in inspect.getmembers(transformer, inspect.isfunction)
+        if member.__module__ == transformer.__name__ and not name.startswith("_") and name not in covered
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="0.25,1,4", help="Comma separated megapixel sizes")
+    parser.add_argument("--modes", default="RGB,RGBA,L")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--only", help="Comma separated substrings of case names")
+    baseline.add_arguments(parser, "bench_transformer", tolerance=0.3)
+    args = parser.parse_args()
+
+    cases = case_table()
+    if args.only:
+        wanted = args.only.split(",")
+        cases = {name: case for name, case in cases.items() if any(w in name for w in wanted)}
+
+    metrics = {}
+    runs = {}
+    print(f"{'case':<32} {'mode':<5} {'MP':>5} {'min ms':>9} {'median ms':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (float(s) for s in args.sizes.split(",")):
+            for mode in args.modes.split(","):
+                fixture = Fixture(make_image(size, mode), tmp)
+                for name, (_, func, needs_raw) in cases.items():
+                    if needs_raw and fixture.raw_path is None:
+                        continue
+                    try:
+                        best, median = measure(func, fixture, args.rounds)
+                    except Exception as e:
+                        print(f"{name:<32} {mode:<5} {size:>5g} failed: {e}")
+                        continue
+                    print(f"{name:<32} {mode:<5} {size:>5g} {best:9.2f} {median:10.2f}")
+                    metric = f"{name}.{mode}.{size:g}mp_ms"
+                    metrics[metric] = round(best, 3)
+                    runs[metric] = (func, fixture)
+
+        missing = uncovered(case_table())
+        if missing:
+            print(f"not benchmarked: {', '.join(missing)}")
+
+        # Fixtures stay on disk until here so flagged cases can run again
+        baseline.finish(metrics, args, lambda metric: round(measure(*runs[metric], args.rounds)[0], 3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Throughput and latency of the main image endpoints, in-process.
+
+Drives the ASGI app through httpx against a throwaway SQLite database and
+LocalStorage: uploads of distinct images, transforms that miss the cache,
+transforms that hit it, the image list and original downloads. Each
+scenario runs --requests calls from --concurrency clients and reports req/s
+and p50/p95/p99. Rate limits are switched off, since the point is to load
+the handlers, not the limiter. ASGITransport returns once the app call
+ends, so upload latency includes the perceptual-hash background task. Run
+from the backend directory:
+
+    python -m benchmarks.load_api --requests 200 --concurrency 10
+    python -m benchmarks.load_api --scenarios list,get --requests 1000
+    python -m benchmarks.load_api --baseline          # exit 1 on regressions
+    python -m benchmarks.load_api --save-baseline
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from benchmarks import baseline
+from benchmarks.load_register_storm import percentile
+
+SCENARIOS = ("upload", "transform", "transform_cached", "list", "get")
+
+
+def make_jpeg(megapixels: float, seed: int) -> bytes:
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    image = Image.merge("RGB", (
+        Image.radial_gradient("L").resize((width, height)),
+        # effect_noise differs per call, so no two uploads share a content hash
+        Image.effect_noise((width, height), 16 + seed % 16),
+        Image.linear_gradient("L").resize((width, height)),
+    ))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def request_for(scenario: str, i: int, image_ids, payloads):
+    """(method, url, keyword arguments) of the i-th request of a scenario"""
+    image_id = image_ids[i % len(image_ids)]
+    if scenario == "upload":
+        return "POST", "/images/upload", {"files": {"file": (f"{i}.jpg", payloads[i % len(payloads)], "image/jpeg")}}
+    if scenario == "transform":
+        # A fresh width every call so each one renders
+        return "POST", f"/images/transform?image_id={image_id}&action=resize&width={64 + i}&height=48", {}
+    if scenario == "transform_cached":
+        return "POST", f"/images/transform?image_id={image_id}&action=sepia", {}
+    if scenario == "list":
+        return "GET", "/images?size=20", {}
+    return "GET", f"/images/{image_id}", {}
+
+
+async def run_scenario(client, scenario, args, headers, image_ids, payloads):
+    latencies = []
+    errors = 0
+    counter = iter(range(args.requests))
+
+    async def client_loop():
+        nonlocal errors
+        for i in counter:
+            method, url, kwargs = request_for(scenario, i, image_ids, payloads)
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+                if errors == 1:
+                    print(f"  first error: {response.status_code} {response.text[:200]}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args):
+    import httpx
+
+    from app.db import async_engine, engine
+    from app.migrations import migrate
+    from app.main import app
+    from app.services.executor import get_executor
+
+    # httpx ends multipart bodies with a CRLF the parser warns about on every upload
+    logging.getLogger("python_multipart").setLevel(logging.ERROR)
+    migrate(engine)
+    transport = httpx.ASGITransport(app=app)
+    payloads = [make_jpeg(args.megapixels, seed) for seed in range(min(args.requests, 50))]
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.post("/register", json={"email": "load@bench.dev", "password": "benchmark"})
+        token = (await client.post(
+            "/login", data={"username": "load@bench.dev", "password": "benchmark"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # Images for the read and transform scenarios
+        image_ids = []
+        for seed in range(args.seed_images):
+            response = await client.post(
+                "/images/upload", headers=headers,
+                files={"file": (f"seed{seed}.jpg", make_jpeg(args.megapixels, seed), "image/jpeg")}
+            )
+            image_ids.append(response.json()["id"])
+            if "transform_cached" in args.scenarios:
+                # Render once so the scenario measures cache hits only
+                await client.post(f"/images/transform?image_id={image_ids[-1]}&action=sepia", headers=headers)
+
+        metrics = {}
+        print(f"{'scenario':<17} {'requests':>8} {'errors':>6} {'req/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for scenario in args.scenarios:
+            latencies, errors, elapsed = await run_scenario(
+                client, scenario, args, headers, image_ids, payloads
+            )
+            rps = len(latencies) / elapsed
+            p50, p95, p99 = statistics.median(latencies), percentile(latencies, 95), percentile(latencies, 99)
+            print(f"{scenario:<17} {len(latencies):>8} {errors:>6} {rps:>8.1f} "
+                  f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+            # p99 of a few hundred requests rests on a couple of samples, too
+            # noisy to gate on, so it is printed but not compared
+            metrics.update({
+                f"{scenario}_rps": round(rps, 2),
+                f"{scenario}_p50_ms": round(p50, 2),
+                f"{scenario}_p95_ms": round(p95, 2),
+            })
+
+    get_executor().shutdown()
+    await async_engine.dispose()
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--megapixels", type=float, default=0.5, help="Size of uploaded images")
+    parser.add_argument("--seed-images", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2, help="Transform worker processes")
+    baseline.add_arguments(parser, "load_api", tolerance=0.5)
+    args = parser.parse_args()
+    args.scenarios = args.scenarios.split(",")
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    tmp = tempfile.mkdtemp()
+    # Settings are read at import time, so configure before importing the app
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ["UPLOAD_DIR"] = os.path.join(tmp, "uploads")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["RENDITIONS"] = ""
+    os.environ["BCRYPT_ROUNDS"] = "4"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["TRANSFORM_WORKERS"] = str(args.workers)
+    # Every client may have a transform queued without being turned away
+    os.environ["TRANSFORM_QUEUE_DEPTH"] = str(args.concurrency)
+    sys.path.insert(0, os.getcwd())
+
+    print(f"sqlite + local storage, {args.concurrency} clients, {args.megapixels:g} MP JPEGs, "
+          f"{args.workers} transform workers")
+    metrics = asyncio.run(run(args))
+    baseline.finish(metrics, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Latency of /health while a burst of /register calls hashes passwords.
+
+Drives the ASGI app in-process against a throwaway SQLite database. With
+--inline the bcrypt work runs on the event loop, as it did before hashing
+moved to a thread pool, for comparison. Run from the backend directory:
+
+    python -m benchmarks.load_register_storm --signups 50
+    python -m benchmarks.load_register_storm --signups 50 --inline
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    import httpx
+
+    import app.main as main
+    from app.db import engine
+    from app.migrations import migrate
+    from app.security import hash_password
+
+    if args.inline:
+        async def inline_hash(password):
+            return hash_password(password)
+        main.hash_password_async = inline_hash
+
+    migrate(engine)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+        storm_running = True
+
+        async def probe():
+            while storm_running:
+                start = time.perf_counter()
+                await client.get("/health")
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(args.probe_interval)
+
+        # Bound in-flight signups so the burst measures hashing, not pool waits
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def signup(i):
+            async with slots:
+                await client.post("/register", json={"email": f"user{i}@bench.dev", "password": "benchmark"})
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(signup(i) for i in range(args.signups)))
+        elapsed = time.perf_counter() - start
+        storm_running = False
+        await prober
+
+    mode = "inline" if args.inline else "thread pool"
+    print(f"{args.signups} signups x{args.concurrency} ({mode}, rounds={os.environ['BCRYPT_ROUNDS']}) in {elapsed:.2f}s")
+    print(f"/health samples={len(latencies)} "
+          f"p50={statistics.median(latencies):.1f}ms "
+          f"p99={percentile(latencies, 99):.1f}ms "
+          f"max={max(latencies):.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--signups", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--inline", action="store_true", help="Hash on the event loop")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    # Settings are read at import time, so configure before importing the app
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ["UPLOAD_DIR"] = os.path.join(tmp, "uploads")
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    sys.path.insert(0, os.getcwd())
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings are read when app.config is imported, so the test environment
+# has to be in place before any test module imports the app
+_tmp = tempfile.mkdtemp(prefix="image-service-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp}/test.db",
+    "UPLOAD_DIR": os.path.join(_tmp, "uploads"),
+    "STORAGE_BACKEND": "local",
+    "SECRET_KEY": "test-secret",
+    "RENDITIONS": "",
+    "BCRYPT_ROUNDS": "4",
+    "RATE_LIMIT_ENABLED": "false",
+    "TRANSFORM_WORKERS": "1",
+})
+
+
+# S3 rejects multipart parts under 5 MiB except the last one
+S3_PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    """S3Storage against an in-process moto S3 with an empty bucket"""
+    from moto import mock_aws
+
+    from app.config import settings
+    from app.storage.cloud import S3Storage
+
+    monkeypatch.setattr(settings, "S3_BUCKET_NAME", "images-test")
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY", "testing")
+    monkeypatch.setattr(settings, "S3_SECRET_KEY", "testing")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", None)
+    monkeypatch.setattr(settings, "S3_MULTIPART_PART_SIZE", S3_PART_SIZE)
+
+    with mock_aws():
+        backend = S3Storage()
+        backend.client.create_bucket(Bucket="images-test")
+        yield backend
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def register(client, email: str) -> dict:
+    """Sign up and log in a user, returning its Authorization header"""
+    client.post("/register", json={"email": email, "password": "secret1"})
+    response = client.post("/login", data={"username": email, "password": "secret1"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    return register(client, "tests@example.com")
+
+
+def png_bytes(size=(64, 48), color=(200, 100, 50), format="PNG") -> bytes:
+    from io import BytesIO
+
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, format)
+    return buffer.getvalue()
@@ -0,0 +1,38 @@
+from app import main
+from app.db import SessionLocal
+from app.models import User
+
+
+def test_duplicate_email_is_rejected_before_hashing(client, monkeypatch):
+    assert client.post("/register", json={"email": "twice@example.com", "password": "secret1"}).status_code == 201
+
+    hashed = []
+    hash_password_async = main.hash_password_async
+
+    async def counting_hash(password):
+        hashed.append(password)
+        return await hash_password_async(password)
+
+    monkeypatch.setattr(main, "hash_password_async", counting_hash)
+    response = client.post("/register", json={"email": "twice@example.com", "password": "secret1"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+    assert hashed == []
+
+
+def test_registration_race_is_settled_by_the_unique_email(client, monkeypatch):
+    hash_password_async = main.hash_password_async
+
+    async def hash_while_someone_else_registers(password):
+        # The competing request commits between our check and our insert
+        with SessionLocal() as db:
+            db.add(User(email="race@example.com", hashed_password="x"))
+            db.commit()
+        return await hash_password_async(password)
+
+    monkeypatch.setattr(main, "hash_password_async", hash_while_someone_else_registers)
+    response = client.post("/register", json={"email": "race@example.com", "password": "secret1"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
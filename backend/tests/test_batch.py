@@ -0,0 +1,54 @@
+import json
+
+from sqlalchemy import select
+
+from app import main
+from app.db import SessionLocal
+from app.models import ImageTransformation
+from tests.conftest import png_bytes, register
+from tests.test_uploads import upload
+
+
+def batch(client, headers, image_ids, operations) -> list:
+    response = client.post("/images/transform/batch", headers=headers, json={
+        "image_ids": image_ids, "operations": operations, "output_format": "png"
+    })
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_unexpected_error_fails_one_image_and_the_rest_are_recorded(client, monkeypatch):
+    headers = register(client, "batcher@example.com")
+    good, bad = (upload(client, headers, png_bytes(color=(i, 40, 40)))["id"] for i in (1, 2))
+
+    run_with_source = main.run_with_source
+
+    async def failing_for_bad(run, storage, file_path, key, func, *args):
+        if key is not None and key[0] == bad:
+            raise RuntimeError("boom")
+        return await run_with_source(run, storage, file_path, key, func, *args)
+
+    monkeypatch.setattr(main, "run_with_source", failing_for_bad)
+    lines = batch(client, headers, [good, bad], [{"action": "sepia"}])
+
+    by_image = {line["image_id"]: line for line in lines if "image_id" in line}
+    assert by_image[bad]["status"] == "error"
+    assert by_image[good]["status"] == "created"
+    assert lines[-1] == {"done": True, "created": 1, "cached": 0, "failed": 1}
+
+    with SessionLocal() as db:
+        row = db.get(ImageTransformation, by_image[good]["transformation_id"])
+        assert row.image_id == good
+        assert db.scalars(select(ImageTransformation).where(ImageTransformation.image_id == bad)).all() == []
+
+
+def test_repeated_batch_is_served_from_the_cache(client):
+    headers = register(client, "rebatcher@example.com")
+    image_id = upload(client, headers, png_bytes(color=(3, 40, 40)))["id"]
+
+    first = batch(client, headers, [image_id], [{"action": "invert"}])
+    second = batch(client, headers, [image_id], [{"action": "invert"}])
+
+    assert first[0]["status"] == "created"
+    assert second[0]["status"] == "cached"
+    assert second[0]["transformation_id"] == first[0]["transformation_id"]
@@ -0,0 +1,55 @@
+import pytest
+from PIL import Image, ImageChops
+
+from app.services.image_transformer import (
+    brightness_contrast_image,
+    channel_mix_image,
+    grayscale_image,
+    invert_image,
+    sepia_image
+)
+
+FILTERS = {
+    "grayscale": grayscale_image,
+    "sepia": sepia_image,
+    "invert": invert_image,
+    "brightness_contrast": lambda image: brightness_contrast_image(image, 10, 1.2),
+    "channel_mix": lambda image: channel_mix_image(image, (0, 1, 0), (1, 0, 0), (0, 0, 1)),
+}
+
+
+def half_transparent(mode: str) -> Image.Image:
+    image = Image.linear_gradient("L").resize((64, 32)).convert("RGB")
+    alpha = Image.new("L", image.size, 255)
+    alpha.paste(0, (0, 0, 32, 32))
+    image.putalpha(alpha)
+    if mode == "P":
+        image = image.convert("P", palette=Image.Palette.ADAPTIVE, colors=255)
+        image.info["transparency"] = image.getpixel((0, 0))
+        return image
+    return image.convert(mode)
+
+
+@pytest.mark.parametrize("name", FILTERS)
+@pytest.mark.parametrize("mode", ["RGBA", "LA", "P"])
+def test_matrix_filters_keep_alpha(name, mode):
+    source = half_transparent(mode)
+    result = FILTERS[name](source)
+
+    assert result.mode == "RGBA"
+    assert result.getpixel((0, 0))[3] == 0
+    assert result.getpixel((63, 0))[3] == 255
+
+
+@pytest.mark.parametrize("name", FILTERS)
+def test_matrix_filters_leave_opaque_images_rgb(name):
+    assert FILTERS[name](Image.new("RGB", (8, 8), (10, 200, 30))).mode == "RGB"
+
+
+def test_grayscale_matches_pillow_luma():
+    source = Image.radial_gradient("L").resize((64, 64)).convert("RGB")
+    source = Image.merge("RGB", (source.getchannel(0), source.getchannel(1).rotate(90), source.getchannel(2)))
+    result = grayscale_image(source)
+
+    difference = ImageChops.difference(result.getchannel("R"), source.convert("L"))
+    assert difference.getextrema()[1] <= 1
@@ -0,0 +1,59 @@
+import asyncio
+
+from app.storage.factory import get_storage
+from app.services.decode_cache import run_with_source
+from app.services.pipeline import render
+from tests.conftest import png_bytes
+from tests.test_uploads import upload
+
+
+class CountingStorage:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.reads = 0
+
+    async def read_source(self, file_path: str) -> bytes:
+        self.reads += 1
+        return self.data
+
+
+async def run_here(func, *args):
+    return func(*args)
+
+
+def test_source_is_only_read_on_a_decode_cache_miss():
+    storage = CountingStorage(png_bytes(color=(10, 20, 30)))
+    key = ("test", "source-read-once")
+
+    async def scenario():
+        for action in ("grayscale", "invert", "mirror"):
+            output = await run_with_source(
+                run_here, storage, "unused", key, render, [{"action": action}], "png", None, None
+            )
+            assert output.startswith(b"\x89PNG")
+
+    asyncio.run(scenario())
+    assert storage.reads == 1
+
+
+def test_repeat_transforms_skip_the_storage_read(client, auth_headers, monkeypatch):
+    image = upload(client, auth_headers, png_bytes(color=(40, 50, 60)))
+    storage = get_storage()
+    reads = []
+    read_source = storage.read_source
+
+    async def counting_read_source(file_path):
+        reads.append(file_path)
+        return await read_source(file_path)
+
+    monkeypatch.setattr(storage, "read_source", counting_read_source)
+    for action in ("grayscale", "invert"):
+        response = client.post(
+            "/images/transform",
+            headers=auth_headers,
+            params={"image_id": image["id"], "action": action, "output_format": "png"},
+        )
+        assert response.status_code == 200, response.text
+
+    # The test pool has one worker, so the second transform finds its decode
+    assert len(reads) == 1
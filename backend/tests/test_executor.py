@@ -0,0 +1,26 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services.executor import TransformExecutor, WorkerCrashed
+
+
+def crash() -> None:
+    os._exit(1)
+
+
+def test_executor_recovers_from_a_crashed_worker():
+    executor = TransformExecutor(workers=1, queue_depth=1, timeout=30)
+
+    async def scenario():
+        with pytest.raises(WorkerCrashed):
+            await executor.run(crash)
+        # The broken pool has been replaced and takes new work
+        assert await executor.run(abs, -3) == 3
+
+    try:
+        asyncio.run(scenario())
+        assert executor.in_flight == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,59 @@
+import json
+import zipfile
+from io import BytesIO
+
+from tests.conftest import png_bytes, register
+from tests.test_uploads import upload
+
+
+def pipeline(client, headers, image_id: int) -> int:
+    response = client.post("/images/pipeline", headers=headers, json={
+        "image_id": image_id, "operations": [{"action": "grayscale"}], "output_format": "png"
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["transformation_id"]
+
+
+def export(client, headers, **params) -> zipfile.ZipFile:
+    response = client.get("/images/export", headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(BytesIO(response.content))
+    assert archive.testzip() is None
+    return archive
+
+
+def test_export_contains_only_the_users_images(client):
+    owner = register(client, "export-owner@example.com")
+    other = register(client, "export-other@example.com")
+    first_data = png_bytes(color=(31, 32, 33))
+    first = upload(client, owner, first_data, "first.png")
+    second = upload(client, owner, png_bytes(color=(34, 35, 36)), "../../second.png")
+    foreign = upload(client, other, png_bytes(color=(37, 38, 39)), "foreign.png")
+    transformation_id = pipeline(client, owner, first["id"])
+    foreign_transformation_id = pipeline(client, other, foreign["id"])
+
+    archive = export(client, owner, all_transformations=True)
+    manifest = json.loads(archive.read("manifest.json"))
+
+    assert manifest["missing"] == []
+    assert sorted(archive.namelist()) == sorted([entry["path"] for entry in manifest["files"]] + ["manifest.json"])
+    assert {entry["image_id"] for entry in manifest["files"]} == {first["id"], second["id"]}
+    assert [entry["transformation_id"] for entry in manifest["files"] if entry["transformation_id"]] == [
+        transformation_id
+    ]
+    assert archive.read(f"originals/{first['id']}-first.png") == first_data
+    # Client filenames cannot place members outside the archive folder
+    assert f"originals/{second['id']}-second.png" in archive.namelist()
+
+    # Asking for another user's ids by hand selects nothing of theirs
+    archive = export(
+        client, owner, image_id=[first["id"], foreign["id"]],
+        transformation_id=[transformation_id, foreign_transformation_id]
+    )
+    manifest = json.loads(archive.read("manifest.json"))
+    assert {entry["image_id"] for entry in manifest["files"]} == {first["id"]}
+    assert {entry["transformation_id"] for entry in manifest["files"]} == {None, transformation_id}
+
+    response = client.get("/images/export", headers=owner, params={"image_id": foreign["id"]})
+    assert response.status_code == 404
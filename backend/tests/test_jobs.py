@@ -0,0 +1,147 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import TransformJob
+from app import worker
+from app.services.jobs import claim_next_job, mark_succeeded, renew_lease, requeue_stale_jobs
+from tests.conftest import png_bytes
+from tests.test_uploads import upload
+
+
+@pytest.fixture
+def db(client):
+    session = SessionLocal()
+    session.query(TransformJob).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_job(db, **fields) -> TransformJob:
+    values = {"user_id": 1, "image_id": 1, "status": "queued", "payload": "{}", "max_attempts": 3}
+    values.update(fields)
+    job = TransformJob(**values)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def stale_since() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.JOB_LEASE_SECONDS + 60)
+
+
+def test_stale_job_with_attempts_left_is_requeued(db):
+    job = add_job(db, status="running", worker_id="lost", attempts=1, started_at=stale_since())
+
+    assert requeue_stale_jobs(db) == 1
+    db.refresh(job)
+    assert job.status == "queued"
+    assert job.worker_id is None
+
+
+def test_stale_job_out_of_attempts_is_dead_lettered(db):
+    job = add_job(db, status="running", worker_id="lost", attempts=3, started_at=stale_since())
+
+    assert requeue_stale_jobs(db) == 0
+    db.refresh(job)
+    assert job.status == "dead"
+    assert job.finished_at is not None
+    assert job.error
+
+
+def test_claim_skips_jobs_out_of_attempts(db):
+    add_job(db, attempts=3)
+    assert claim_next_job(db, "worker") is None
+
+    runnable = add_job(db, attempts=2)
+    claimed = claim_next_job(db, "worker")
+    assert claimed.id == runnable.id
+    assert claimed.attempts == 3
+    assert claimed.heartbeat_at is not None
+
+
+def test_renewed_lease_is_not_requeued(db):
+    job = add_job(db, status="running", worker_id="alive", attempts=1, started_at=stale_since())
+
+    assert renew_lease(job.id, "alive")
+    assert not renew_lease(job.id, "someone-else")
+    assert requeue_stale_jobs(db) == 0
+    db.refresh(job)
+    assert job.status == "running"
+
+
+def test_long_poll_sees_a_job_finish_while_waiting(client, auth_headers, db, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL_SECONDS", 0.05)
+    image = upload(client, auth_headers, png_bytes(color=(9, 9, 9)))
+    response = client.post("/jobs", headers=auth_headers, json={
+        "image_id": image["id"], "operations": [{"action": "grayscale"}], "output_format": "png"
+    })
+    job_id = response.json()["job_id"]
+
+    response = client.get(f"/jobs/{job_id}?wait=0.2", headers=auth_headers)
+    assert response.json()["status"] == "queued"
+
+    def finish():
+        with SessionLocal() as session:
+            session.query(TransformJob).filter(TransformJob.id == job_id).update({"status": "dead"})
+            session.commit()
+
+    timer = threading.Timer(0.2, finish)
+    timer.start()
+    response = client.get(f"/jobs/{job_id}?wait=5", headers=auth_headers)
+    timer.join()
+    assert response.json()["status"] == "dead"
+
+
+def test_job_deleted_while_running_does_not_stop_the_worker(db, monkeypatch):
+    job_id = add_job(db).id
+
+    async def delete_then_succeed(session, claimed):
+        with SessionLocal() as other:
+            other.query(TransformJob).filter(TransformJob.id == claimed.id).delete()
+            other.commit()
+        return 1
+
+    monkeypatch.setattr(worker, "execute_job", delete_then_succeed)
+    assert asyncio.run(worker.run_next_job(db, "worker")) is True
+    db.expire_all()
+    assert db.get(TransformJob, job_id) is None
+
+
+def test_reclaimed_job_keeps_the_new_owners_status(db):
+    job = add_job(db, status="running", worker_id="new-owner", attempts=2, started_at=datetime.utcnow())
+
+    assert not mark_succeeded(db, job.id, "old-owner", 1)
+    db.refresh(job)
+    assert job.status == "running"
+    assert job.worker_id == "new-owner"
+
+
+def test_permanent_error_is_dead_lettered_at_once(db):
+    # The job's image does not exist, which no retry can fix
+    payload = '{"operations": [{"action": "grayscale"}], "output_format": "png", "quality": 85}'
+    job = add_job(db, image_id=999999, payload=payload, max_attempts=3)
+
+    assert asyncio.run(worker.run_next_job(db, "worker")) is True
+    db.refresh(job)
+    assert job.status == "dead"
+    assert job.attempts == 1
+    assert job.error == "Image not found"
+
+
+def test_transient_error_is_retried(db, monkeypatch):
+    job = add_job(db, max_attempts=3)
+
+    async def storage_down(session, claimed):
+        raise ConnectionError("storage unavailable")
+
+    monkeypatch.setattr(worker, "execute_job", storage_down)
+    asyncio.run(worker.run_next_job(db, "worker"))
+    db.refresh(job)
+    assert job.status == "queued"
+    assert job.worker_id is None
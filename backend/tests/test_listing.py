@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app.db import SessionLocal, engine
+from app.models import Image
+from tests.conftest import png_bytes, register
+from tests.test_uploads import upload
+
+
+def test_cursor_pages_cover_every_image_once(client):
+    headers = register(client, "lister@example.com")
+    ids = [upload(client, headers, png_bytes(color=(i, 0, 0)))["id"] for i in range(5)]
+
+    seen = []
+    response = client.get("/images", headers=headers, params={"size": 2}).json()
+    assert response["total"] is None and response["page"] == 1
+    while True:
+        seen += [item["id"] for item in response["items"]]
+        if not response["next_cursor"]:
+            break
+        response = client.get(
+            "/images", headers=headers, params={"size": 2, "cursor": response["next_cursor"]}
+        ).json()
+        assert response["page"] is None
+
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_deprecated_page_numbers_still_work(client):
+    headers = register(client, "pager@example.com")
+    ids = [upload(client, headers, png_bytes(color=(0, i, 0)))["id"] for i in range(3)]
+
+    response = client.get("/images", headers=headers, params={"size": 2, "page": 2}).json()
+    assert response["page"] == 2
+    assert response["total"] == 3
+    assert [item["id"] for item in response["items"]] == [min(ids)]
+
+    assert client.get("/images", headers=headers, params={"page": 0}).status_code == 400
+
+
+def test_images_sharing_a_timestamp_page_by_id(client):
+    headers = register(client, "sametime@example.com")
+    ids = [upload(client, headers, png_bytes(color=(0, 0, i)))["id"] for i in range(3)]
+    with SessionLocal() as db:
+        db.execute(update(Image).where(Image.id.in_(ids)).values(created_at=datetime(1970, 1, 1)))
+        db.commit()
+
+    first = client.get("/images", headers=headers, params={"size": 2}).json()
+    rest = client.get("/images", headers=headers, params={"size": 2, "cursor": first["next_cursor"]}).json()
+    assert [item["id"] for item in first["items"] + rest["items"]] == sorted(ids, reverse=True)
+
+
+def test_total_is_only_counted_on_request(client):
+    headers = register(client, "counter@example.com")
+    for i in range(2):
+        upload(client, headers, png_bytes(color=(i, i, 0)))
+
+    response = client.get("/images", headers=headers, params={"size": 1, "with_total": True}).json()
+    assert response["total"] == 2
+    assert len(response["items"]) == 1
+
+
+def test_transformation_counts_use_the_image_index(client):
+    with engine.connect() as connection:
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT image_id, count(id) FROM image_transformations "
+            "WHERE image_id IN (1, 2, 3) GROUP BY image_id"
+        ).all()
+    assert "ix_image_transformations_image_id" in " ".join(row[-1] for row in plan)
+
+
+def test_listing_reports_transformation_counts(client):
+    headers = register(client, "counted@example.com")
+    image = upload(client, headers, png_bytes(color=(5, 6, 7)))
+    for action in ("grayscale", "invert"):
+        client.post(
+            "/images/transform", headers=headers,
+            params={"image_id": image["id"], "action": action, "output_format": "png"},
+        )
+
+    [item] = client.get("/images", headers=headers).json()["items"]
+    assert item["transformation_count"] == 2
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table, create_engine, inspect, select
+from sqlalchemy.orm import Session
+
+from app.db import Base
+from app.migrations import alembic_config, migrate
+from app.models import Image, ImageTransformation
+
+
+def baseline_metadata() -> MetaData:
+    """The tables as create_all built them before migrations existed"""
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email", String, unique=True, index=True, nullable=False),
+        Column("hashed_password", String, nullable=False),
+    )
+    Table(
+        "images", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("filename", String, nullable=False),
+        Column("file_path", String, nullable=False),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "image_transformations", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("image_id", Integer, ForeignKey("images.id"), nullable=False),
+        Column("action", String, nullable=False),
+        Column("params", String, nullable=False),
+        Column("output_file_path", String, nullable=False),
+        Column("created_at", DateTime),
+    )
+    return metadata
+
+
+def schema_diff(engine) -> list:
+    with engine.connect() as connection:
+        return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+
+def test_revisions_build_the_model_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/revisions.db")
+    with engine.begin() as connection:
+        command.upgrade(alembic_config(connection), "head")
+
+    assert schema_diff(engine) == []
+
+
+def test_empty_database_is_created_and_stamped(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/empty.db")
+    migrate(engine)
+
+    assert schema_diff(engine) == []
+    with engine.connect() as connection:
+        assert MigrationContext.configure(connection).get_current_revision() is not None
+
+
+def test_baseline_database_is_upgraded_in_place(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/baseline.db")
+    baseline = baseline_metadata()
+    baseline.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(baseline.tables["users"].insert().values(id=1, email="old@example.com", hashed_password="x"))
+        connection.execute(baseline.tables["images"].insert().values(
+            id=1, filename="old.png", file_path="uploads/old.png", user_id=1, created_at=datetime(2024, 1, 1)
+        ))
+
+    migrate(engine)
+    assert schema_diff(engine) == []
+
+    # What the upload and transform paths write and query
+    with Session(engine) as db:
+        db.add(Image(filename="new.png", file_path="uploads/new.png", user_id=1, size_bytes=10, content_hash="abc"))
+        db.add(ImageTransformation(image_id=1, action="sepia", params="{}", output_file_path="out.png", cache_key="k"))
+        db.commit()
+        assert db.scalar(select(ImageTransformation.id).where(ImageTransformation.cache_key == "k")) is not None
+        assert db.get(Image, 1).filename == "old.png"
+
+    # Running again is a no-op
+    migrate(engine)
+    assert "alembic_version" in inspect(engine).get_table_names()
+
+
+def test_duplicate_cache_keys_are_cleared_before_the_unique_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/duplicates.db")
+    with engine.begin() as connection:
+        command.upgrade(alembic_config(connection), "0009")
+        for transformation_id in (1, 2, 3):
+            connection.exec_driver_sql(
+                "INSERT INTO image_transformations (id, image_id, action, params, output_file_path, cache_key) "
+                f"VALUES ({transformation_id}, 1, 'sepia', '{{}}', 'out{transformation_id}.png', 'same')"
+            )
+        command.upgrade(alembic_config(connection), "head")
+
+    with Session(engine) as db:
+        keys = dict(db.execute(select(ImageTransformation.id, ImageTransformation.cache_key)).all())
+    assert keys == {1: "same", 2: None, 3: None}
+
+
+def test_missing_image_timestamps_are_backfilled(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/timestamps.db")
+    baseline = baseline_metadata()
+    baseline.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(baseline.tables["images"].insert().values(
+            id=1, filename="old.png", file_path="uploads/old.png", user_id=1, created_at=None
+        ))
+
+    migrate(engine)
+    with Session(engine) as db:
+        assert db.get(Image, 1).created_at == datetime(1970, 1, 1)
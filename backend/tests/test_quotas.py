@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.ratelimit.factory import get_rate_limit_backend
+from app.ratelimit.memory import MemoryRateLimitBackend
+from app.ratelimit.redis_backend import RedisRateLimitBackend
+from app.ratelimit.sql import SQLRateLimitBackend
+from tests.conftest import png_bytes, register
+from tests.test_uploads import upload
+
+
+@pytest.fixture(params=["memory", "sql", "redis"])
+def backend(request, client):
+    if request.param == "memory":
+        return MemoryRateLimitBackend()
+    if request.param == "sql":
+        return SQLRateLimitBackend()
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RedisRateLimitBackend(client=fakeredis.FakeAsyncRedis())
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity(backend, request):
+    key = f"refill:{request.node.callspec.id}"
+
+    async def take(cost, now):
+        # 10 tokens, one per second
+        return await backend.take(key, cost, 10, 1.0, now)
+
+    async def scenario():
+        assert await take(10, 1000.0) == 0.0  # a new bucket starts full
+        assert await take(1, 1000.0) == pytest.approx(1.0)
+        assert await take(1, 1000.5) == pytest.approx(0.5)
+        assert await take(1, 1001.0) == 0.0
+        # An hour idle still only refills to capacity
+        assert await take(11, 5000.0) == pytest.approx(1.0)
+        assert await take(10, 5000.0) == 0.0
+
+    # One event loop: async sessions and Redis clients are bound to it
+    asyncio.run(scenario())
+
+
+def test_leases_limit_concurrency_until_released_or_expired(backend, request):
+    key = f"leases:{request.node.callspec.id}"
+
+    async def acquire(lease, now):
+        return await backend.acquire(key, lease, 2, now + 10, now)
+
+    async def scenario():
+        assert await acquire("a", 100.0)
+        assert await acquire("b", 100.0)
+        assert not await acquire("c", 100.0)
+        await backend.release(key, "a")
+        assert await acquire("c", 100.0)
+        assert not await acquire("d", 100.0)
+        # b and c expired at 110
+        assert await acquire("d", 111.0)
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def rate_limits(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 2.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_MINUTE", 30.0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_MIN_COST", 1.0)
+    get_rate_limit_backend.cache_clear()
+    yield
+    get_rate_limit_backend.cache_clear()
+
+
+def test_over_the_rate_gets_429_with_retry_after(client, rate_limits):
+    headers = register(client, "rate-limited@example.com")
+    image = upload(client, headers, png_bytes(color=(21, 22, 23)))
+    params = {"image_id": image["id"], "action": "grayscale", "output_format": "png"}
+
+    # A render of a small image costs only the minimum, so the burst covers two
+    for _ in range(2):
+        assert client.post("/images/transform", headers=headers, params=params).status_code == 200
+
+    response = client.post("/images/transform", headers=headers, params=params)
+    assert response.status_code == 429
+    # Half a token per second: the next one is about two seconds away
+    assert response.headers["Retry-After"] == "2"
+    assert response.json()["detail"] == "Rate limit exceeded. Try again later."
+
+    # Another user's bucket is untouched
+    other = register(client, "rate-other@example.com")
+    other_image = upload(client, other, png_bytes(color=(24, 25, 26)))
+    response = client.post(
+        "/images/transform", headers=other, params={**params, "image_id": other_image["id"]}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import os
+from io import BytesIO
+
+import pytest
+from botocore.awsrequest import AWSResponse
+from fastapi import UploadFile
+
+from app.storage.cloud import S3Storage
+from tests.conftest import S3_PART_SIZE as PART_SIZE
+
+SLOW_DOWN = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b"<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>"
+)
+
+
+class _RawBody:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+@pytest.fixture
+def storage(s3_storage):
+    return s3_storage
+
+
+def save(storage: S3Storage, data: bytes, filename: str = "photo.bin"):
+    return asyncio.run(storage.save(UploadFile(file=BytesIO(data), filename=filename), filename))
+
+
+def read(storage: S3Storage, path: str, start: int = 0, end: int | None = None, chunk_size: int = 4096) -> bytes:
+    async def collect():
+        return b"".join([chunk async for chunk in storage.stream(path, start, end, chunk_size)])
+    return asyncio.run(collect())
+
+
+def test_large_save_is_uploaded_in_parts(storage):
+    data = os.urandom(2 * PART_SIZE + 12345)
+    stored = save(storage, data)
+
+    assert stored.size == len(data)
+    assert stored.content_hash == hashlib.sha256(data).hexdigest()
+    head = storage.client.head_object(Bucket="images-test", Key="photo.bin")
+    # Multipart ETags end in the part count
+    assert head["ETag"].strip('"').endswith("-3")
+    assert read(storage, stored.path) == data
+    assert storage.client.list_multipart_uploads(Bucket="images-test").get("Uploads", []) == []
+
+
+def test_small_save_is_a_single_put(storage):
+    stored = save(storage, b"small body")
+
+    head = storage.client.head_object(Bucket="images-test", Key="photo.bin")
+    assert "-" not in head["ETag"]
+    assert stored.size == 10
+    assert asyncio.run(storage.get(stored.path)) == b"small body"
+
+
+def test_ranged_stream_size_and_delete(storage):
+    data = bytes(range(256)) * 64
+    stored = save(storage, data)
+
+    assert read(storage, stored.path, 10, 19) == data[10:20]
+    assert read(storage, stored.path, 16000) == data[16000:]
+    assert read(storage, stored.path, chunk_size=1000) == data
+    assert asyncio.run(storage.size(stored.path)) == len(data)
+
+    asyncio.run(storage.delete(stored.path))
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(storage.size(stored.path))
+    with pytest.raises(FileNotFoundError):
+        read(storage, stored.path)
+
+
+def test_throttled_request_is_retried(storage):
+    attempts = []
+
+    def throttle_once(request, **kwargs):
+        attempts.append(request.url)
+        if len(attempts) == 1:
+            return AWSResponse(request.url, 503, {}, _RawBody(SLOW_DOWN))
+        return None
+
+    storage.client.meta.events.register_first("before-send.s3.PutObject", throttle_once)
+    stored = save(storage, b"retried body")
+
+    assert len(attempts) == 2
+    assert asyncio.run(storage.get(stored.path)) == b"retried body"
@@ -0,0 +1,158 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.requests import Request
+
+from app.services.streaming import parse_range, stream_from_storage
+from app.storage.cached import CachedStorage
+from app.storage.local import LocalStorage
+from tests.conftest import png_bytes
+from tests.test_uploads import upload
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 10239)),
+    ("bytes=10000-20000", (10000, 10239)),
+    ("bytes=-100", (10140, 10239)),
+    ("bytes=-20000", (0, 10239)),
+    (" bytes=5-5 ", (5, 5)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(DATA)) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=0-9,20-29",
+    "bytes=-",
+    "items=0-9",
+    "bytes=a-b",
+])
+def test_parse_range_ignores_what_it_cannot_serve(header):
+    assert parse_range(header, len(DATA)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=20-10", "bytes=10240-", "bytes=99999-100000", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable_ranges(header):
+    with pytest.raises(HTTPException) as raised:
+        parse_range(header, len(DATA))
+    assert raised.value.status_code == 416
+    assert raised.value.headers["Content-Range"] == "bytes */10240"
+
+
+def request_with(headers: dict) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def ranged_get(storage, headers: dict):
+    async def run():
+        stored = await storage.save(UploadFile(file=BytesIO(DATA), filename="data.bin"), "data.bin")
+        response = await stream_from_storage(storage, stored.path, request_with(headers), headers={"ETag": '"v1"'})
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        return response, body
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=["local", "cached", "s3"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path), chunk_size=1000)
+    if request.param == "cached":
+        return CachedStorage(
+            LocalStorage(str(tmp_path), chunk_size=1000), memory_bytes=1 << 20, memory_max_object_bytes=1 << 20
+        )
+    return request.getfixturevalue("s3_storage")
+
+
+def test_partial_content_from_each_backend(backend):
+    response, body = ranged_get(backend, {"Range": "bytes=1000-2999"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 1000-2999/10240"
+    assert response.headers["Content-Length"] == "2000"
+    assert body == DATA[1000:3000]
+
+
+def test_stale_if_range_gets_the_whole_file(backend):
+    response, body = ranged_get(backend, {"Range": "bytes=1000-2999", "If-Range": '"v0"'})
+
+    assert response.status_code == 200
+    assert body == DATA
+
+
+def test_image_download_honours_range(client, auth_headers):
+    data = png_bytes(color=(70, 80, 90))
+    image = upload(client, auth_headers, data)
+
+    response = client.get(f"/images/{image['id']}", headers={**auth_headers, "Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == data[-10:]
+
+
+def read_all(storage, path: str, start: int = 0, end: int | None = None) -> bytes:
+    async def run():
+        return b"".join([chunk async for chunk in storage.stream(path, start, end)])
+    return asyncio.run(run())
+
+
+def save(storage, name: str) -> str:
+    return asyncio.run(storage.save(UploadFile(file=BytesIO(DATA), filename=name), name)).path
+
+
+def test_cache_checks_remote_size_before_downloading(s3_storage, monkeypatch):
+    path = save(s3_storage, "large.bin")
+    cache = CachedStorage(s3_storage, memory_bytes=1 << 20, memory_max_object_bytes=1 << 20, max_object_bytes=1000)
+    downloads = []
+    stream = s3_storage.stream
+
+    def counting_stream(*args, **kwargs):
+        downloads.append(args)
+        return stream(*args, **kwargs)
+
+    monkeypatch.setattr(s3_storage, "stream", counting_stream)
+
+    assert read_all(cache, path) == DATA
+    # Only the pass-through read; the fill stopped at the HEAD
+    assert len(downloads) == 1
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_range_miss_reads_the_backend_without_filling(tmp_path):
+    cache = CachedStorage(
+        LocalStorage(str(tmp_path), chunk_size=1000), memory_bytes=1 << 20, memory_max_object_bytes=1 << 20
+    )
+    path = save(cache, "data.bin")
+
+    assert read_all(cache, path, 1000, 2999) == DATA[1000:3000]
+    assert cache.stats()["memory_entries"] == 0
+    assert cache.stats()["misses"] == 0
+
+    assert read_all(cache, path) == DATA
+    assert read_all(cache, path, 1000, 2999) == DATA[1000:3000]
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_new_disk_entry_survives_eviction_behind_protected_ones(s3_storage, tmp_path):
+    cache = CachedStorage(
+        s3_storage, memory_bytes=0, memory_max_object_bytes=0, disk_bytes=len(DATA) + 1000,
+        cache_dir=str(tmp_path), protect_seconds=60
+    )
+    first = save(cache, "first.bin")
+    second = save(cache, "second.bin")
+
+    protected = asyncio.run(cache.read_source(first))
+    fresh = asyncio.run(cache.read_source(second))
+
+    with open(protected, "rb") as source:
+        assert source.read() == DATA
+    with open(fresh, "rb") as source:
+        assert source.read() == DATA
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import textwrap
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageChops
+
+from app.services import image_transformer
+from app.services.image_transformer import ImageTooLarge
+from app.services.pipeline import render
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def gradient(size, format) -> bytes:
+    image = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(size),
+        Image.linear_gradient("L").rotate(90).resize(size),
+        Image.new("L", size, 128),
+    ))
+    buffer = BytesIO()
+    image.save(buffer, format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def small_limits(monkeypatch):
+    """Push anything over 70k pixels through transform_strips, in bands of 8 KiB"""
+    monkeypatch.setattr(image_transformer, "MAX_DECODE_PIXELS", 70_000)
+    monkeypatch.setattr(image_transformer, "STRIP_BYTES", 8 * 1024)
+
+
+@pytest.mark.parametrize("format", ["PPM", "BMP", "TIFF"])
+def test_strips_match_a_whole_decode(format, small_limits, monkeypatch):
+    source = gradient((640, 480), format)
+    operations = [
+        {"action": "crop", "left": 10, "top": 20, "right": 610, "bottom": 460},
+        {"action": "sepia"},
+        {"action": "resize", "width": 60, "height": 44},
+    ]
+    in_strips = Image.open(BytesIO(render(source, operations, "png")))
+
+    monkeypatch.setattr(image_transformer, "MAX_DECODE_PIXELS", 100_000_000)
+    whole = Image.open(BytesIO(render(source, operations, "png")))
+
+    assert in_strips.size == whole.size == (60, 44)
+    difference = ImageChops.difference(in_strips.convert("RGB"), whole.convert("RGB"))
+    assert max(high for _, high in difference.getextrema()) <= 2
+
+
+def test_oversized_source_is_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(image_transformer, "MAX_IMAGE_PIXELS", 640 * 480 - 1)
+    with pytest.raises(ImageTooLarge):
+        render(gradient((640, 480), "PPM"), [{"action": "grayscale"}], "png")
+
+
+def test_compressed_source_too_big_to_decode_is_rejected(small_limits):
+    with pytest.raises(ImageTooLarge):
+        render(gradient((640, 480), "PNG"), [{"action": "grayscale"}], "png")
+
+
+def test_strip_result_over_the_decode_limit_is_rejected(small_limits):
+    # No downscale, so the output would be as large as the source
+    with pytest.raises(ImageTooLarge):
+        render(gradient((640, 480), "PPM"), [{"action": "invert"}], "png")
+
+
+# 10000 x 6000 RGB: 180 MB on disk, 240 MB as one Pillow bitmap
+LARGE_RENDER = textwrap.dedent("""
+    import sys
+    from io import BytesIO
+    from PIL import Image
+    from app.services.image_transformer import configure_limits
+    from app.services.pipeline import render
+
+    path = sys.argv[1]
+    width, height = 10000, 6000
+    with open(path, "wb") as output:
+        output.write(b"P6\\n%d %d\\n255\\n" % (width, height))
+        row = bytes(range(256)) * (width * 3 // 256) + bytes(width * 3 % 256)
+        for _ in range(height):
+            output.write(row)
+
+    configure_limits(2_000_000_000, 10_000_000, 4 * 1024 * 1024)
+    output = render(path, [{"action": "grayscale"}, {"action": "thumbnail", "width": 500, "height": 500}], "png")
+    # VmHWM belongs to this process image; ru_maxrss would carry over the
+    # parent's peak across fork and exec
+    with open("/proc/self/status") as status:
+        peak = next(line.split()[1] for line in status if line.startswith("VmHWM:"))
+    print(Image.open(BytesIO(output)).size, peak)
+""")
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="reads the peak RSS from /proc")
+def test_large_raw_source_renders_in_bounded_memory(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-c", LARGE_RENDER, str(tmp_path / "large.ppm")],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    size, peak_kib = result.stdout.rsplit(" ", 1)
+
+    assert size == "(500, 300)"
+    # Interpreter and Pillow plus a few 4 MB bands, nowhere near 240 MB
+    assert int(peak_kib) < 120 * 1024
@@ -0,0 +1,61 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db import ASYNC_DATABASE_URL
+from app.models import Image, ImageTransformation
+from app.services.transform_cache import CachedTransformation, TransformCache, transform_cache_key
+
+
+def with_session(scenario):
+    """Run scenario(session) on an engine of its own, away from the app's event loop"""
+    async def run():
+        engine = create_async_engine(ASYNC_DATABASE_URL)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                return await scenario(session)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def transformation(key: str, output: str) -> ImageTransformation:
+    return ImageTransformation(image_id=1, action="pipeline", params="{}", output_file_path=output, cache_key=key)
+
+
+def test_key_follows_content_hash_not_storage_path():
+    first = Image(id=7, file_path="uploads/a.png", content_hash="abc")
+    moved = Image(id=7, file_path="uploads/b.png", content_hash="abc")
+    changed = Image(id=7, file_path="uploads/a.png", content_hash="def")
+    other_image = Image(id=8, file_path="uploads/a.png", content_hash="abc")
+    ops = [{"action": "grayscale"}]
+
+    key = transform_cache_key(first, ops, "png")
+    assert transform_cache_key(moved, ops, "png") == key
+    assert transform_cache_key(changed, ops, "png") != key
+    assert transform_cache_key(other_image, ops, "png") != key
+
+
+def test_losing_a_race_returns_the_winning_row(client):
+    async def scenario(session):
+        winner = await TransformCache(10).record(session, [transformation("race", "winner.png")])
+        loser_cache = TransformCache(10)
+        entries = await loser_cache.record(
+            session, [transformation("race", "loser.png"), transformation("race-other", "other.png")]
+        )
+        return winner, entries, loser_cache.get("race")
+
+    [winner], [lost, other], remembered = with_session(scenario)
+    assert lost == winner
+    assert remembered == winner
+    assert other.output_file_path == "other.png"
+
+
+def test_remembered_entry_of_a_deleted_row_is_dropped(client):
+    async def scenario(session):
+        cache = TransformCache(10)
+        cache.put("gone", CachedTransformation(999999, "gone.png"))
+        return await cache.lookup(session, "gone"), await cache.lookup_many(session, ["gone"]), cache.get("gone")
+
+    assert with_session(scenario) == (None, {}, None)
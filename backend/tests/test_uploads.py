@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import ImageRendition
+from tests.conftest import png_bytes, register
+
+
+def upload(client, headers, data: bytes, name: str = "photo.png") -> dict:
+    response = client.post("/images/upload", headers=headers, files={"file": (name, data, "image/png")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_upload_does_not_reveal_other_users_copies(client):
+    data = png_bytes(color=(1, 2, 3))
+    owner = register(client, "owner@example.com")
+    other = register(client, "other@example.com")
+
+    first = upload(client, owner, data)
+    second = upload(client, other, data)
+
+    assert "duplicate" not in first and "duplicate" not in second
+    assert client.get(f"/images/{second['id']}", headers=other).content == data
+
+
+def test_renditions_are_only_reused_from_the_same_user(client, monkeypatch):
+    monkeypatch.setattr(settings, "RENDITIONS", "thumb:32:png")
+    data = png_bytes(color=(4, 5, 6))
+    owner = register(client, "renditions-owner@example.com")
+    other = register(client, "renditions-other@example.com")
+
+    first = upload(client, owner, data)
+    again = upload(client, owner, data)
+    foreign = upload(client, other, data)
+
+    with SessionLocal() as db:
+        paths = {
+            image_id: db.scalar(select(ImageRendition.output_file_path).where(ImageRendition.image_id == image_id))
+            for image_id in (first["id"], again["id"], foreign["id"])
+        }
+
+    # The user's own duplicate shares the rendition file; another account gets its own
+    assert paths[first["id"]] == paths[again["id"]]
+    assert paths[foreign["id"]] is not None and paths[foreign["id"]] != paths[first["id"]]
+
+
+def test_transform_is_limited_to_the_owners_images(client):
+    owner = register(client, "transform-owner@example.com")
+    stranger = register(client, "transform-stranger@example.com")
+    image = upload(client, owner, png_bytes(color=(11, 12, 13)))
+    params = {"image_id": image["id"], "action": "grayscale", "output_format": "png"}
+
+    assert client.post("/images/transform", headers=stranger, params=params).status_code == 404
+    assert client.post("/images/transform", headers=owner, params=params).status_code == 200
+
+
+@pytest.mark.parametrize("params", [
+    {"action": "resize", "width": 0, "height": 10},
+    {"action": "resize", "width": 100_000, "height": 100_000},
+    {"action": "resize", "width": 10_000, "height": 10_000},
+    {"action": "thumbnail", "width": 0, "height": 0},
+    {"action": "crop", "left": 20, "top": 0, "right": 10, "bottom": 10},
+    {"action": "crop", "left": 0, "top": 10, "right": 10, "bottom": 10},
+    {"action": "crop", "left": -5, "top": 0, "right": 10, "bottom": 10},
+    {"action": "rotate", "angle": 100_000},
+])
+def test_out_of_range_parameters_are_rejected(client, auth_headers, params):
+    image = upload(client, auth_headers, png_bytes(color=(14, 15, 16)))
+
+    response = client.post(
+        "/images/transform", headers=auth_headers,
+        params={"image_id": image["id"], "output_format": "png", **params},
+    )
+    assert response.status_code == 400, response.text
+
+    response = client.post("/images/pipeline", headers=auth_headers, json={
+        "image_id": image["id"], "operations": [params], "output_format": "png"
+    })
+    assert response.status_code == 400, response.text
+
+    response = client.post("/jobs", headers=auth_headers, json={
+        "image_id": image["id"], "operations": [params], "output_format": "png"
+    })
+    assert response.status_code == 400, response.text
@@ -0,0 +1,103 @@
+import pytest
+
+from app.services.pipeline import UNBOUNDED
+from app.services.url_spec import InvalidSpec, parse_url_spec
+from tests.conftest import png_bytes, register
+from tests.test_uploads import upload
+
+
+def test_parse_url_spec():
+    rendition = parse_url_spec("w_400,h_300,e_sepia,f_png,q_80,fl_h,r_90")
+
+    assert rendition.operations == [
+        {"action": "thumbnail", "width": 400, "height": 300},
+        {"action": "rotate", "angle": 90},
+        {"action": "flip_horizontal"},
+        {"action": "sepia"},
+    ]
+    assert rendition.output_format == "png"
+    assert rendition.quality == 80
+    assert rendition.preset is None
+
+
+def test_parse_url_spec_is_order_independent():
+    assert parse_url_spec("e_grayscale,w_100") == parse_url_spec("w_100,e_grayscale")
+
+
+def test_parse_url_spec_sizes():
+    assert parse_url_spec("h_50").operations == [{"action": "thumbnail", "width": UNBOUNDED, "height": 50}]
+    assert parse_url_spec("w_50,h_40,c_scale").operations == [{"action": "resize", "width": 50, "height": 40}]
+    assert parse_url_spec("").operations == []
+
+
+@pytest.mark.parametrize("spec", [
+    "w",
+    "w_",
+    "w_abc",
+    "w_0",
+    "w_10001",
+    "w_10,w_20",
+    "x_1",
+    "w_10,c_scale",
+    "w_10,c_pad",
+    "r_361",
+    "fl_d",
+    "e_blur",
+    "f_bogus",
+    "q_0",
+    "q_96",
+    "p_bogus",
+])
+def test_parse_url_spec_rejects(spec):
+    with pytest.raises(InvalidSpec):
+        parse_url_spec(spec)
+
+
+@pytest.fixture
+def owner(client):
+    return register(client, "rendition-owner@example.com")
+
+
+@pytest.fixture
+def image(client, owner):
+    return upload(client, owner, png_bytes(size=(64, 48), color=(41, 42, 43)))
+
+
+def test_rendition_is_served_and_etag_is_stable(client, owner, image):
+    first = client.get(f"/images/{image['id']}/w_32,f_png", headers=owner)
+    again = client.get(f"/images/{image['id']}/f_png,w_32", headers=owner)
+    other = client.get(f"/images/{image['id']}/w_16,f_png", headers=owner)
+
+    assert first.status_code == 200, first.text
+    assert first.headers["content-type"] == "image/png"
+    assert first.headers["ETag"] == again.headers["ETag"]
+    assert first.content == again.content
+    assert other.headers["ETag"] != first.headers["ETag"]
+    assert first.headers["Vary"] == "Authorization"
+    assert "immutable" in first.headers["Cache-Control"]
+
+
+def test_rendition_revalidates_with_if_none_match(client, owner, image):
+    url = f"/images/{image['id']}/w_32,f_png"
+    etag = client.get(url, headers=owner).headers["ETag"]
+
+    response = client.get(url, headers={**owner, "If-None-Match": f'"stale", {etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    assert client.get(url, headers={**owner, "If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_auto_format_varies_on_accept(client, owner, image):
+    response = client.get(f"/images/{image['id']}/w_32,f_auto", headers={**owner, "Accept": "image/webp"})
+
+    assert response.status_code == 200, response.text
+    assert response.headers["Vary"] == "Authorization, Accept"
+
+
+def test_rendition_rejects_bad_specs_and_other_users(client, owner, image):
+    assert client.get(f"/images/{image['id']}/w_0", headers=owner).status_code == 400
+
+    stranger = register(client, "rendition-stranger@example.com")
+    assert client.get(f"/images/{image['id']}/w_32", headers=stranger).status_code == 404